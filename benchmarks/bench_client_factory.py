@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+Cost of utils.ClientFactory.get() for cached clients from many threads, and number of clients
+built when all the threads ask for the same missing clients at once. Also reports the time and
+memory taken to create the clients of a full region x service matrix. Runs offline: clients
+are created with dummy credentials and no request is sent.
+
+usage: python benchmarks/bench_client_factory.py [--threads 1 8 64] [--calls 20000]
+       python benchmarks/bench_client_factory.py --startup [--regions 16]
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from taskcat import utils  # noqa: E402
+
+SERVICES = ['cloudformation', 's3', 'ec2', 'sts']
+REGIONS = ['us-east-1', 'us-west-2', 'eu-west-1', 'ap-southeast-2']
+STARTUP_SERVICES = ['cloudformation', 's3', 'ec2', 'sts', 'dynamodb']
+STARTUP_REGIONS = ['us-east-1', 'us-east-2', 'us-west-1', 'us-west-2', 'ca-central-1', 'eu-central-1',
+                   'eu-west-1', 'eu-west-2', 'eu-west-3', 'eu-north-1', 'ap-northeast-1', 'ap-northeast-2',
+                   'ap-southeast-1', 'ap-southeast-2', 'ap-south-1', 'sa-east-1']
+
+
+def run_threads(threads, target):
+    barrier = threading.Barrier(threads)
+    errors = []
+
+    def worker(index):
+        barrier.wait()
+        try:
+            target(index)
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.time()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    if errors:
+        raise errors[0]
+    return time.time() - start
+
+
+def count_created(factory):
+    created = [0]
+    create_client = factory._create_client
+
+    def counting_create_client(*args):
+        created[0] += 1
+        return create_client(*args)
+
+    factory._create_client = counting_create_client
+    return created
+
+
+def startup(regions):
+    """
+    Creates every client of the matrix from a new factory (in a single thread).
+    """
+    tracemalloc.start()
+    start = time.time()
+    factory = utils.ClientFactory()
+    first = None
+    for region in STARTUP_REGIONS[:regions]:
+        for service in STARTUP_SERVICES:
+            factory.get(service, region)
+        if first is None:
+            first = time.time() - start
+    elapsed = time.time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    count = regions * len(STARTUP_SERVICES)
+    print("{} clients ({} regions x {} services)".format(count, regions, len(STARTUP_SERVICES)))
+    print("first region: {:.2f}s, all: {:.2f}s, per client: {:.1f}ms, peak memory: {:.1f} MB".format(
+        first, elapsed, elapsed / count * 1000, peak / 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ClientFactory.get()')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 64])
+    parser.add_argument('--calls', type=int, default=20000, help='get() calls per thread')
+    parser.add_argument('--startup', action='store_true', help='measure the creation of a region x service matrix')
+    parser.add_argument('--regions', type=int, default=len(STARTUP_REGIONS))
+    args = parser.parse_args()
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'AKIDEXAMPLE')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+    if args.startup:
+        return startup(min(args.regions, len(STARTUP_REGIONS)))
+
+    keys = [(service, region) for service in SERVICES for region in REGIONS]
+    print("{:>8} {:>14} {:>14} {:>16}".format('threads', 'cold (s)', 'built', 'cached get (us)'))
+    for threads in args.threads:
+        factory = utils.ClientFactory()
+        created = count_created(factory)
+        # Every thread asks for every client at once, each client must be built exactly once
+        cold = run_threads(threads, lambda i: [factory.get(service, region) for service, region in keys])
+
+        def hot(index):
+            get = factory.get
+            for i in range(args.calls):
+                service, region = keys[(index + i) % len(keys)]
+                get(service, region)
+
+        elapsed = run_threads(threads, hot)
+        per_call = elapsed / (threads * args.calls) * 1e6
+        print("{:>8} {:>14.2f} {:>14} {:>16.2f}".format(
+            threads, cold, '{}/{}'.format(created[0], len(keys)), per_call))
+
+
+if __name__ == '__main__':
+    main()
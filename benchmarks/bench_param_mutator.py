@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+Micro-benchmark of the $[taskcat_*] placeholder resolution (TaskCat.generate_input_param_values)
+on generated parameter files with thousands of entries. Runs offline: AZ and S3 lookups are
+answered locally.
+
+usage: python benchmarks/bench_param_mutator.py [--sizes 1000 5000 20000] [--repeat 5]
+"""
+from __future__ import print_function
+
+import argparse
+import copy
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from taskcat import stacker  # noqa: E402
+
+PLACEHOLDERS = [
+    '$[taskcat_genaz_2]',
+    '$[taskcat_getsingleaz_1]',
+    '$[taskcat_genpass_8A]',
+    '$[taskcat_genuuid]',
+    '$[taskcat_autobucket]',
+    '$[taskcat_getkeypair]',
+    '$[taskcat_random-string]',
+]
+
+
+def make_params(size, placeholder_ratio):
+    params = []
+    every = max(1, int(1 / placeholder_ratio)) if placeholder_ratio else 0
+    for i in range(size):
+        if every and i % every == 0:
+            value = PLACEHOLDERS[(i // every) % len(PLACEHOLDERS)]
+        elif i % 7 == 0:
+            value = i
+        else:
+            value = 'value-{}'.format(i)
+        params.append({'ParameterKey': 'Param{}'.format(i), 'ParameterValue': value})
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parameter placeholder resolution')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--ratio', type=float, default=0.1, help='fraction of values holding a placeholder')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tcat = stacker.TaskCat()
+    tcat.set_s3bucket('taskcat-benchmark')
+    tcat.get_available_azs = lambda region, count: ','.join('{}{}'.format(region, z) for z in 'abcdef'[:count])
+    # Silence the per-value debug output of the generators
+    stacker.D = stacker.I = ''
+    devnull = open(os.devnull, 'w')
+
+    print('{:>8} {:>12} {:>14}'.format('params', 'best (ms)', 'params/sec'))
+    for size in args.sizes:
+        params = make_params(size, args.ratio)
+        # Each run resolves a fresh copy of the parameters, made in the (untimed) setup
+        copies = []
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            best = min(timeit.repeat(lambda: tcat.generate_input_param_values(copies.pop(), 'us-east-1'),
+                                     setup=lambda: copies.append(copy.deepcopy(params)),
+                                     number=1, repeat=args.repeat))
+        finally:
+            sys.stdout = stdout
+        print('{:>8} {:>12.2f} {:>14.0f}'.format(size, best * 1000, size / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+Startup benchmark of the taskcat command line tools and of the taskcat.* modules.
+
+Each entry point (run with --help) and each module import is timed in a new interpreter, cold
+(empty bytecode cache) and warm (bytecode cached), and broken down per top level package with
+-X importtime. The time from the start of taskcat.py to its first AWS API call is measured
+against a local stub endpoint. Runs offline: the tools get dummy credentials, a private
+taskcat cache and AWS_ENDPOINT_URL pointing at the stub.
+
+The results are written to a json file, which can be compared with a previous run to catch
+startup regressions (the exit code is 1 when a metric got slower than the threshold).
+
+usage: python benchmarks/bench_startup.py [--output results.json] [--cold 3] [--warm 5]
+       python benchmarks/bench_startup.py --compare baseline.json [--threshold 0.25]
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import json
+import os
+import pkgutil
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+FORMAT_VERSION = 1
+ENTRY_POINTS = ['taskcat.py', 'alchemist.py', 'beautycorn.py', 'historian.py']
+# Number of heaviest imports kept in the results of each entry point and module
+TOP_IMPORTS = 10
+# Differences below this many seconds are noise, never reported as regressions
+MIN_REGRESSION = 0.01
+FIRST_CALL_TIMEOUT = 60
+
+_IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$')
+
+_IDENTITY = ('<GetCallerIdentityResponse xmlns="https://sts.amazonaws.com/doc/2011-06-15/">'
+             '<GetCallerIdentityResult><Arn>arn:aws:iam::123456789012:user/benchmark</Arn>'
+             '<UserId>AIDABENCHMARK</UserId><Account>123456789012</Account></GetCallerIdentityResult>'
+             '<ResponseMetadata><RequestId>benchmark</RequestId></ResponseMetadata>'
+             '</GetCallerIdentityResponse>').encode('utf-8')
+
+
+def get_modules():
+    """
+    Returns the names of the taskcat modules, found without importing the package.
+    """
+    return ['taskcat'] + ['taskcat.' + name for _, name, _ in pkgutil.iter_modules([os.path.join(ROOT, 'taskcat')])]
+
+
+def parse_importtime(stderr):
+    """
+    Parses the -X importtime output of an interpreter.
+
+    :return: Tuple of (total seconds, {top level package: self seconds}, {module: cumulative seconds})
+    """
+    total = 0
+    packages = {}
+    cumulative = {}
+    for line in stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1e6
+        cumulative[name] = cumulative.get(name, 0) + int(cumulative_us) / 1e6
+        if len(indent) == 1:
+            total += int(cumulative_us) / 1e6
+    return total, packages, cumulative
+
+
+class Environment(object):
+    """
+    Offline environment of the benchmarked interpreters: dummy credentials, no AWS config
+    files, a private taskcat cache and a private bytecode cache.
+    """
+
+    def __init__(self, endpoint=None):
+        self.root = tempfile.mkdtemp(prefix='taskcat-startup-')
+        self.seed_cache = os.path.join(self.root, 'seed')
+        self.warm_bytecode = os.path.join(self.root, 'pycache')
+        self.endpoint = endpoint
+        self.config = os.path.join(self.root, 'config.yml')
+        with open(self.config, 'w') as f:
+            f.write('global:\n  qsname: benchmark\n  regions:\n    - us-east-1\ntests: {}\n')
+        # A fresh answer to the update check, so taskcat.py never asks PyPI
+        os.makedirs(self.seed_cache)
+        with open(os.path.join(self.seed_cache, 'version.json'), 'w') as f:
+            json.dump(dict((url, {'checked': time.time(), 'version': '0'})
+                           for url in ('https://pypi.org/pypi/taskcat/json',
+                                       'https://test.pypi.org/pypi/taskcat/json')), f)
+
+    def new_cache(self):
+        path = tempfile.mkdtemp(dir=self.root)
+        os.rmdir(path)
+        shutil.copytree(self.seed_cache, path)
+        return path
+
+    def get(self, cold, cache=None):
+        env = dict(os.environ)
+        for name in list(env):
+            if name.startswith('AWS_'):
+                del env[name]
+        env.update({
+            'AWS_ACCESS_KEY_ID': 'AKIDBENCHMARK',
+            'AWS_SECRET_ACCESS_KEY': 'benchmark',
+            'AWS_DEFAULT_REGION': 'us-east-1',
+            'AWS_CONFIG_FILE': os.path.join(self.root, 'aws-config'),
+            'AWS_SHARED_CREDENTIALS_FILE': os.path.join(self.root, 'aws-credentials'),
+            'AWS_EC2_METADATA_DISABLED': 'true',
+            'TASKCAT_CACHE_DIR': cache or self.seed_cache,
+            'PYTHONPATH': ROOT,
+            'PYTHONPYCACHEPREFIX': tempfile.mkdtemp(dir=self.root) if cold else self.warm_bytecode,
+        })
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+        if self.endpoint:
+            env['AWS_ENDPOINT_URL'] = self.endpoint
+        return env
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def time_command(env, args, cold):
+    """
+    Runs a command in a new interpreter with -X importtime.
+
+    :return: Tuple of (wall seconds, parsed importtime output)
+    """
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=ROOT, env=env.get(cold),
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    return time.perf_counter() - start, parse_importtime(process.stderr)
+
+
+def measure(env, args, repeat_cold, repeat_warm, module=None):
+    """
+    Returns the median cold and warm timings of a command and the import breakdown of a warm run.
+
+    :param module: Module whose own cumulative import time is reported (defaults to all imports)
+    """
+    result = {}
+    # Fills the warm bytecode cache
+    time_command(env, args, cold=False)
+    for label, cold, repeat in (('cold', True, repeat_cold), ('warm', False, repeat_warm)):
+        walls, imports, runs = [], [], []
+        for _ in range(repeat):
+            wall, parsed = time_command(env, args, cold)
+            walls.append(wall)
+            imports.append(parsed[2].get(module, 0) if module else parsed[0])
+            runs.append(parsed)
+        result[label] = {'wall': statistics.median(walls), 'import': statistics.median(imports)}
+    _, packages, cumulative = runs[len(runs) // 2]
+    result['packages'] = dict((name, round(seconds, 6)) for name, seconds in
+                              sorted(packages.items(), key=lambda item: -item[1]))
+    result['top'] = [[name, round(seconds, 6)] for name, seconds in
+                     sorted(cumulative.items(), key=lambda item: -item[1])[:TOP_IMPORTS]]
+    return result
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers every AWS request with an STS GetCallerIdentity response, and records the
+    time of the first request.
+    """
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode('utf-8', 'replace')
+        match = re.search(r'Action=(\w+)', body)
+        operation = match.group(1) if match else self.headers.get('X-Amz-Target', 'unknown')
+        self.server.requested(operation)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(_IDENTITY)))
+        self.end_headers()
+        self.wfile.write(_IDENTITY)
+
+    do_GET = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(HTTPServer):
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubHandler)
+        self.first_request = None
+        self.operation = None
+        self.event = threading.Event()
+
+    @property
+    def endpoint(self):
+        return 'http://127.0.0.1:{}'.format(self.server_port)
+
+    def reset(self):
+        self.first_request = None
+        self.operation = None
+        self.event.clear()
+
+    def requested(self, operation):
+        if self.first_request is None:
+            self.first_request = time.perf_counter()
+            self.operation = operation
+            self.event.set()
+
+
+def time_first_call(env, server, repeat):
+    """
+    Returns the median time from the start of taskcat.py to its first AWS request.
+    """
+    times = []
+    for _ in range(repeat):
+        server.reset()
+        # A new taskcat cache every time, or the account id of the previous run is reused
+        process_env = env.get(cold=False, cache=env.new_cache())
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, 'taskcat.py', '-c', env.config, '-A', 'AKIDBENCHMARK',
+                                    '-S', 'benchmark'], cwd=ROOT, env=process_env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not server.event.wait(FIRST_CALL_TIMEOUT):
+                raise RuntimeError("taskcat.py made no AWS request within {}s".format(FIRST_CALL_TIMEOUT))
+            times.append(server.first_request - start)
+        finally:
+            process.kill()
+            process.wait()
+    return {'seconds': statistics.median(times), 'operation': server.operation}
+
+
+def get_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results):
+    """
+    Returns the comparable metrics of a result file as {name: seconds}.
+    """
+    metrics = {}
+    for section in ('entry_points', 'modules'):
+        for name, timings in results.get(section, {}).items():
+            for label in ('cold', 'warm'):
+                for metric in ('wall', 'import'):
+                    metrics['{}/{}/{}'.format(name, label, metric)] = timings[label][metric]
+    if results.get('first_call'):
+        metrics['taskcat.py/first_call'] = results['first_call']['seconds']
+    return metrics
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the metrics which got slower than the threshold.
+
+    :return: Number of regressions
+    """
+    current, previous = flatten(results), flatten(baseline)
+    regressions = 0
+    print("\nCompared with {} ({})".format(baseline.get('revision'), baseline.get('created')))
+    print("{:<48} {:>10} {:>10} {:>8}".format('metric', 'before', 'after', 'change'))
+    for name in sorted(set(current) & set(previous)):
+        before, after = previous[name], current[name]
+        if after - before > max(MIN_REGRESSION, before * threshold):
+            regressions += 1
+            print("{:<48} {:>10.3f} {:>10.3f} {:>+7.0f}%".format(name, before, after,
+                                                                (after - before) / before * 100 if before else 0))
+    print("{} regressions".format(regressions))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the startup of the taskcat tools and modules')
+    parser.add_argument('--output', default=os.path.join(tempfile.gettempdir(), 'taskcat-startup.json'),
+                        help='result file (default: taskcat-startup.json in the temp directory)')
+    parser.add_argument('--cold', type=int, default=3, help='cold runs of each command')
+    parser.add_argument('--warm', type=int, default=5, help='warm runs of each command')
+    parser.add_argument('--first-call', type=int, default=3, help='runs of the time to first AWS call')
+    parser.add_argument('--modules', nargs='*', help='only these modules (default: all taskcat modules)')
+    parser.add_argument('--compare', help='previous result file to compare with')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='relative slow down reported as a regression (default: 0.25)')
+    args = parser.parse_args()
+
+    server = StubServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    env = Environment(server.endpoint)
+    results = {
+        'format': FORMAT_VERSION,
+        'created': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'revision': get_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': {'cold': args.cold, 'warm': args.warm, 'first_call': args.first_call},
+        'entry_points': {},
+        'modules': {},
+    }
+    try:
+        print("{:<28} {:>10} {:>10} {:>10} {:>10}".format('', 'cold (s)', 'imports', 'warm (s)', 'imports'))
+        for name, argv, section, module in (
+                [(script, [script, '--help'], 'entry_points', None) for script in ENTRY_POINTS] +
+                [(module, ['-c', 'import ' + module], 'modules', module) for module in
+                 (args.modules or get_modules())]):
+            timings = measure(env, argv, args.cold, args.warm, module)
+            results[section][name] = timings
+            print("{:<28} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f}".format(
+                name, timings['cold']['wall'], timings['cold']['import'],
+                timings['warm']['wall'], timings['warm']['import']))
+        if args.first_call:
+            results['first_call'] = time_first_call(env, server, args.first_call)
+            print("taskcat.py to first AWS call ({operation}): {seconds:.3f}s".format(**results['first_call']))
+    finally:
+        server.shutdown()
+        env.cleanup()
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print("Results written to {}".format(args.output))
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+Throughput benchmark of the S3 transfer engine (stager.TransferEngine) on synthetic project
+trees. By default runs offline against a simulated S3 client (fixed latency per request and
+bandwidth per connection); pass --bucket to upload to a real bucket instead.
+
+usage: python benchmarks/bench_transfer.py [--files 500] [--concurrency 1 4 16 32 0]
+       python benchmarks/bench_transfer.py --bucket my-scratch-bucket --region us-west-2
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from taskcat import stager  # noqa: E402
+from taskcat import utils  # noqa: E402
+
+
+class SimulatedS3(object):
+    """
+    Stand-in for an S3 client: each request costs a fixed latency plus its size divided by the
+    bandwidth of one connection, and at most max_pool_connections requests run at once.
+    """
+
+    def __init__(self, latency, bandwidth, max_pool_connections):
+        self._latency = latency
+        self._bandwidth = bandwidth
+        self._connections = threading.BoundedSemaphore(max_pool_connections)
+
+    def _request(self, size):
+        with self._connections:
+            time.sleep(self._latency + float(size) / self._bandwidth)
+
+    def upload_file(self, filename, bucket, key, ExtraArgs=None, Config=None):
+        size = os.path.getsize(filename)
+        if size < Config.multipart_threshold:
+            return self._request(size)
+        # Parts are sent in sequence here, which is conservative for multipart uploads
+        self._request(0)
+        for offset in range(0, size, Config.multipart_chunksize):
+            self._request(min(Config.multipart_chunksize, size - offset))
+        self._request(0)
+
+
+class SimulatedClientFactory(object):
+    def __init__(self, latency, bandwidth):
+        self._latency = latency
+        self._bandwidth = bandwidth
+        self._max_pool_connections = 10
+
+    def grow_max_pool_connections(self, service, max_pool_connections):
+        self._max_pool_connections = max(self._max_pool_connections, max_pool_connections)
+
+    def get(self, service, region=None, credential_set='default', s3v4=False):
+        return SimulatedS3(self._latency, self._bandwidth, self._max_pool_connections)
+
+
+def make_tree(root, files, seed):
+    """
+    Writes a synthetic project: mostly small templates and scripts, a few large artifacts.
+    """
+    rng = random.Random(seed)
+    total = 0
+    paths = {}
+    for i in range(files):
+        roll = rng.random()
+        if roll < 0.85:
+            size = rng.randint(1, 64) * 1024
+        elif roll < 0.98:
+            size = rng.randint(64, 2048) * 1024
+        else:
+            size = rng.randint(8, 24) * stager.MB
+        subdir = os.path.join(root, 'project', ('templates', 'scripts', 'assets')[i % 3])
+        if not os.path.isdir(subdir):
+            os.makedirs(subdir)
+        path = os.path.join(subdir, 'file{}.bin'.format(i))
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+        paths[os.path.relpath(path, root)] = path
+        total += size
+    return paths, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the S3 transfer engine')
+    parser.add_argument('--files', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 32, 0],
+                        help='files uploaded concurrently, 0 for automatic')
+    parser.add_argument('--latency', type=float, default=0.02, help='simulated seconds per request')
+    parser.add_argument('--bandwidth', type=float, default=50, help='simulated MB/s per connection')
+    parser.add_argument('--bucket', help='upload to this bucket instead of the simulated client')
+    parser.add_argument('--region', default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='taskcat-bench-')
+    try:
+        files, total = make_tree(root, args.files, args.seed)
+        print("{} files, {:.1f} MB".format(len(files), float(total) / stager.MB))
+        print("{:>12} {:>10} {:>10} {:>10}".format('concurrency', 'seconds', 'MB/s', 'files/s'))
+        for concurrency in args.concurrency:
+            if args.bucket:
+                boto_client = utils.ClientFactory()
+            else:
+                boto_client = SimulatedClientFactory(args.latency, args.bandwidth * stager.MB)
+            engine = stager.TransferEngine(boto_client, args.bucket or 'benchmark', 'private', region=args.region,
+                                           concurrency=concurrency or None)
+            start = time.time()
+            engine.upload(files)
+            elapsed = time.time() - start
+            label = concurrency or 'auto ({})'.format(stager.auto_upload_concurrency(len(files)))
+            print("{:>12} {:>10.2f} {:>10.1f} {:>10.1f}".format(
+                label, elapsed, float(total) / stager.MB / elapsed, len(files) / elapsed))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
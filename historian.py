@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# authors:
+# Tony Vattathil <tonynv@amazon.com>, <avattathil@gmail.com>
+# Santiago Cardenas <sancard@amazon.com>, <santiago[dot]cardenas[at]outlook[dot]com>
+# Shivansh Singh <sshvans@amazon.com>,
+# Jay McConnell <jmmccon@amazon.com>,
+# Andrew Glenn <andglenn@amazon.com>
+"""
+Summarizes and exports the run history recorded by taskcat (~/.taskcat/history/results.db)
+
+usage: historian summary [--project P] [--test T] [--region R] [--days N]
+       historian export [--format csv|json] [--output FILE] [--status S] [--limit N] [filters]
+"""
+
+from __future__ import print_function
+import argparse
+import datetime
+import sys
+import time
+
+import tabulate
+
+from taskcat.recorder import ResultsStore
+
+if sys.version_info[0] < 3:
+    raise Exception("Please use Python 3")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='taskcat run history')
+    parser.add_argument('--db', help='path to the results database')
+    subparsers = parser.add_subparsers(dest='command')
+    summary = subparsers.add_parser('summary', help='pass rate and durations per test and region')
+    export = subparsers.add_parser('export', help='export the recorded stack results')
+    export.add_argument('--format', choices=['csv', 'json'], default='csv')
+    export.add_argument('--output', help='output file (default: stdout)')
+    export.add_argument('--status', help='only stacks with this final status')
+    export.add_argument('--limit', type=int, help='maximum number of results')
+    for subparser in (summary, export):
+        subparser.add_argument('--project')
+        subparser.add_argument('--test')
+        subparser.add_argument('--region')
+        subparser.add_argument('--days', type=float, help='only runs of the last N days')
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        sys.exit(1)
+
+    filters = {'project': args.project, 'test': args.test, 'region': args.region,
+               'since': time.time() - args.days * 86400 if args.days else None}
+    with ResultsStore(args.db) as store:
+        if args.command == 'summary':
+            rows = []
+            for row in store.summarize(**filters):
+                rows.append([row['project'], row['test'], row['region'], row['runs'], row['passed'], row['failed'],
+                             '' if row['avg_duration'] is None else int(row['avg_duration']),
+                             '' if row['max_duration'] is None else int(row['max_duration']),
+                             row['last_status'],
+                             datetime.datetime.fromtimestamp(row['last_run']).strftime('%Y-%m-%d %H:%M')])
+            print(tabulate.tabulate(rows, headers=['Project', 'Test', 'Region', 'Runs', 'Passed', 'Failed',
+                                                   'Avg (s)', 'Max (s)', 'Last status', 'Last run']))
+        else:
+            filters.update(status=args.status, limit=args.limit)
+            if args.output:
+                with open(args.output, 'w', newline='') as output:
+                    count = store.export(output, args.format, **filters)
+                print("Exported {} results to {}".format(count, args.output))
+            else:
+                store.export(sys.stdout, args.format, **filters)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,10 @@ cp beautycorn.py bin/taskcat-beautycorn
 cp alchemist.py bin/taskcat-alchemist
 cp alchemist.py bin/alchemist
 
+# Create historian
+cp historian.py bin/historian
+cp historian.py bin/taskcat-historian
+
 # Stage Stub
 cp scripts/setup_stub-develop.py ./setup_stub-develop.py
 # Update Pip Version
@@ -2,6 +2,7 @@ from setuptools import setup
 setup(
     name='taskcat',
     packages=['taskcat'],
+    package_data={'taskcat': ['assets/*.css']},
     description='An OpenSource Cloudformation Deployment Framework',
     author='Tony Vattathil, Santiago Cardenas, Shivansh Singh, Jay McConnell, Andrew Glenn',
     author_email='tonynv@amazon.com, sancard@amazon.com, sshvans@amazon.com, jmmccon@amazon.com, andglenn@amazon.com',
@@ -23,7 +24,9 @@ setup(
         'bin/alchemist',
         'bin/taskcat-alchemist',
         'bin/beautycorn',
-        'bin/taskcat-beautycorn'
+        'bin/taskcat-beautycorn',
+        'bin/historian',
+        'bin/taskcat-historian'
     ],
     keywords=['aws', 'cloudformation', 'cloud', 'cloudformation testing', 'cloudformation deploy', 'taskcat'],
     install_requires=['boto3', 'pyfiglet', 'pyyaml', 'tabulate', 'yattag']
@@ -42,15 +42,10 @@ def main():
             taskcat_cfg = yaml.safe_load(cfg.read())
         cfg.close()
 
-        tcat_instance.stage_in_s3(taskcat_cfg)
-        tcat_instance.validate_template(taskcat_cfg, test_list)
-        tcat_instance.validate_parameters(taskcat_cfg, test_list)
-        # instance.stackcreate returns testdata object
+        # Stages, validates, launches, polls, reports and cleans up, overlapping independent work
         # 'tag' can be replace with only alphanumeric values
-        testdata = tcat_instance.stackcreate(taskcat_cfg, test_list, 'tag')
-        tcat_instance.get_stackstatus(testdata, 5)
-        tcat_instance.createreport(testdata, 'index.html')
-        tcat_instance.cleanup(testdata, 5)
+        orchestrator = taskcat.Orchestrator(tcat_instance)
+        orchestrator.run(taskcat_cfg, test_list, 'tag', 5, 'index.html')
 
 
 # --End
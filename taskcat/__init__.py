@@ -1,13 +1,73 @@
 """
 taskcat python module
+
+The submodules are imported on first use of one of their names, so that importing taskcat
+(and starting the command line tools) does not load boto3 and the other heavy dependencies
+until they are needed.
 """
-from .collector import *
-from .configurator import *
-from .deployer import *
-from .mutator import *
-from .reporter import *
-from .stacker import *
-from .reaper import *
-from .tester import *
-from .utils import *
-from .validator import *
+import sys
+
+# Modules whose public names are exported by the package, later modules take precedence
+_MODULES = ('collector', 'configurator', 'deployer', 'launcher', 'metadata', 'mutator', 'orchestrator', 'poller',
+            'recorder', 'reporter', 'stacker', 'reaper', 'stager', 'tester', 'utils', 'validator')
+
+_EXPORTS = {}
+for _module, _names in (
+        ('collector', ('DEFAULT_WALK_CONCURRENCY', 'DEFAULT_LOG_CONCURRENCY', 'LOG_BUFFER_SIZE', 'STACK_RESOURCE_TYPE',
+                       'EVENT_COLUMNS', 'StackInventory', 'get_stack_name', 'iter_stack_event_pages',
+                       'format_event_row', 'get_status_reason', 'StackTimings', 'StackLogCollector')),
+        ('configurator', ('TestPlan',)),
+        ('deployer', ('CFNAlchemist',)),
+        ('launcher', ('DEFAULT_LAUNCH_CONCURRENCY', 'LaunchResult', 'StackLauncher')),
+        ('metadata', ('HOUR', 'DAY', 'DEFAULT_METADATA_TTLS', 'MetadataCache')),
+        ('mutator', ('ParamMutator',)),
+        ('orchestrator', ('DEFAULT_REGION_CONCURRENCY', 'DEFAULT_MAX_WORKERS', 'Orchestrator')),
+        ('poller', ('DEFAULT_POLL_CONCURRENCY', 'DEFAULT_MAX_POLL_INTERVAL', 'STACK_DELETED', 'get_stack_region',
+                    'StackPoller', 'StackDurations', 'PollScheduler')),
+        ('recorder', ('RESULT_FIELDS', 'SUMMARY_FIELDS', 'StackResult', 'ResultsStore', 'stack_result')),
+        ('reporter', ('REPORT_CSS', 'REPORT_BUFFER_SIZE', 'REPO_LINK', 'DOC_LINK', 'MANUALLY_DELETED',
+                      'get_report_css', 'get_report_status', 'ReportWriter')),
+        ('stacker', ('E', 'D', 'P', 'F', 'I', 'version', 'jobid', 'get_pip_version', 'buildmap', 'TestData',
+                     'TaskCat', 'get_cfn_stack_events')),
+        ('reaper', ('DELETE_BATCH_SIZE', 'DEFAULT_DELETE_CONCURRENCY', 'MAX_DELETE_ATTEMPTS', 'RETRYABLE_ERRORS',
+                    'Reaper', 'CleanupPlanner')),
+        ('stager', ('MB', 'MULTIPART_THRESHOLD', 'MULTIPART_CHUNKSIZE', 'MAX_PARTS', 'MIN_AUTO_UPLOAD_CONCURRENCY',
+                    'MAX_AUTO_UPLOAD_CONCURRENCY', 'DEFAULT_PART_CONCURRENCY', 'DEFAULT_UPLOAD_RETRIES',
+                    'StageManifest', 'S3KeyIndex', 'auto_upload_concurrency', 'TransferError', 'TransferEngine')),
+        ('utils', ('get_cache_dir', 'DEFAULT_MAX_ATTEMPTS', 'THROTTLING_ERRORS', 'RateLimiter',
+                   'SharedCredentialProvider', 'ClientFactory', 'Logger', 'CFNYAMLHandler')),
+        ('validator', ('DEFAULT_VALIDATION_CONCURRENCY', 'template_hash', 'TemplateValidator'))):
+    _EXPORTS.update(dict.fromkeys(_names, _module))
+
+__all__ = sorted(_EXPORTS)
+
+
+def _import(module):
+    # __import__ rather than importlib.import_module, so the submodules show up in -X importtime
+    __import__(__name__ + '.' + module)
+    return sys.modules[__name__ + '.' + module]
+
+
+def __getattr__(name):
+    if name in _MODULES:
+        return _import(name)
+    module = _EXPORTS.get(name)
+    if module is not None:
+        value = getattr(_import(module), name)
+    elif not name.startswith('_'):
+        # Any other public name of the submodules, as exported by star imports before
+        for module in reversed(_MODULES):
+            submodule = _import(module)
+            if hasattr(submodule, name):
+                value = getattr(submodule, name)
+                break
+        else:
+            raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    else:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
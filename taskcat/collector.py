@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# authors:
+# Tony Vattathil <tonynv@amazon.com>, <avattathil@gmail.com>
+# Santiago Cardenas <sancard@amazon.com>, <santiago[dot]cardenas[at]outlook[dot]com>
+# Shivansh Singh <sshvans@amazon.com>,
+# Jay McConnell <jmmccon@amazon.com>,
+# Andrew Glenn <andglenn@amazon.com>
+from __future__ import print_function
+
+import datetime
+import logging
+import os
+import shutil
+import textwrap
+from collections import OrderedDict
+from itertools import chain
+from multiprocessing.dummy import Pool as ThreadPool
+
+from .poller import get_stack_region
+
+DEFAULT_WALK_CONCURRENCY = 16
+DEFAULT_LOG_CONCURRENCY = 16
+LOG_BUFFER_SIZE = 64 * 1024
+STACK_RESOURCE_TYPE = 'AWS::CloudFormation::Stack'
+# Event log columns and their minimum widths, the last column is not padded
+EVENT_COLUMNS = (('TimeStamp', 32),
+                 ('ResourceStatus', 44),
+                 ('ResourceType', 42),
+                 ('LogicalResourceId', 42),
+                 ('ResourceStatusReason', 0))
+
+logger = logging.getLogger('taskcat')
+
+
+class StackInventory(object):
+    """
+    Inventory of the resources of stacks and all their nested stacks, shared by the logs,
+    reports and deep cleanup of a run.
+
+    Each stack is listed once with a paginated list_stack_resources call and its resources are
+    memoized. Trees are walked level by level, the stacks of a level (across all the trees and
+    regions) are listed concurrently. Stacks which cannot be listed are recorded in errors and
+    treated as having no resources.
+
+    Stacks are identified by arn, or by name and region.
+
+    Example usage:
+
+    inventory = StackInventory(ClientFactory())
+    inventory.walk([stack_id_1, stack_id_2])
+    resources = inventory.get_resources(stack_id_1)
+    """
+
+    def __init__(self, boto_client, concurrency=DEFAULT_WALK_CONCURRENCY):
+        """
+        :param boto_client: ClientFactory object used to get CloudFormation clients
+        :param concurrency: Maximum number of stacks listed concurrently
+        """
+        self._boto_client = boto_client
+        self._concurrency = max(1, int(concurrency))
+        self._resources = {}
+        self.errors = {}
+
+    @staticmethod
+    def _key(stack, region=None):
+        if stack.startswith('arn:'):
+            return get_stack_region(stack), stack
+        return region, stack
+
+    def _list_resources(self, key):
+        region, stack = key
+        try:
+            cfn = self._boto_client.get('cloudformation', region=region)
+            resources = []
+            paginator = cfn.get_paginator('list_stack_resources')
+            for summary in paginator.paginate(StackName=stack).search('StackResourceSummaries'):
+                # Physical ids are missing for resources which failed to create
+                if summary and 'PhysicalResourceId' in summary:
+                    resources.append({'logicalId': summary['LogicalResourceId'],
+                                      'physicalId': summary['PhysicalResourceId'],
+                                      'resourceType': summary['ResourceType']})
+            return resources, None
+        except Exception as e:
+            return [], e
+
+    def walk(self, stacks, region=None):
+        """
+        Lists the resources of the given stacks and of all their nested stacks.
+
+        :param stacks: List of stack arns (or names in the given region)
+        :param region: Region of the stacks given by name
+        """
+        level = list(OrderedDict.fromkeys(self._key(stack, region) for stack in stacks))
+        while level:
+            level = [key for key in level if key not in self._resources]
+            if not level:
+                break
+            # Create the regional clients up front, so the workers only read the client cache
+            for key_region in OrderedDict.fromkeys(key[0] for key in level):
+                self._boto_client.get('cloudformation', region=key_region)
+            pool = ThreadPool(min(self._concurrency, len(level)))
+            try:
+                results = pool.map(self._list_resources, level)
+            finally:
+                pool.close()
+                pool.join()
+
+            children = []
+            for key, (resources, error) in zip(level, results):
+                self._resources[key] = resources
+                if error is not None:
+                    logger.debug("unable to list resources of %s: %s", key[1], error)
+                    self.errors[key[1]] = error
+                children.extend(self._key(resource['physicalId']) for resource in resources
+                                if resource['resourceType'] == STACK_RESOURCE_TYPE)
+            level = children
+
+    def _stack_resources(self, stack, region=None):
+        key = self._key(stack, region)
+        if key not in self._resources:
+            self.walk([stack], region)
+        return self._resources[key]
+
+    def get_child_stacks(self, stack, region=None):
+        """
+        Returns the arns of the direct nested stacks of a stack.
+
+        :param stack: Stack arn (or name in the given region)
+        :param region: Region of a stack given by name
+        """
+        return [resource['physicalId'] for resource in self._stack_resources(stack, region)
+                if resource['resourceType'] == STACK_RESOURCE_TYPE]
+
+    def get_resources(self, stack, region=None, include_stacks=False):
+        """
+        Returns the resources of a stack and of all its nested stacks.
+
+        :param stack: Stack arn (or name in the given region)
+        :param region: Region of a stack given by name
+        :param include_stacks: Set to True to include the nested stacks themselves
+        :return: List of {'logicalId': 'string', 'physicalId': 'string', 'resourceType': 'string'}
+        """
+        resources = []
+        for resource in self._stack_resources(stack, region):
+            if resource['resourceType'] == STACK_RESOURCE_TYPE:
+                if include_stacks:
+                    resources.append(resource)
+                resources.extend(self.get_resources(resource['physicalId'], include_stacks=include_stacks))
+            else:
+                resources.append(resource)
+        return resources
+
+
+def get_stack_name(stack_id):
+    """
+    Returns the name of a stack given its arn.
+
+    :param stack_id: Stack arn (arn:aws:cloudformation:<region>:<account>:stack/<name>/<uuid>)
+    """
+    return stack_id.split(':')[5].split('/')[1]
+
+
+def iter_stack_event_pages(cfn_client, stack):
+    """
+    Yields the events of a stack page by page, most recent first.
+
+    :param cfn_client: CloudFormation client of the stack region
+    :param stack: Stack arn or name
+    """
+    paginator = cfn_client.get_paginator('describe_stack_events')
+    for page in paginator.paginate(StackName=stack):
+        yield page.get('StackEvents', [])
+
+
+def format_event_row(values):
+    """
+    Formats one line of the event log table.
+
+    :param values: Values of the EVENT_COLUMNS, in order
+    """
+    return '  '.join(str(value).ljust(width)
+                     for value, (_, width) in zip(values, EVENT_COLUMNS)).rstrip() + '\n'
+
+
+def get_status_reason(event):
+    """
+    Returns the status reason shown for a stack given its most recent event.
+    """
+    if event['ResourceStatus'] == 'CREATE_COMPLETE':
+        return "Stack launch was successful"
+    return event.get('ResourceStatusReason') or 'Unknown'
+
+
+class StackTimings(object):
+    """
+    Start and end time of a stack and create duration of each of its resources, accumulated
+    from the stack events (in any order).
+    """
+
+    def __init__(self, stack_id):
+        """
+        :param stack_id: Stack arn
+        """
+        self.stack_id = stack_id
+        self.started = None
+        self.finished = None
+        self._resources = {}
+
+    def add(self, event):
+        """
+        Accounts for one stack event.
+        """
+        timestamp = event['Timestamp']
+        if event.get('PhysicalResourceId') == self.stack_id and event['ResourceType'] == STACK_RESOURCE_TYPE:
+            self.started = timestamp if self.started is None else min(self.started, timestamp)
+            self.finished = timestamp if self.finished is None else max(self.finished, timestamp)
+        elif event['ResourceStatus'].startswith('CREATE_'):
+            resource = self._resources.get(event['LogicalResourceId'])
+            if resource is None:
+                self._resources[event['LogicalResourceId']] = [event['ResourceType'], timestamp, timestamp]
+            else:
+                resource[1] = min(resource[1], timestamp)
+                resource[2] = max(resource[2], timestamp)
+
+    def get_resource_durations(self):
+        """
+        Returns the create duration of each resource.
+
+        :return: Dictionary of logical id => (resource type, duration in seconds)
+        """
+        return dict((logical_id, (resource_type, (finished - started).total_seconds()))
+                    for logical_id, (resource_type, started, finished) in self._resources.items())
+
+
+class StackLogCollector(object):
+    """
+    Writes the CloudFormation event logs of stacks and all their nested stacks.
+
+    Every stack of every tree gets its own section, collected concurrently: events are read
+    page by page and streamed through a buffered writer into a part file, so memory does not
+    grow with the number of events. Once all stacks are collected, the parts of each tree are
+    appended to its log file in tree order (parent first, then each child and its own children).
+    The StackTimings of every collected stack are kept in timings.
+
+    Example usage:
+
+    collector = StackLogCollector(ClientFactory(), StackInventory(ClientFactory()))
+    sections = collector.collect({'logs/stack-us-east-1-cfnlogs.txt': stack_id})
+    """
+
+    def __init__(self, boto_client, inventory, concurrency=DEFAULT_LOG_CONCURRENCY):
+        """
+        :param boto_client: ClientFactory object used to get CloudFormation clients
+        :param inventory: StackInventory used to find the nested stacks
+        :param concurrency: Maximum number of stacks collected concurrently
+        """
+        self._boto_client = boto_client
+        self._inventory = inventory
+        self._concurrency = max(1, int(concurrency))
+        self.timings = {}
+
+    def _tree(self, stack):
+        stacks = [stack]
+        for child in self._inventory.get_child_stacks(stack):
+            stacks.extend(self._tree(child))
+        return stacks
+
+    def _write_section(self, job):
+        stack, part_path = job
+        try:
+            cfn = self._boto_client.get('cloudformation', region=get_stack_region(stack))
+            pages = iter_stack_event_pages(cfn, stack)
+            first_page = next(pages, [])
+            if not first_page:
+                return None, None
+            reason = get_status_reason(first_page[0])
+            timings = StackTimings(stack)
+            error = None
+            with open(part_path, 'w', buffering=LOG_BUFFER_SIZE) as f:
+                f.write("-----------------------------------------------------------------------------\n")
+                f.write("Region: " + get_stack_region(stack) + "\n")
+                f.write("StackName: " + get_stack_name(stack) + "\n")
+                f.write("*****************************************************************************\n")
+                f.write("ResourceStatusReason:  \n")
+                f.write(textwrap.fill(str(reason), 85) + "\n")
+                f.write("*****************************************************************************\n")
+                f.write("*****************************************************************************\n")
+                f.write("Events:  \n")
+                f.write(format_event_row([name for name, _ in EVENT_COLUMNS]))
+                f.write(format_event_row(['-' * max(width, len(name)) for name, width in EVENT_COLUMNS]))
+                try:
+                    for page in chain([first_page], pages):
+                        for event in page:
+                            timings.add(event)
+                            f.write(format_event_row([event['Timestamp'],
+                                                      event['ResourceStatus'],
+                                                      event['ResourceType'],
+                                                      event['LogicalResourceId'],
+                                                      event.get('ResourceStatusReason', '')]))
+                except Exception as e:
+                    # The events read before the error are kept in the log
+                    error = e
+                f.write("*****************************************************************************\n")
+                f.write("-----------------------------------------------------------------------------\n")
+                f.write("Tested on: " + datetime.datetime.now().strftime("%A, %d. %B %Y %I:%M%p") + "\n")
+                f.write("-----------------------------------------------------------------------------\n\n")
+            self.timings[stack] = timings
+            return reason, error
+        except Exception as e:
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+            return None, e
+
+    def collect(self, logs):
+        """
+        Writes the event logs of the given stack trees.
+
+        :param logs: Dictionary of log file path => arn of the top level stack. Sections are
+            appended to existing log files.
+
+        :return: List of (log file path, stack arn, status reason, exception) for every stack,
+            in log and tree order. The reason is None for stacks without events, or which
+            could not be described. Stacks whose events could only be read in part have both a
+            reason and an exception, their log section holds the events read before the error.
+        """
+        self._inventory.walk(list(logs.values()))
+        jobs = []
+        for logpath, stack in logs.items():
+            for index, tree_stack in enumerate(self._tree(stack)):
+                jobs.append((logpath, tree_stack, '{}.{}.part'.format(logpath, index)))
+        if not jobs:
+            return []
+
+        # Create the regional clients up front, so the workers only read the client cache
+        for region in OrderedDict.fromkeys(get_stack_region(stack) for _, stack, _ in jobs):
+            self._boto_client.get('cloudformation', region=region)
+        pool = ThreadPool(min(self._concurrency, len(jobs)))
+        try:
+            results = pool.map(self._write_section, [(stack, part_path) for _, stack, part_path in jobs])
+        finally:
+            pool.close()
+            pool.join()
+
+        sections = []
+        for logpath in logs:
+            tree = [(stack, part_path, reason, error)
+                    for (job_logpath, stack, part_path), (reason, error) in zip(jobs, results)
+                    if job_logpath == logpath]
+            if any(reason is not None for _, _, reason, _ in tree):
+                with open(logpath, 'a') as log_output:
+                    for stack, part_path, reason, error in tree:
+                        if reason is not None:
+                            with open(part_path, 'r') as part:
+                                shutil.copyfileobj(part, log_output, LOG_BUFFER_SIZE)
+                            os.remove(part_path)
+            for stack, part_path, reason, error in tree:
+                if error is not None:
+                    logger.debug("unable to collect the events of %s: %s", stack, error)
+                sections.append((logpath, stack, reason, error))
+        return sections
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# authors:
+# Tony Vattathil <tonynv@amazon.com>, <avattathil@gmail.com>
+# Santiago Cardenas <sancard@amazon.com>, <santiago[dot]cardenas[at]outlook[dot]com>
+# Shivansh Singh <sshvans@amazon.com>,
+# Jay McConnell <jmmccon@amazon.com>,
+# Andrew Glenn <andglenn@amazon.com>
+from __future__ import print_function
+
+import copy
+from collections import namedtuple
+
+
+class TestPlan(namedtuple('TestPlan', ['name', 'template_file', 'template_url', 'template_type',
+                                       'template_hash', 'parameter_file', 'parameter_url', 'parameter_content',
+                                       'parameters', 'regions'])):
+    """
+    Everything needed to run a test, resolved once from the config and the staged files.
+
+    :param name: Test name
+    :param template_file: Template file name
+    :param template_url: S3 url of the staged template
+    :param template_type: 'json' or 'yaml'
+    :param template_hash: SHA-256 digest of the template content
+    :param parameter_file: Parameter input file name
+    :param parameter_url: S3 url of the staged parameter input file
+    :param parameter_content: Raw content of the parameter input file
+    :param parameters: Parsed parameter input (None if the file is not valid json)
+    :param regions: Tuple of the regions the test runs in
+
+    Plans are immutable and can be shared between threads. Use get_parameters() to get a
+    copy of the parameters which can be modified.
+    """
+    __slots__ = ()
+
+    def get_parameters(self):
+        """
+        Returns a copy of the parsed parameter input.
+        """
+        if self.parameters is None:
+            raise ValueError("Parameter input [{}] is not valid json".format(self.parameter_file))
+        return copy.deepcopy(self.parameters)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# authors:
+# Tony Vattathil <tonynv@amazon.com>, <avattathil@gmail.com>
+# Santiago Cardenas <sancard@amazon.com>, <santiago[dot]cardenas[at]outlook[dot]com>
+# Shivansh Singh <sshvans@amazon.com>,
+# Jay McConnell <jmmccon@amazon.com>,
+# Andrew Glenn <andglenn@amazon.com>
+from __future__ import print_function
+
+from collections import OrderedDict
+from multiprocessing.dummy import Pool as ThreadPool
+
+DEFAULT_LAUNCH_CONCURRENCY = 8
+
+
+class LaunchResult(object):
+    """
+    Outcome of a single create_stack call.
+    """
+
+    def __init__(self, testdata, region, stack_name):
+        self.testdata = testdata
+        self.region = region
+        self.stack_name = stack_name
+        self.stack = None
+        self.error = None
+
+
+class StackLauncher(object):
+    """
+    Submits CloudFormation create_stack calls on a bounded pool of worker threads.
+
+    Launches are queued with add() and submitted with launch(). Submission is interleaved
+    across regions so that concurrent calls are spread over the regional endpoints, results
+    are returned in the order the launches were queued.
+
+    Example usage:
+
+    launcher = StackLauncher(ClientFactory(), concurrency=8)
+    launcher.add(testdata, 'us-east-1', StackName='mystack', TemplateURL=url, Parameters=params)
+    for result in launcher.launch():
+        if result.error:
+            print(result.error)
+    """
+
+    def __init__(self, boto_client, concurrency=DEFAULT_LAUNCH_CONCURRENCY):
+        """
+        :param boto_client: ClientFactory object used to get CloudFormation clients
+        :param concurrency: Maximum number of create_stack calls in flight
+        """
+        self._boto_client = boto_client
+        self._concurrency = max(1, int(concurrency))
+        self._launches = []
+
+    def add(self, testdata, region, **stack_args):
+        """
+        Queues a stack launch.
+
+        :param testdata: TestData object the stack belongs to
+        :param region: AWS region to launch the stack in
+        :param stack_args: Keyword arguments for create_stack (must include StackName)
+        """
+        self._launches.append((LaunchResult(testdata, region, stack_args['StackName']), stack_args))
+
+    @staticmethod
+    def _interleaved(launches):
+        by_region = OrderedDict()
+        for launch in launches:
+            by_region.setdefault(launch[0].region, []).append(launch)
+        queues = list(by_region.values())
+        ordered = []
+        while queues:
+            ordered.extend(queue.pop(0) for queue in queues)
+            queues = [queue for queue in queues if queue]
+        return ordered
+
+    def create_stack(self, testdata, region, **stack_args):
+        """
+        Launches a single stack right away (used by the Orchestrator, which limits the
+        concurrency itself).
+
+        :param testdata: TestData object the stack belongs to
+        :param region: AWS region to launch the stack in
+        :param stack_args: Keyword arguments for create_stack (must include StackName)
+
+        :return: LaunchResult object
+        """
+        return self._create_stack((LaunchResult(testdata, region, stack_args['StackName']), stack_args))
+
+    def _create_stack(self, launch):
+        result, stack_args = launch
+        try:
+            cfn = self._boto_client.get('cloudformation', region=result.region)
+            result.stack = cfn.create_stack(**stack_args)
+        except Exception as e:
+            result.error = e
+        return result
+
+    def launch(self):
+        """
+        Submits all queued launches and waits for them to complete.
+
+        :return: List of LaunchResult objects, in the order the launches were queued
+        """
+        launches, self._launches = self._launches, []
+        if not launches:
+            return []
+        ordered = self._interleaved(launches)
+
+        # Create the regional clients up front, so the workers only read the client cache
+        for region in OrderedDict.fromkeys(launch[0].region for launch in launches):
+            self._boto_client.get('cloudformation', region=region)
+
+        pool = ThreadPool(min(self._concurrency, len(ordered)))
+        try:
+            pool.map(self._create_stack, ordered)
+        finally:
+            pool.close()
+            pool.join()
+        return [launch[0] for launch in launches]
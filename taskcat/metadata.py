@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# authors:
+# Tony Vattathil <tonynv@amazon.com>, <avattathil@gmail.com>
+# Santiago Cardenas <sancard@amazon.com>, <santiago[dot]cardenas[at]outlook[dot]com>
+# Shivansh Singh <sshvans@amazon.com>,
+# Jay McConnell <jmmccon@amazon.com>,
+# Andrew Glenn <andglenn@amazon.com>
+from __future__ import print_function
+
+import hashlib
+import json
+import logging
+import os
+import time
+from multiprocessing.dummy import Pool as ThreadPool
+from threading import Lock
+
+from .utils import get_cache_dir
+
+logger = logging.getLogger('taskcat')
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Time to live of each kind of cached metadata, in seconds
+DEFAULT_METADATA_TTLS = {
+    'account': DAY,
+    'azs': DAY,
+    'bucket_region': 7 * DAY,
+    'regions': DAY
+}
+
+
+class MetadataCache(object):
+    """
+    On-disk cache of account and region metadata which rarely changes: account id, availability
+    zones, bucket regions and enabled regions.
+
+    The account id is keyed by credential set and a hash of the access key in use, everything
+    else is keyed by account (AZ names are specific to each account) and region. Entries expire
+    after their TTL (see DEFAULT_METADATA_TTLS). The cache is stored in ~/.taskcat/metadata.json
+    and is safe to use from multiple threads.
+
+    Example usage:
+
+    metadata = MetadataCache(ClientFactory(), default_region='us-east-1')
+    metadata.prefetch(['us-east-1', 'us-west-2'])
+    azs = metadata.get_azs('us-west-2')
+    """
+
+    def __init__(self, boto_client, credential_set='default', default_region=None, path=None, ttls=None):
+        """
+        :param boto_client: ClientFactory object used for the lookups
+        :param credential_set: ClientFactory credential set used for the lookups
+        :param default_region: Region used for global lookups (account id, enabled regions)
+        :param path: Optional path to the cache file
+        :param ttls: Optional dictionary overriding DEFAULT_METADATA_TTLS
+        """
+        self._boto_client = boto_client
+        self._credential_set = credential_set
+        self._default_region = default_region
+        self._ttls = dict(DEFAULT_METADATA_TTLS, **(ttls or {}))
+        self._path = path or os.path.join(get_cache_dir(), 'metadata.json')
+        self._account = None
+        self._lock = Lock()
+        try:
+            with open(self._path, 'r') as f:
+                self._entries = json.load(f)
+        except (IOError, ValueError):
+            self._entries = {}
+
+    def _get(self, key, kind, loader):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry['expires'] > now:
+                return entry['value']
+        logger.debug("metadata cache miss [%s]", key)
+        value = loader()
+        with self._lock:
+            self._entries[key] = {'value': value, 'expires': now + self._ttls[kind]}
+            self._save()
+        return value
+
+    def _save(self):
+        now = time.time()
+        self._entries = {k: v for k, v in self._entries.items() if v['expires'] > now}
+        tmp_path = '{}.{}.tmp'.format(self._path, os.getpid())
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self._path)
+        except (IOError, OSError) as e:
+            logger.debug("unable to write metadata cache: %s", e)
+
+    def invalidate(self, key_prefix=''):
+        """
+        Drops the cached entries whose key starts with the given prefix (all entries by default).
+
+        :param key_prefix: Key prefix, for example '<account>/<region>/'
+        """
+        with self._lock:
+            self._entries = {k: v for k, v in self._entries.items() if not k.startswith(key_prefix)}
+            self._save()
+
+    def get_account_id(self, region=None, sts_client=None):
+        """
+        Returns the id of the account the credentials belong to.
+
+        :param region: Region used for the STS call, defaults to default_region
+        :param sts_client: Optional STS client to use
+        """
+        region = region or self._default_region
+        if sts_client is None:
+            sts_client = self._boto_client.get('sts', region=region, credential_set=self._credential_set)
+        credentials = self._boto_client.get_session(self._credential_set, region).get_credentials()
+        access_key = credentials.access_key if credentials else ''
+        identity = hashlib.sha256('{}:{}'.format(self._credential_set, access_key).encode()).hexdigest()[:16]
+        self._account = self._get('identity/{}'.format(identity), 'account',
+                                  lambda: sts_client.get_caller_identity().get('Account'))
+        return self._account
+
+    @property
+    def account(self):
+        if self._account is None:
+            self.get_account_id()
+        return self._account
+
+    def get_azs(self, region):
+        """
+        Returns the names of the available availability zones of a region.
+
+        :param region: AWS region
+        """
+        def _load():
+            ec2_client = self._boto_client.get('ec2', region=region, credential_set=self._credential_set)
+            availability_zones = ec2_client.describe_availability_zones(
+                Filters=[{'Name': 'state', 'Values': ['available']}])
+            return [az['ZoneName'] for az in availability_zones['AvailabilityZones']]
+        return self._get('{}/{}/azs'.format(self.account, region), 'azs', _load)
+
+    def get_bucket_region(self, bucket, s3_client=None):
+        """
+        Returns the LocationConstraint of a bucket (None for us-east-1).
+
+        :param bucket: Bucket name
+        :param s3_client: Optional S3 client to use
+        """
+        def _load():
+            client = s3_client or self._boto_client.get('s3', region=self._default_region,
+                                                       credential_set=self._credential_set, s3v4=True)
+            return client.get_bucket_location(Bucket=bucket)['LocationConstraint']
+        return self._get('{}/s3/{}'.format(self.account, bucket), 'bucket_region', _load)
+
+    def get_enabled_regions(self):
+        """
+        Returns the names of the regions enabled in the account.
+        """
+        def _load():
+            ec2_client = self._boto_client.get('ec2', region=self._default_region,
+                                               credential_set=self._credential_set)
+            return sorted(r['RegionName'] for r in ec2_client.describe_regions()['Regions'])
+        return self._get('{}/regions'.format(self.account), 'regions', _load)
+
+    def prefetch(self, regions, concurrency=16):
+        """
+        Loads the metadata of the given regions concurrently, so that later lookups are served from
+        the cache. Regions which are not enabled in the account are skipped.
+
+        :param regions: List of AWS regions
+        :param concurrency: Maximum number of regions fetched concurrently
+        :return: List of the given regions which are not enabled in the account
+        """
+        enabled = self.get_enabled_regions()
+        disabled = [region for region in regions if region not in enabled]
+        regions = [region for region in regions if region in enabled]
+        if not regions:
+            return disabled
+        # Create the regional clients up front, so the workers only read the client cache
+        for region in regions:
+            self._boto_client.get('ec2', region=region, credential_set=self._credential_set)
+        pool = ThreadPool(max(1, min(concurrency, len(regions))))
+        try:
+            pool.map(self.get_azs, regions)
+        finally:
+            pool.close()
+            pool.join()
+        return disabled
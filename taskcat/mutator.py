@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# authors:
+# Tony Vattathil <tonynv@amazon.com>, <avattathil@gmail.com>
+# Santiago Cardenas <sancard@amazon.com>, <santiago[dot]cardenas[at]outlook[dot]com>
+# Shivansh Singh <sshvans@amazon.com>,
+# Jay McConnell <jmmccon@amazon.com>,
+# Andrew Glenn <andglenn@amazon.com>
+from __future__ import print_function
+
+import re
+
+
+class ParamMutator(object):
+    """
+    Resolves $[taskcat_*] placeholders in CloudFormation input parameters.
+
+    Each placeholder is registered with a name, a regex (matched right after the opening '$[')
+    and a resolver function. All the registered regexes are compiled into a single pattern,
+    so every parameter value is scanned once and the placeholder found is dispatched to its
+    resolver by name. As in the parameter files taskcat always supported, the resolved value
+    replaces the whole parameter value.
+
+    Example usage:
+
+    mutator = ParamMutator()
+    mutator.register('keypair', r'\\w+_getkeypair\\]', lambda match, region: 'cikey', cacheable=True)
+    params = mutator.mutate(params, 'us-east-1')
+    """
+
+    def __init__(self):
+        self._resolvers = []
+        self._by_name = {}
+        self._pattern = None
+
+    def register(self, name, pattern, resolver, cacheable=False):
+        """
+        Registers a placeholder resolver.
+
+        :param name: Placeholder name, must be a valid regex group name
+        :param pattern: Regex matching the placeholder after its opening '$['. Named groups
+            must be prefixed with the placeholder name to stay unique.
+        :param resolver: Function called with (match object, region), returning the value
+        :param cacheable: Set to True if the resolver always returns the same value for a given
+            placeholder and region, so it is only called once per mutate() call
+        """
+        self._resolvers.append((name, pattern))
+        self._by_name[name] = (resolver, cacheable)
+        self._pattern = None
+
+    @property
+    def pattern(self):
+        """
+        Compiled pattern matching any of the registered placeholders.
+        """
+        if self._pattern is None:
+            self._pattern = re.compile(
+                r'\$\[(?:{})'.format('|'.join(
+                    '(?P<{}>{})'.format(name, pattern) for name, pattern in self._resolvers)),
+                re.IGNORECASE)
+        return self._pattern
+
+    def resolve(self, value, region, memo=None):
+        """
+        Returns the resolved value of a single parameter value.
+
+        :param value: Parameter value
+        :param region: Region the stack is launched in
+        :param memo: Optional dictionary caching the results of cacheable resolvers
+        """
+        if type(value) == int:
+            value = str(value)
+        if '$[' not in value:
+            return value
+        match = self.pattern.search(value)
+        if not match:
+            return value
+        resolver, cacheable = self._by_name[match.lastgroup]
+        if not cacheable or memo is None:
+            return resolver(match, region)
+        key = (match.lastgroup, match.group(0).lower(), region)
+        if key not in memo:
+            memo[key] = resolver(match, region)
+        return memo[key]
+
+    def mutate(self, params, region):
+        """
+        Resolves the placeholders of a list of CloudFormation parameters, in place.
+
+        :param params: List of {'ParameterKey': 'string', 'ParameterValue': 'string'} dictionaries
+        :param region: Region the stack is launched in
+        :return: The updated list of parameters
+        """
+        memo = {}
+        for param in params:
+            param['ParameterValue'] = self.resolve(param['ParameterValue'], region, memo)
+        return params
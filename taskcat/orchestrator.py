@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# authors:
+# Tony Vattathil <tonynv@amazon.com>, <avattathil@gmail.com>
+# Santiago Cardenas <sancard@amazon.com>, <santiago[dot]cardenas[at]outlook[dot]com>
+# Shivansh Singh <sshvans@amazon.com>,
+# Jay McConnell <jmmccon@amazon.com>,
+# Andrew Glenn <andglenn@amazon.com>
+from __future__ import print_function
+
+import asyncio
+import sys
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from .launcher import StackLauncher
+from .stacker import I
+from .stacker import TestData
+
+DEFAULT_REGION_CONCURRENCY = 4
+DEFAULT_MAX_WORKERS = 32
+
+
+class PipelineAborted(Exception):
+    """
+    Raised in place of the SystemExit of a TaskCat method called on the executor, so that it
+    goes through the event loop like any other error and the pipeline can clean up.
+    """
+
+    def __init__(self, code):
+        Exception.__init__(self, code)
+        self.code = code
+
+
+class Orchestrator(object):
+    """
+    Runs the taskcat pipeline on an asyncio event loop.
+
+    Blocking boto3 calls are run on a thread pool executor, with at most region_concurrency
+    calls in flight per region, and at most launch_concurrency create_stack calls in flight
+    overall (the -l/--launch_concurrency option of TaskCat). Region metadata is prefetched while
+    the project is staged. Every test is validated before the first stack is launched, identical
+    templates once and concurrently, then the tests go through preparation and launch
+    independently: a test launches its stacks while the other tests are still being prepared.
+    If the pipeline is aborted after stacks were launched, the launched stacks are cleaned up.
+    The TaskCat methods used for each step remain usable on their own.
+
+    Staging itself is not overlapped with validation: the test plans are read back from the
+    staging bucket and templates are validated from their S3 urls, so the plans are built
+    once every file is uploaded.
+
+    Example usage:
+
+    tcat = TaskCat()
+    ...
+    testdata_list = Orchestrator(tcat).run(taskcat_cfg, test_list, 'tag')
+    """
+
+    def __init__(self, tcat, region_concurrency=DEFAULT_REGION_CONCURRENCY, max_workers=DEFAULT_MAX_WORKERS,
+                 launch_concurrency=None):
+        """
+        :param tcat: Configured TaskCat object
+        :param region_concurrency: Maximum number of blocking calls in flight per region
+        :param max_workers: Number of executor threads
+        :param launch_concurrency: Maximum number of create_stack calls in flight, defaults to the
+            launch concurrency of tcat
+        """
+        self._tcat = tcat
+        self._region_concurrency = max(1, int(region_concurrency))
+        self._max_workers = max(1, int(max_workers))
+        self._launch_concurrency = max(1, int(launch_concurrency or tcat.get_launch_concurrency()))
+        self._executor = None
+        self._limits = {}
+        self._launch_limit = None
+        self._launcher = None
+        self._testdata_list = []
+
+    def _limit(self, region):
+        # Semaphores are created on first use, inside the running loop
+        if region not in self._limits:
+            self._limits[region] = asyncio.Semaphore(self._region_concurrency)
+        return self._limits[region]
+
+    async def call(self, region, fn, *args, **kwargs):
+        """
+        Runs a blocking function on the executor, within the concurrency limit of a region.
+
+        :param region: AWS region the call is made to (None for global calls)
+        :param fn: Blocking function
+        :return: Return value of fn
+        """
+        async with self._limit(region):
+            loop = asyncio.get_event_loop()
+            try:
+                return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+            except SystemExit as e:
+                raise PipelineAborted(e.code)
+
+    def _warm_clients(self, regions):
+        # Create the clients up front, so the executor threads only read the client cache
+        boto_client = self._tcat.get_boto_client()
+        default_region = self._tcat.get_default_region()
+        boto_client.get('s3', region=default_region, s3v4=True)
+        boto_client.get('sts', region=default_region)
+        regions = set(regions)
+        if default_region:
+            regions.add(default_region)
+        for region in regions:
+            boto_client.get('cloudformation', region=region)
+            boto_client.get('ec2', region=region)
+
+    async def _validate(self, plans):
+        tcat = self._tcat
+        templates = OrderedDict()
+        for plan in plans:
+            templates.setdefault(plan.template_hash, plan.template_url)
+        # One batch, the distinct templates are validated concurrently by the validator
+        results = await self.call(tcat.get_default_region(), tcat.get_template_validator().validate, templates)
+        for plan in plans:
+            tcat.check_template_validation(plan, *results[plan.template_hash])
+            tcat.validate_plan_parameters(plan)
+
+    async def _launch(self, testdata, region, stack_args):
+        async with self._launch_limit:
+            result = await self.call(region, self._launcher.create_stack, testdata, region, **stack_args)
+        self._tcat.record_launch(result.testdata, result.region, result.stack_name, result.stack, result.error)
+
+    async def _run_test(self, plan, testdata, sprefix):
+        stacks = await self.call(None, self._tcat.prepare_test_stacks, plan, testdata, sprefix)
+        await asyncio.gather(*[self._launch(testdata, region, stack_args) for region, stack_args in stacks])
+        return testdata
+
+    async def launch(self, taskcat_cfg, test_list, sprefix):
+        """
+        Stages the project, validates every test, then prepares and launches the tests.
+
+        :param taskcat_cfg: TaskCat config as yaml object
+        :param test_list: List of tests
+        :param sprefix: Special prefix as string, used for tagging the stacks
+
+        :return: List of TestData objects
+        """
+        tcat = self._tcat
+        self._warm_clients(tcat.get_config_regions(taskcat_cfg))
+        tcat.get_metadata_cache()
+        await asyncio.gather(self.call(None, tcat.prefetch_metadata, taskcat_cfg),
+                             self.call(None, tcat.stage_in_s3, taskcat_cfg))
+        plans = await self.call(None, tcat.build_test_plans, taskcat_cfg, test_list)
+
+        # Shared state is initialized before the tests fan out
+        tcat.set_capabilities('CAPABILITY_NAMED_IAM')
+        tcat.get_param_mutator()
+        await self.call(None, tcat.get_param_overrides)
+        await self._validate(plans)
+
+        # Created inside the running loop, like the region semaphores
+        self._launch_limit = asyncio.Semaphore(self._launch_concurrency)
+        self._launcher = StackLauncher(tcat.get_boto_client(), self._launch_concurrency)
+        self._testdata_list = []
+        for plan in plans:
+            testdata = TestData()
+            testdata.set_test_name(plan.name)
+            self._testdata_list.append(testdata)
+        print(I + "Launching stacks (concurrency = %s)" % self._launch_concurrency)
+        # Every test runs to its end before an error is raised, so no launch is still in flight
+        # when the launched stacks are cleaned up
+        results = await asyncio.gather(*[self._run_test(plan, testdata, sprefix)
+                                         for plan, testdata in zip(plans, self._testdata_list)],
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        tcat.report_launches(self._testdata_list)
+        return list(self._testdata_list)
+
+    async def run_async(self, taskcat_cfg, test_list, sprefix, speed=5, report_filename='index.html'):
+        """
+        Runs the whole pipeline: staging, validation, launch, polling, report and cleanup.
+
+        :param taskcat_cfg: TaskCat config as yaml object
+        :param test_list: List of tests
+        :param sprefix: Special prefix as string, used for tagging the stacks
+        :param speed: Minimum interval between two polls of a stack, in seconds
+        :param report_filename: Name of the html report
+
+        :return: List of TestData objects
+        """
+        tcat = self._tcat
+        self._testdata_list = []
+        cleaned_up = False
+        try:
+            testdata_list = await self.launch(taskcat_cfg, test_list, sprefix)
+            await self.call(None, tcat.get_stackstatus, testdata_list, speed)
+            await self.call(None, tcat.createreport, testdata_list, report_filename)
+            cleaned_up = True
+            await self.call(None, tcat.cleanup, testdata_list, speed)
+        finally:
+            # The stacks launched before the pipeline was aborted are not left behind
+            launched = [testdata for testdata in self._testdata_list if testdata.get_test_stacks()]
+            if not cleaned_up and launched:
+                print(I + "Pipeline aborted, cleaning up the launched stacks")
+                await self.call(None, tcat.cleanup, launched, speed)
+        return testdata_list
+
+    def run(self, taskcat_cfg, test_list, sprefix, speed=5, report_filename='index.html'):
+        """
+        Runs the whole pipeline on a new event loop, see run_async().
+        """
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
+        self._limits = {}
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            return loop.run_until_complete(
+                self.run_async(taskcat_cfg, test_list, sprefix, speed, report_filename))
+        except PipelineAborted as e:
+            sys.exit(e.code)
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# authors:
+# Tony Vattathil <tonynv@amazon.com>, <avattathil@gmail.com>
+# Santiago Cardenas <sancard@amazon.com>, <santiago[dot]cardenas[at]outlook[dot]com>
+# Shivansh Singh <sshvans@amazon.com>,
+# Jay McConnell <jmmccon@amazon.com>,
+# Andrew Glenn <andglenn@amazon.com>
+from __future__ import print_function
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from multiprocessing.dummy import Pool as ThreadPool
+
+from .utils import get_cache_dir
+
+DEFAULT_POLL_CONCURRENCY = 16
+DEFAULT_MAX_POLL_INTERVAL = 60
+
+# Reported for stacks which no longer exist (describe_stacks fails on deleted stacks)
+STACK_DELETED = 'STACK_DELETED'
+
+# Every stack status but DELETE_COMPLETE, so list_stacks skips the (many) deleted stacks
+LIVE_STACK_STATUSES = [
+    'CREATE_IN_PROGRESS', 'CREATE_FAILED', 'CREATE_COMPLETE',
+    'ROLLBACK_IN_PROGRESS', 'ROLLBACK_FAILED', 'ROLLBACK_COMPLETE',
+    'DELETE_IN_PROGRESS', 'DELETE_FAILED',
+    'UPDATE_IN_PROGRESS', 'UPDATE_COMPLETE_CLEANUP_IN_PROGRESS', 'UPDATE_COMPLETE', 'UPDATE_FAILED',
+    'UPDATE_ROLLBACK_IN_PROGRESS', 'UPDATE_ROLLBACK_FAILED', 'UPDATE_ROLLBACK_COMPLETE_CLEANUP_IN_PROGRESS',
+    'UPDATE_ROLLBACK_COMPLETE', 'REVIEW_IN_PROGRESS',
+    'IMPORT_IN_PROGRESS', 'IMPORT_COMPLETE', 'IMPORT_ROLLBACK_IN_PROGRESS', 'IMPORT_ROLLBACK_FAILED',
+    'IMPORT_ROLLBACK_COMPLETE',
+]
+
+logger = logging.getLogger('taskcat')
+
+
+def get_stack_region(stack_id):
+    """
+    Returns the region of a stack given its arn.
+
+    :param stack_id: Stack arn (arn:aws:cloudformation:<region>:<account>:stack/<name>/<uuid>)
+    """
+    return stack_id.split(':')[3]
+
+
+class StackPoller(object):
+    """
+    Fetches the status of many stacks at once.
+
+    Stacks are grouped by region and each region is queried with a single paginated
+    list_stacks call filtered on the live statuses (stopping as soon as every stack was
+    found), regions are queried concurrently. Stacks missing from the listing (deleted, or
+    in a status unknown to the filter) are described one by one, as are all the stacks of a
+    region where list_stacks cannot be used.
+    """
+
+    def __init__(self, boto_client, concurrency=DEFAULT_POLL_CONCURRENCY):
+        """
+        :param boto_client: ClientFactory object used to get CloudFormation clients
+        :param concurrency: Maximum number of regions queried concurrently
+        """
+        self._boto_client = boto_client
+        self._concurrency = max(1, int(concurrency))
+
+    def poll(self, stack_ids):
+        """
+        Returns the current status of the given stacks.
+
+        :param stack_ids: List of stack arns
+        :return: Dictionary of stack arn => stack status (STACK_DELETED for deleted stacks)
+        """
+        by_region = OrderedDict()
+        for stack_id in stack_ids:
+            by_region.setdefault(get_stack_region(stack_id), set()).add(stack_id)
+        if not by_region:
+            return {}
+
+        # Create the regional clients up front, so the workers only read the client cache
+        for region in by_region:
+            self._boto_client.get('cloudformation', region=region)
+
+        pool = ThreadPool(min(self._concurrency, len(by_region)))
+        try:
+            results = pool.map(lambda item: self._poll_region(*item), by_region.items())
+        finally:
+            pool.close()
+            pool.join()
+
+        states = {}
+        for region_states in results:
+            states.update(region_states)
+        return states
+
+    def _poll_region(self, region, stack_ids):
+        cfn = self._boto_client.get('cloudformation', region=region)
+        pending = set(stack_ids)
+        states = {}
+        try:
+            paginator = cfn.get_paginator('list_stacks')
+            pages = paginator.paginate(StackStatusFilter=LIVE_STACK_STATUSES)
+            for summary in pages.search('StackSummaries'):
+                if summary and summary['StackId'] in pending:
+                    states[summary['StackId']] = summary['StackStatus']
+                    pending.discard(summary['StackId'])
+                    if not pending:
+                        break
+        except Exception as e:
+            logger.debug("list_stacks failed in %s, describing stacks one by one: %s", region, e)
+            return {stack_id: self._describe_stack(cfn, stack_id) for stack_id in stack_ids}
+        for stack_id in pending:
+            states[stack_id] = self._describe_stack(cfn, stack_id)
+        return states
+
+    @staticmethod
+    def _describe_stack(cfn, stack_id):
+        # noinspection PyBroadException
+        try:
+            for result in cfn.describe_stacks(StackName=stack_id)['Stacks']:
+                status = result.get('StackStatus')
+                return STACK_DELETED if status == 'DELETE_COMPLETE' else status
+        except Exception:
+            pass
+        return STACK_DELETED
+
+
+class StackDurations(object):
+    """
+    Record of how long stacks took to create and delete in previous runs.
+
+    Durations are keyed by '<project>/<test>/<region>' and phase ('create' or 'delete'), the
+    last few durations of each key are kept in ~/.taskcat/history/durations.json
+    """
+
+    def __init__(self, path=None, keep=10):
+        """
+        :param path: Optional path to the durations file
+        :param keep: Number of durations kept for each key and phase
+        """
+        if path is None:
+            path = os.path.join(get_cache_dir('history'), 'durations.json')
+        self._path = path
+        self._keep = keep
+        try:
+            with open(self._path, 'r') as f:
+                self._durations = json.load(f)
+        except (IOError, ValueError):
+            self._durations = {}
+
+    def expected(self, key, phase):
+        """
+        Returns the expected duration (median of the recorded durations) in seconds, or None.
+
+        :param key: Stack key ('<project>/<test>/<region>')
+        :param phase: 'create' or 'delete'
+        """
+        durations = sorted(self._durations.get('{}/{}'.format(key, phase), []))
+        if not durations:
+            return None
+        return durations[len(durations) // 2]
+
+    def record(self, key, phase, duration):
+        """
+        Records the duration of a completed stack operation.
+
+        :param key: Stack key ('<project>/<test>/<region>')
+        :param phase: 'create' or 'delete'
+        :param duration: Duration in seconds
+        """
+        durations = self._durations.setdefault('{}/{}'.format(key, phase), [])
+        durations.append(round(duration, 1))
+        del durations[:-self._keep]
+
+    def save(self):
+        """
+        Writes the durations to disk.
+        """
+        tmp_path = self._path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._durations, f)
+        os.replace(tmp_path, self._path)
+
+
+class PollScheduler(object):
+    """
+    Decides when each stack needs to be polled again.
+
+    The polling interval of a stack grows with the time the stack has been in progress. When
+    previous runs recorded how long the stack usually takes, the interval is instead derived
+    from the expected time left and tightens down to min_interval as the stack nears its
+    expected completion, then backs off again if the stack overruns.
+    """
+
+    # Phase of a stack for each in progress status, stacks in any other status are not polled anymore
+    PHASES = {'CREATE_IN_PROGRESS': 'create', 'DELETE_IN_PROGRESS': 'delete'}
+
+    # Statuses for which the duration of the phase is recorded
+    COMPLETE_STATUSES = {'create': 'CREATE_COMPLETE', 'delete': STACK_DELETED}
+
+    def __init__(self, min_interval=5, max_interval=DEFAULT_MAX_POLL_INTERVAL, backoff=0.1, durations=None,
+                 clock=time.time):
+        """
+        :param min_interval: Shortest interval between two polls of a stack, in seconds
+        :param max_interval: Longest interval between two polls of a stack, in seconds
+        :param backoff: Fraction of the elapsed (or overrun) time used as the polling interval
+        :param durations: Optional StackDurations object used to predict completion
+        :param clock: Function returning the current time in seconds
+        """
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.backoff = backoff
+        self._durations = durations
+        self._clock = clock
+        self._stacks = OrderedDict()
+
+    def track(self, stack_id, key):
+        """
+        Starts tracking a stack, it is due for polling immediately.
+
+        :param stack_id: Stack arn
+        :param key: Key of the stack in the durations history ('<project>/<test>/<region>')
+        """
+        now = self._clock()
+        self._stacks[stack_id] = {'key': key, 'phase': None, 'started': now, 'next_poll': now}
+
+    def interval(self, elapsed, expected=None):
+        """
+        Returns the number of seconds to wait before polling a stack again.
+
+        :param elapsed: Time the stack has been in progress, in seconds
+        :param expected: Expected duration of the operation in seconds, if known
+        """
+        if expected is None:
+            interval = elapsed * self.backoff
+        elif elapsed < expected:
+            interval = (expected - elapsed) / 2
+        else:
+            interval = (elapsed - expected) * self.backoff
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def update(self, stack_id, status):
+        """
+        Schedules the next poll of a stack given its latest status.
+
+        :param stack_id: Stack arn
+        :param status: Stack status returned by the last poll
+        """
+        stack = self._stacks[stack_id]
+        now = self._clock()
+        phase = self.PHASES.get(status)
+        if phase:
+            if stack['phase'] != phase:
+                if stack['phase'] is not None:
+                    stack['started'] = now
+                stack['phase'] = phase
+            expected = self._durations.expected(stack['key'], phase) if self._durations else None
+            stack['next_poll'] = now + self.interval(now - stack['started'], expected)
+        else:
+            if stack['phase'] and self._durations and status == self.COMPLETE_STATUSES[stack['phase']]:
+                self._durations.record(stack['key'], stack['phase'], now - stack['started'])
+            stack['phase'] = None
+            stack['next_poll'] = None
+
+    def active(self):
+        """
+        Returns the arns of the stacks which still need to be polled.
+        """
+        return [stack_id for stack_id, stack in self._stacks.items() if stack['next_poll'] is not None]
+
+    def due(self):
+        """
+        Returns the arns of the stacks due for polling.
+        """
+        now = self._clock()
+        return [stack_id for stack_id, stack in self._stacks.items()
+                if stack['next_poll'] is not None and stack['next_poll'] <= now]
+
+    def next_poll_in(self):
+        """
+        Returns the number of seconds until the next stack is due for polling (0 if none is active).
+        """
+        next_polls = [stack['next_poll'] for stack in self._stacks.values() if stack['next_poll'] is not None]
+        if not next_polls:
+            return 0
+        return max(0, min(next_polls) - self._clock())
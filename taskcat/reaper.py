@@ -7,9 +7,13 @@
 # Jay McConnell <jmmccon@amazon.com>,
 # Andrew Glenn <andglenn@amazon.com>
 from __future__ import print_function
-import botocore
 from botocore.exceptions import ClientError
+from botocore.exceptions import WaiterError
 import logging
+import time
+from multiprocessing.dummy import Pool as ThreadPool
+from threading import BoundedSemaphore
+from threading import Lock
 
 debug = ''
 error = ''
@@ -31,6 +35,14 @@ P = '{1}[PASS  {0} ]{2} :'.format(check, green, rst_color)
 F = '{1}[FAIL  {0} ]{2} :'.format(fail, red, rst_color)
 I = '{1}[INFO  {0} ]{2} :'.format(info, orange, rst_color)
 
+# delete_objects accepts at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+DEFAULT_DELETE_CONCURRENCY = 8
+MAX_DELETE_ATTEMPTS = 5
+# Error codes of throttled or transient failures, the keys are deleted again
+RETRYABLE_ERRORS = ('SlowDown', 'Throttling', 'ThrottlingException', 'RequestLimitExceeded',
+                    'InternalError', 'ServiceUnavailable')
+
 # create logger
 logger = logging.getLogger('Reaper')
 logger.setLevel(logging.DEBUG)
@@ -56,37 +68,135 @@ logger.addHandler(ch)
 
 # noinspection PyUnresolvedReferences,PyUnresolvedReferences,PyUnresolvedReferences,PyUnresolvedReferences
 class Reaper(object):
+    # Given an s3 client, a bucket name and a list of object versions, this function deletes the
+    # versions with a single delete_objects request. Keys failing with a throttling or transient
+    # error are retried with backoff.
+    # Param:
+    #   s3_client - S3 client
+    #   bucket_name - Name of the bucket
+    #   objects - List of {'Key': 'string', 'VersionId': 'string'} (at most DELETE_BATCH_SIZE)
+    # Returns:
+    #   Number of versions deleted
+
+    def __delete_versions(self, s3_client, bucket_name, objects):
+        pending = objects
+        deleted = 0
+        for attempt in range(MAX_DELETE_ATTEMPTS):
+            if attempt:
+                time.sleep(self._backoff * 2 ** (attempt - 1))
+            try:
+                response = s3_client.delete_objects(Bucket=bucket_name, Delete={'Objects': pending, 'Quiet': True})
+            except ClientError as e:
+                if e.response['Error']['Code'] in RETRYABLE_ERRORS:
+                    logger.debug("delete_objects throttled, retrying (%s)", e.response['Error']['Code'])
+                    continue
+                raise
+            errors = response.get('Errors', [])
+            retry = [{'Key': err['Key'], 'VersionId': err['VersionId']}
+                     for err in errors if err.get('Code') in RETRYABLE_ERRORS]
+            for err in errors:
+                if err.get('Code') not in RETRYABLE_ERRORS:
+                    logger.warning("Unable to delete [%s] version [%s]. (%s)", err['Key'], err.get('VersionId'),
+                                   err.get('Code'))
+            deleted += len(pending) - len(errors)
+            if not retry:
+                break
+            pending = retry
+        else:
+            logger.warning("Gave up deleting %s object versions from [%s]", len(pending), bucket_name)
+        with self._progress_lock:
+            self._deleted += deleted
+            logger.info("Deleted %s object versions from [%s]", self._deleted, bucket_name)
+        return deleted
+
+    # Given a bucket name, this function lists all the object versions and delete markers of the bucket
+    # in batches of DELETE_BATCH_SIZE.
+    # Param:
+    #   s3_client - S3 client
+    #   bucket_name - Name of the bucket
+
+    @staticmethod
+    def __version_batches(s3_client, bucket_name):
+        batch = []
+        paginator = s3_client.get_paginator('list_object_versions')
+        for page in paginator.paginate(Bucket=bucket_name):
+            for version in page.get('Versions', []) + page.get('DeleteMarkers', []):
+                batch.append({'Key': version['Key'], 'VersionId': version['VersionId']})
+                if len(batch) == DELETE_BATCH_SIZE:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    # Returns the S3 client of the reaper, from the ClientFactory when there is one.
+
+    def __get_s3_client(self):
+        if self._boto_client is None:
+            return self.session.client('s3')
+        # The connection pool of the S3 clients must fit the concurrent delete_objects requests
+        self._boto_client.grow_max_pool_connections('s3', self._concurrency)
+        return self._boto_client.get('s3', region=self._region, credential_set=self._credential_set)
+
     # Given an s3 bucket name, this function deletes all the versions of the bucket
+    # Versions and delete markers are deleted in batches of DELETE_BATCH_SIZE keys, batches are
+    # deleted concurrently while the bucket is still being listed. At most two batches per worker
+    # are in flight, the listing waits for the deletes to catch up.
     # Param:
     #   bucket_name - Name of the bucket to delete
 
     def __delete_s3_bucket(self, bucket_name):
-        s3_resource = self.session.resource('s3')
+        s3_client = self.__get_s3_client()
         logger.info('Working on bucket [%s]', bucket_name)
-        bucket_resource = s3_resource.Bucket(bucket_name)
         logger.info("Getting and deleting all object versions")
+        self._deleted = 0
+        in_flight = BoundedSemaphore(self._concurrency * 2)
+        errors = []
+
+        def deleted(result):
+            in_flight.release()
+
+        def failed(e):
+            errors.append(e)
+            in_flight.release()
+
+        pool = ThreadPool(self._concurrency)
         try:
-            object_versions = bucket_resource.object_versions.all()
-            for object_version in object_versions:
-                # TODO: Delete sets of 1000 object versions to reduce delete
-                # requests
-                object_version.delete()
+            for batch in self.__version_batches(s3_client, bucket_name):
+                in_flight.acquire()
+                if errors:
+                    break
+                pool.apply_async(self.__delete_versions, (s3_client, bucket_name, batch),
+                                 callback=deleted, error_callback=failed)
+            pool.close()
+            pool.join()
+            if errors:
+                raise errors[0]
         except ClientError as e:
             if e.response['Error']['Code'] == 'AccessDenied':
                 logger.warning("Unable to delete object versions. (AccessDenied)")
-            if e.response['Error']['Code'] == 'NoSuchBucket':
+            elif e.response['Error']['Code'] == 'NoSuchBucket':
                 logger.warning("Unable to get versions. (NoSuchBucket)")
             else:
                 print(e)
+        finally:
+            pool.close()
+            pool.join()
         logger.info('Deleting bucket [%s]', bucket_name)
         try:
-            bucket_resource.delete()
-        except botocore.exceptions.ClientError as e:
+            s3_client.delete_bucket(Bucket=bucket_name)
+        except ClientError as e:
             if e.response['Error']['Code'] == 'NoSuchBucket':
                 logger.warning("Bucket was already deleted. (NoSuchBucket)")
             else:
                 print(e)
 
+    # Given an s3 bucket name, this function deletes all the versions of the bucket, then the bucket
+    # Param:
+    #   bucket_name - Name of the bucket to delete
+
+    def delete_s3_bucket(self, bucket_name):
+        self.__delete_s3_bucket(bucket_name)
+
     # Given a volume id, this function deletes the volume with given id
     # Param:
     #   volume_id - Id of the volume to be deleted
@@ -162,6 +272,185 @@ class Reaper(object):
             self.__delete_s3_bucket(pid)
 
     # Constructor
+    # Param:
+    #   session - boto3 session of the region the resources are in
+    #   concurrency - Number of delete_objects requests in flight when deleting a bucket
+    #   backoff - Delay (in seconds) before retrying throttled deletes, doubled on each retry
+    #   boto_client - Optional ClientFactory object, the S3 client is then taken from the factory
+    #   region - Region of the ClientFactory clients
+    #   credential_set - Credential set of the ClientFactory clients
 
-    def __init__(self, session):
+    def __init__(self, session, concurrency=DEFAULT_DELETE_CONCURRENCY, backoff=1, boto_client=None, region=None,
+                 credential_set='default'):
         self.session = session
+        self._boto_client = boto_client
+        self._region = region
+        self._credential_set = credential_set
+        self._concurrency = max(1, int(concurrency))
+        self._backoff = backoff
+        self._deleted = 0
+        self._progress_lock = Lock()
+
+
+# CleanupPlanner deletes the resources left behind by stacks which failed to delete, across
+# regions. Resources are grouped by region and type, and the groups are deleted tier by tier
+# following DELETE_TIERS (instances before the network interfaces, volumes and security groups
+# they use). Groups of a tier are deleted concurrently with ClientFactory clients. Resources
+# which are still in use are retried after each delay of the retry schedule.
+#
+# Example usage:
+#
+#   planner = CleanupPlanner(ClientFactory())
+#   planner.add('us-east-1', failed_stacks)   # as returned by TaskCat.get_all_resources
+#   leftovers = planner.run()
+
+class CleanupPlanner(object):
+    # Resource types handled by the planner, by deletion tier
+    DELETE_TIERS = [
+        ['AWS::EC2::Instance', 'AWS::S3::Bucket'],
+        ['AWS::EC2::NetworkInterface', 'AWS::EC2::Volume'],
+        ['AWS::EC2::SecurityGroup'],
+    ]
+
+    # Error codes of resources which can be deleted once their dependents are gone
+    IN_USE_ERRORS = ('DependencyViolation', 'InvalidGroup.InUse', 'VolumeInUse',
+                     'InvalidNetworkInterface.InUse', 'IncorrectState')
+
+    # Error codes of resources which are already gone
+    NOT_FOUND_ERRORS = ('InvalidGroup.NotFound', 'InvalidGroupId.NotFound', 'InvalidVolume.NotFound',
+                        'InvalidNetworkInterfaceID.NotFound', 'InvalidInstanceID.NotFound', 'NoSuchBucket')
+
+    # Constructor
+    # Param:
+    #   boto_client - ClientFactory object used to get the regional clients
+    #   concurrency - Number of resource groups deleted concurrently
+    #   retry_schedule - Delays (in seconds) before each new attempt on resources still in use
+    #   sleep - Function used to wait between attempts
+
+    def __init__(self, boto_client, concurrency=DEFAULT_DELETE_CONCURRENCY, retry_schedule=(15, 30, 60, 120),
+                 sleep=time.sleep):
+        self._boto_client = boto_client
+        self._concurrency = max(1, int(concurrency))
+        self._retry_schedule = retry_schedule
+        self._sleep = sleep
+        self._resources = {}
+
+    # Given a region and the failed stacks of the region, this function adds the resources of the
+    # stacks to the plan. Resource types the planner cannot delete are logged and skipped.
+    # Param:
+    #   region - Region of the stacks
+    #   failed_stacks - List of {'stackId': 'string', 'resources': [...]} (see Reaper.delete_all)
+
+    def add(self, region, failed_stacks):
+        handled = set(rtype for tier in self.DELETE_TIERS for rtype in tier)
+        for stack in failed_stacks:
+            for resource in stack['resources']:
+                if resource['resourceType'] not in handled:
+                    logger.debug("Skipping [%s] of type [%s]", resource['physicalId'], resource['resourceType'])
+                    continue
+                group = self._resources.setdefault((region, resource['resourceType']), [])
+                if resource['physicalId'] not in group:
+                    group.append(resource['physicalId'])
+
+    # Returns the plan: a list of tiers, each tier a list of (region, resource type, physical ids)
+    # groups which can be deleted concurrently.
+
+    def plan(self):
+        tiers = []
+        for tier_types in self.DELETE_TIERS:
+            tier = [(region, rtype, list(ids)) for (region, rtype), ids in sorted(self._resources.items())
+                    if rtype in tier_types and ids]
+            if tier:
+                tiers.append(tier)
+        return tiers
+
+    # Deletes all the planned resources.
+    # Returns:
+    #   Dictionary of (region, resource type) => physical ids which could not be deleted
+
+    def run(self):
+        regions = set(region for region, rtype in self._resources)
+        # Create the clients up front, so the workers only read the client cache
+        for region in regions:
+            self._boto_client.get('ec2', region=region)
+            self._boto_client.get('s3', region=region)
+        schedule = [0] + list(self._retry_schedule)
+        for attempt, delay in enumerate(schedule):
+            tiers = self.plan()
+            if not tiers:
+                break
+            if delay:
+                logger.info("%s resource(s) still in use, retrying in %ss (attempt %s/%s)",
+                            sum(len(ids) for tier in tiers for region, rtype, ids in tier), delay,
+                            attempt + 1, len(schedule))
+                self._sleep(delay)
+            pool = ThreadPool(self._concurrency)
+            try:
+                for tier in tiers:
+                    results = pool.map(lambda group: self.__delete_group(*group), tier)
+                    for (region, rtype, ids), in_use in zip(tier, results):
+                        self._resources[(region, rtype)] = in_use
+            finally:
+                pool.close()
+                pool.join()
+        leftovers = dict((key, ids) for key, ids in self._resources.items() if ids)
+        for (region, rtype), ids in sorted(leftovers.items()):
+            logger.warning("Unable to delete %s [%s] in [%s]", rtype, ', '.join(ids), region)
+        return leftovers
+
+    # Deletes a group of resources of the same region and type.
+    # Returns:
+    #   List of physical ids which are still in use and need to be retried
+
+    def __delete_group(self, region, rtype, ids):
+        logger.info("Deleting %s %s resource(s) in [%s]", len(ids), rtype, region)
+        if rtype == 'AWS::S3::Bucket':
+            session = self._boto_client.get_session('default', region)
+            reaper = Reaper(session, boto_client=self._boto_client, region=region)
+            for bucket_name in ids:
+                reaper.delete_s3_bucket(bucket_name)
+            return []
+        ec2_client = self._boto_client.get('ec2', region=region)
+        if rtype == 'AWS::EC2::Instance':
+            return self.__terminate_instances(ec2_client, ids)
+        delete = {
+            'AWS::EC2::NetworkInterface': lambda pid: ec2_client.delete_network_interface(NetworkInterfaceId=pid),
+            'AWS::EC2::Volume': lambda pid: ec2_client.delete_volume(VolumeId=pid),
+            'AWS::EC2::SecurityGroup': lambda pid: ec2_client.delete_security_group(GroupId=pid),
+        }[rtype]
+        in_use = []
+        for pid in ids:
+            try:
+                delete(pid)
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                if code in self.IN_USE_ERRORS:
+                    logger.debug("[%s] is in use (%s)", pid, code)
+                    in_use.append(pid)
+                elif code in self.NOT_FOUND_ERRORS:
+                    logger.debug("[%s] was already deleted", pid)
+                else:
+                    logger.warning("Unable to delete [%s]. (%s)", pid, code)
+        return in_use
+
+    # Terminates instances and waits for the termination, so that the network interfaces and
+    # volumes attached to them can be deleted by the next tier.
+
+    def __terminate_instances(self, ec2_client, ids):
+        try:
+            ec2_client.terminate_instances(InstanceIds=ids)
+        except ClientError as e:
+            if e.response['Error']['Code'] in self.NOT_FOUND_ERRORS and len(ids) > 1:
+                # Terminate the remaining instances one by one
+                for pid in ids:
+                    self.__terminate_instances(ec2_client, [pid])
+                return []
+            if e.response['Error']['Code'] not in self.NOT_FOUND_ERRORS:
+                logger.warning("Unable to terminate [%s]. (%s)", ', '.join(ids), e.response['Error']['Code'])
+            return []
+        try:
+            ec2_client.get_waiter('instance_terminated').wait(
+                InstanceIds=ids, WaiterConfig={'Delay': 15, 'MaxAttempts': 40})
+        except WaiterError as e:
+            logger.warning("Instances [%s] not terminated yet. (%s)", ', '.join(ids), e)
+        return []
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# authors:
+# Tony Vattathil <tonynv@amazon.com>, <avattathil@gmail.com>
+# Santiago Cardenas <sancard@amazon.com>, <santiago[dot]cardenas[at]outlook[dot]com>
+# Shivansh Singh <sshvans@amazon.com>,
+# Jay McConnell <jmmccon@amazon.com>,
+# Andrew Glenn <andglenn@amazon.com>
+from __future__ import print_function
+
+import csv
+import json
+import os
+import sqlite3
+import time
+from collections import namedtuple
+
+from .poller import get_stack_region
+from .utils import get_cache_dir
+
+RESULT_FIELDS = ['run_id', 'project', 'test', 'region', 'stack_name', 'stack_id', 'status',
+                 'started', 'finished', 'duration', 'recorded', 'resources']
+
+SUMMARY_FIELDS = ['project', 'test', 'region', 'runs', 'passed', 'failed', 'avg_duration', 'max_duration',
+                  'last_status', 'last_run']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    project TEXT NOT NULL,
+    test TEXT NOT NULL,
+    region TEXT NOT NULL,
+    stack_name TEXT,
+    stack_id TEXT,
+    status TEXT,
+    started REAL,
+    finished REAL,
+    duration REAL,
+    recorded REAL NOT NULL,
+    resources TEXT
+);
+CREATE INDEX IF NOT EXISTS results_by_test ON results (project, test, region, recorded);
+CREATE INDEX IF NOT EXISTS results_by_run ON results (run_id);
+"""
+
+
+class StackResult(namedtuple('StackResult', RESULT_FIELDS)):
+    """
+    Final result of one stack of a run.
+
+    :param run_id: Identifier of the run
+    :param project: Project name
+    :param test: Test name
+    :param region: Region of the stack
+    :param stack_name: Stack name
+    :param stack_id: Stack arn
+    :param status: Final stack status
+    :param started: Time the stack creation started (seconds since the epoch, or None)
+    :param finished: Time of the last stack event (seconds since the epoch, or None)
+    :param duration: finished - started in seconds (or None)
+    :param recorded: Time the result was recorded (seconds since the epoch)
+    :param resources: Dictionary of logical id => {'type': resource type, 'duration': seconds}
+    """
+    __slots__ = ()
+
+
+class ResultsStore(object):
+    """
+    Local SQLite store of the results of every run, one record per stack.
+
+    Records are indexed by project, test and region so the history of a test can be queried
+    and summarized quickly across thousands of runs. The store is kept in
+    ~/.taskcat/history/results.db
+
+    Example usage:
+
+    with ResultsStore() as store:
+        store.record([StackResult(...)])
+        for row in store.summarize(project='my-project'):
+            print(row)
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: Optional path to the database file
+        """
+        self._path = path or os.path.join(get_cache_dir('history'), 'results.db')
+        self._conn = sqlite3.connect(self._path)
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        """
+        Closes the database.
+        """
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def record(self, results):
+        """
+        Records stack results in one transaction.
+
+        :param results: Iterable of StackResult
+        """
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO results ({}) VALUES ({})".format(
+                    ', '.join(RESULT_FIELDS), ', '.join('?' * len(RESULT_FIELDS))),
+                (result[:-1] + (json.dumps(result.resources, sort_keys=True),) for result in results))
+
+    @staticmethod
+    def _where(project=None, test=None, region=None, status=None, since=None):
+        clauses, params = [], []
+        for column, value in (('project', project), ('test', test), ('region', region), ('status', status)):
+            if value is not None:
+                clauses.append('{} = ?'.format(column))
+                params.append(value)
+        if since is not None:
+            clauses.append('recorded >= ?')
+            params.append(since)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def query(self, project=None, test=None, region=None, status=None, since=None, limit=None):
+        """
+        Yields the recorded results matching the filters, most recent first.
+
+        :param project: Project name
+        :param test: Test name
+        :param region: Region
+        :param status: Final stack status
+        :param since: Only results recorded after this time (seconds since the epoch)
+        :param limit: Maximum number of results
+
+        :return: Generator of StackResult
+        """
+        where, params = self._where(project, test, region, status, since)
+        sql = "SELECT {} FROM results{} ORDER BY recorded DESC, id DESC".format(', '.join(RESULT_FIELDS), where)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        for row in self._conn.execute(sql, params):
+            yield StackResult(*(row[:-1] + (json.loads(row[-1]) if row[-1] else {},)))
+
+    def summarize(self, project=None, test=None, region=None, since=None):
+        """
+        Returns the pass rate and durations of each test and region.
+
+        :param project: Project name
+        :param test: Test name
+        :param region: Region
+        :param since: Only results recorded after this time (seconds since the epoch)
+
+        :return: List of dictionaries with the SUMMARY_FIELDS keys
+        """
+        where, params = self._where(project, test, region, since=since)
+        # SQLite takes the bare status column from the row holding MAX(recorded)
+        sql = """
+            SELECT project, test, region, COUNT(*),
+                   SUM(status = 'CREATE_COMPLETE'), SUM(status != 'CREATE_COMPLETE'),
+                   AVG(duration), MAX(duration), status, MAX(recorded)
+            FROM results{}
+            GROUP BY project, test, region
+            ORDER BY project, test, region""".format(where)
+        return [dict(zip(SUMMARY_FIELDS, row)) for row in self._conn.execute(sql, params)]
+
+    def export(self, fileobj, fmt='csv', **filters):
+        """
+        Writes the recorded results matching the filters to a file.
+
+        :param fileobj: File object open for writing text
+        :param fmt: 'csv' or 'json' (one json object per line)
+        :param filters: Filters of query()
+
+        :return: Number of results written
+        """
+        count = 0
+        if fmt == 'csv':
+            writer = csv.writer(fileobj)
+            writer.writerow(RESULT_FIELDS)
+            for result in self.query(**filters):
+                writer.writerow(result[:-1] + (json.dumps(result.resources, sort_keys=True),))
+                count += 1
+        elif fmt == 'json':
+            for result in self.query(**filters):
+                fileobj.write(json.dumps(result._asdict(), sort_keys=True) + '\n')
+                count += 1
+        else:
+            raise ValueError("Unknown export format [{}]".format(fmt))
+        return count
+
+
+def stack_result(run_id, project, test, stack_id, stack_name, status, timings=None, recorded=None):
+    """
+    Builds the StackResult of a stack.
+
+    :param run_id: Identifier of the run
+    :param project: Project name
+    :param test: Test name
+    :param stack_id: Stack arn
+    :param stack_name: Stack name
+    :param status: Final stack status
+    :param timings: Optional StackTimings of the stack
+    :param recorded: Time the result is recorded (defaults to now)
+    """
+    started = finished = duration = None
+    resources = {}
+    if timings is not None:
+        if timings.started is not None:
+            started = timings.started.timestamp()
+            finished = timings.finished.timestamp()
+            duration = finished - started
+        resources = dict((logical_id, {'type': resource_type, 'duration': round(seconds, 1)})
+                         for logical_id, (resource_type, seconds) in timings.get_resource_durations().items())
+    return StackResult(run_id, project, test, get_stack_region(stack_id), stack_name, stack_id, status,
+                       started, finished, duration, recorded if recorded is not None else time.time(), resources)
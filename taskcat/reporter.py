@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# authors:
+# Tony Vattathil <tonynv@amazon.com>, <avattathil@gmail.com>
+# Santiago Cardenas <sancard@amazon.com>, <santiago[dot]cardenas[at]outlook[dot]com>
+# Shivansh Singh <sshvans@amazon.com>,
+# Jay McConnell <jmmccon@amazon.com>,
+# Andrew Glenn <andglenn@amazon.com>
+from __future__ import print_function
+
+import os
+import pkgutil
+import time
+
+from .poller import STACK_DELETED
+
+REPORT_CSS = 'assets/taskcat_reporting.css'
+REPORT_BUFFER_SIZE = 64 * 1024
+REPO_LINK = 'https://github.com/aws-quickstart/taskcat'
+DOC_LINK = 'http://taskcat.io'
+# Marks where the rows go in the report skeleton
+_ROWS_MARKER = '<!--taskcat-rows-->'
+
+# Shown in the report for stacks which were deleted outside of taskcat
+MANUALLY_DELETED = 'MANUALLY_DELETED'
+
+_report_css = None
+
+
+def get_report_css():
+    """
+    Returns the stylesheet of the html report, read from the package on first use.
+    """
+    global _report_css
+    if _report_css is None:
+        _report_css = pkgutil.get_data(__name__.rpartition('.')[0], REPORT_CSS).decode('utf-8')
+    return _report_css
+
+
+def get_report_status(status):
+    """
+    Returns the status shown in the report for a stack and its css class.
+
+    :param status: Last polled stack status (None or STACK_DELETED if the stack is gone)
+    :return: Tuple of (status, css class attribute)
+    """
+    if status is None or status == STACK_DELETED:
+        return MANUALLY_DELETED, 'class=test-orange'
+    if status == 'CREATE_COMPLETE':
+        return status, 'class=test-green'
+    return status, 'class=test-red'
+
+
+class ReportWriter(object):
+    """
+    Writes the html report one test at a time.
+
+    The page is written to a temporary file as the tests are added, without keeping the
+    document in memory, and moved to its final path on close(), so an existing report is
+    only replaced by a complete one.
+
+    Example usage:
+
+    with ReportWriter('index.html', version) as report:
+        report.add_test('test1', [(region, stack_name, status, css, log_file)])
+    """
+
+    def __init__(self, path, version):
+        """
+        :param path: Report file path
+        :param version: taskcat version shown in the footer
+        """
+        self._path = path
+        self._tmp_path = path + '.tmp'
+        self._file = None
+        self._head, self._tail = self._skeleton(version)
+
+    @staticmethod
+    def _skeleton(version):
+        import yattag
+        doc, tag, text = yattag.Doc().tagtext()
+        with tag('html'):
+            with tag('head'):
+                doc.stag('meta', charset='utf-8')
+                doc.stag('meta', name="viewport", content="width=device-width")
+                with tag('style', type='text/css'):
+                    text(get_report_css())
+                with tag('title'):
+                    text('TaskCat Report')
+            with tag('body'):
+                with tag('table', 'class=header-table-fill'):
+                    with tag('tbody'):
+                        with tag('th', 'colspan=2'):
+                            with tag('tr'):
+                                with tag('td'):
+                                    with tag('a', href=REPO_LINK):
+                                        text('GitHub Repo: ')
+                                        text(REPO_LINK)
+                                        doc.stag('br')
+                                    with tag('a', href=DOC_LINK):
+                                        text('Documentation: ')
+                                        text(DOC_LINK)
+                                        doc.stag('br')
+                                    text('Tested on: ')
+                                    text(time.strftime('%A - %b,%d,%Y @ %H:%M:%S'))
+                                with tag('td', 'class=taskcat-logo'):
+                                    with tag('h3'):
+                                        text('taskcat')
+            doc.stag('p')
+            with tag('table', 'class=table-fill'):
+                with tag('tbody'):
+                    with tag('thread'):
+                        with tag('tr'):
+                            for title, css, width in (('Test Name', 'class=text-center', 'width=25%'),
+                                                      ('Tested Region', 'class=text-left', 'width=10%'),
+                                                      ('Stack Name', 'class=text-left', 'width=30%'),
+                                                      ('Tested Results', 'class=text-left', 'width=20%'),
+                                                      ('Test Logs', 'class=text-left', 'width=15%')):
+                                with tag('th', css, width):
+                                    text(title)
+                            doc.asis('\n' + _ROWS_MARKER + '\n')
+                            with tag('tr', 'class= test-footer'):
+                                with tag('td', 'colspan=5'):
+                                    text('Generated by {} {}'.format('taskcat', version))
+                        doc.stag('p')
+        head, tail = doc.getvalue().split(_ROWS_MARKER)
+        return head, tail
+
+    def open(self):
+        """
+        Starts the report.
+        """
+        self._file = open(self._tmp_path, 'w', buffering=REPORT_BUFFER_SIZE)
+        self._file.write(self._head)
+
+    def add_test(self, testname, rows):
+        """
+        Writes the rows of a test.
+
+        :param testname: Test name
+        :param rows: Iterable of (region, stack name, status, css class attribute, log file)
+        """
+        import yattag
+        doc, tag, text = yattag.Doc().tagtext()
+        with tag('tr', 'class= test-footer'):
+            with tag('td', 'colspan=5'):
+                text('')
+        doc.asis('\n')
+        for region, stack_name, status, css, log_file in rows:
+            with tag('tr'):
+                with tag('td', 'class=test-info'):
+                    with tag('h3'):
+                        text(testname)
+                with tag('td', 'class=text-left'):
+                    text(region)
+                with tag('td', 'class=text-left'):
+                    text(stack_name)
+                with tag('td', css):
+                    text(str(status))
+                with tag('td', 'class=text-left'):
+                    with tag('a', href=log_file):
+                        text('View Logs ')
+            doc.asis('\n')
+        self._file.write(doc.getvalue())
+
+    def close(self):
+        """
+        Completes the report and moves it to its final path.
+        """
+        self._file.write(self._tail)
+        self._file.close()
+        os.replace(self._tmp_path, self._path)
+
+    def abort(self):
+        """
+        Discards a report which could not be completed.
+        """
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -21,6 +21,7 @@ from __future__ import print_function
 
 import argparse
 import base64
+import copy
 import datetime
 import json
 import os
@@ -28,37 +29,54 @@ import random
 import re
 import sys
 import textwrap
+import threading
 import time
 import uuid
-import boto3
-import pyfiglet
-import tabulate
 import yaml
-import yattag
 import logging
 from argparse import RawTextHelpFormatter
-from botocore.vendored import requests
+from collections import OrderedDict
 from botocore.exceptions import ClientError
-from pkg_resources import get_distribution
-from functools import partial
 from multiprocessing.dummy import Pool as ThreadPool
 
-from .reaper import Reaper
+from .collector import StackInventory
+from .collector import StackLogCollector
+from .collector import iter_stack_event_pages
+from .configurator import TestPlan
+from .launcher import DEFAULT_LAUNCH_CONCURRENCY
+from .launcher import StackLauncher
+from .metadata import MetadataCache
+from .mutator import ParamMutator
+from .poller import DEFAULT_MAX_POLL_INTERVAL
+from .poller import PollScheduler
+from .poller import StackDurations
+from .poller import StackPoller
+from .poller import get_stack_region
+from .reaper import CleanupPlanner
+from .recorder import ResultsStore
+from .recorder import stack_result
+from .reporter import ReportWriter
+from .reporter import get_report_status
+from .stager import S3KeyIndex
+from .stager import StageManifest
+from .stager import TransferEngine
+from .stager import TransferError
+from .stager import auto_upload_concurrency
 from .utils import ClientFactory
+from .utils import DEFAULT_MAX_ATTEMPTS
+from .utils import get_cache_dir
+from .validator import TemplateValidator
+from .validator import template_hash
+
+# Version Tag, looked up on first use (see get_version)
+_version_info = None
+
+# The latest published version is checked at most once per interval, with a timeout
+UPDATE_CHECK_INTERVAL = 24 * 60 * 60
+UPDATE_CHECK_TIMEOUT = 3
+# How long welcome() waits for the background check before carrying on without its message
+UPDATE_CHECK_WAIT = 1
 
-# Version Tag
-'''
-:param _run_mode: A value of 1 indicated taskcat is sourced from pip
- A value of 0 indicates development mode taskcat is loading from local source
-'''
-try:
-    __version__ = get_distribution('taskcat').version.replace('.0', '.')
-    _run_mode = 1
-except Exception:
-    __version__ = "[local source] no pip module installed"
-    _run_mode = 0
-
-version = __version__
 debug = ''
 error = ''
 check = ''
@@ -90,8 +108,91 @@ logger = logging.getLogger('taskcat')
 logger.setLevel(logging.DEBUG)
 
 
-def get_pip_version(url):
-    return requests.get(url).json()["info"]["version"]
+def get_pip_version(url, timeout=UPDATE_CHECK_TIMEOUT):
+    from urllib.request import urlopen
+    response = urlopen(url, timeout=timeout)
+    try:
+        return json.loads(response.read().decode('utf-8'))["info"]["version"]
+    finally:
+        response.close()
+
+
+def get_latest_version(url, max_age=UPDATE_CHECK_INTERVAL, path=None):
+    """
+    Returns the latest version published at a PyPI json url. The answer is cached in
+    ~/.taskcat/version.json and PyPI is asked again once it is older than max_age seconds.
+
+    :param url: PyPI package info url
+    :param max_age: Maximum age of the cached answer, in seconds
+    :param path: Optional path to the cache file
+    """
+    path = path or os.path.join(get_cache_dir(), 'version.json')
+    try:
+        with open(path, 'r') as f:
+            cache = json.load(f)
+    except (IOError, ValueError):
+        cache = {}
+    entry = cache.get(url)
+    if entry and 0 <= time.time() - entry['checked'] < max_age:
+        return entry['version']
+    latest = get_pip_version(url)
+    cache[url] = {'checked': time.time(), 'version': latest}
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, path)
+    except (IOError, OSError) as e:
+        logger.debug("unable to cache the latest version: %s", e)
+    return latest
+
+
+def get_version():
+    """
+    Returns the installed version of taskcat and the run mode, looked up on first use.
+
+    :return: Tuple of (version, run mode). A run mode of 1 indicates taskcat is sourced from pip,
+        0 indicates development mode (taskcat is loading from local source)
+    """
+    global _version_info
+    if _version_info is None:
+        try:
+            from pkg_resources import get_distribution
+            _version_info = (get_distribution('taskcat').version.replace('.0', '.'), 1)
+        except Exception:
+            _version_info = ("[local source] no pip module installed", 0)
+    return _version_info
+
+
+def get_banner(prog_name):
+    """
+    Returns the figlet banner of a program name, rendered once and cached in ~/.taskcat/banners
+
+    :param prog_name: Program name
+    """
+    path = os.path.join(get_cache_dir('banners'), re.sub(r'[^\w.-]', '_', prog_name) + '.txt')
+    try:
+        with open(path, 'r') as f:
+            return f.read()
+    except IOError:
+        pass
+    import pyfiglet
+    banner = pyfiglet.Figlet(font='standard').renderText(prog_name)
+    try:
+        with open(path, 'w') as f:
+            f.write(banner)
+    except IOError as e:
+        logger.debug("unable to cache the banner: %s", e)
+    return banner
+
+
+def __getattr__(name):
+    # The version used to be looked up when the module was imported
+    if name in ('version', '__version__'):
+        return get_version()[0]
+    if name == '_run_mode':
+        return get_version()[1]
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 
 def buildmap(start_location, map_string, partial_match=True):
@@ -128,6 +229,7 @@ class TestData(object):
     def __init__(self):
         self.__test_name = None
         self.__test_stacks = []
+        self.__launch_errors = []
 
     def set_test_name(self, name):
         self.__test_name = name
@@ -141,6 +243,12 @@ class TestData(object):
     def add_test_stack(self, stack):
         self.__test_stacks.append(stack)
 
+    def get_launch_errors(self):
+        return self.__launch_errors
+
+    def add_launch_error(self, region, error):
+        self.__launch_errors.append({'region': region, 'error': str(error)})
+
 
 """
     Task(Cat = CloudFormation Automated Testing)
@@ -176,6 +284,7 @@ class TaskCat(object):
         self._parameter_path = None
         self.ddb_table = None
         self._enable_dynamodb = False
+        self._db_table = None
         self._termsize = 110
         self._strict_syntax_json = True
         self._banner = ""
@@ -188,9 +297,23 @@ class TaskCat(object):
         self._aws_access_key = None
         self._aws_secret_key = None
         self._boto_profile = None
-        self._boto_client = ClientFactory(logger=logger)
+        # Throttled requests are retried by botocore, the rate of all the threads adapts through shared limiters
+        self._boto_client = ClientFactory(logger=logger, retry_mode='standard', max_attempts=DEFAULT_MAX_ATTEMPTS)
         self._key_url_map = {}
+        self._s3_key_index = None
+        self._param_mutator = None
+        self._metadata = None
+        self._test_plans = OrderedDict()
+        self._template_validator = None
+        self._param_overrides = None
+        self._stack_inventory = None
+        self._log_collector = None
+        self._status_snapshot = {}
         self.multithread_upload = False
+        self.upload_concurrency = None
+        self.incremental_upload = False
+        self.launch_concurrency = DEFAULT_LAUNCH_CONCURRENCY
+        self.max_poll_interval = DEFAULT_MAX_POLL_INTERVAL
         self.retain_if_failed = False
 
     # SETTERS AND GETTERS
@@ -208,6 +331,33 @@ class TaskCat(object):
     def get_multithread_upload(self):
         return self.multithread_upload
 
+    def set_upload_concurrency(self, upload_concurrency):
+        self.upload_concurrency = upload_concurrency
+
+    def get_upload_concurrency(self):
+        return self.upload_concurrency
+
+    def set_incremental_upload(self, incremental_upload):
+        self.incremental_upload = incremental_upload
+
+    def get_incremental_upload(self):
+        return self.incremental_upload
+
+    def set_launch_concurrency(self, launch_concurrency):
+        self.launch_concurrency = launch_concurrency
+
+    def get_launch_concurrency(self):
+        return self.launch_concurrency
+
+    def get_boto_client(self):
+        return self._boto_client
+
+    def set_max_poll_interval(self, max_poll_interval):
+        self.max_poll_interval = max_poll_interval
+
+    def get_max_poll_interval(self):
+        return self.max_poll_interval
+
     def set_owner(self, owner):
         self.owner = owner
 
@@ -272,14 +422,17 @@ class TaskCat(object):
     def get_parameter_path(self):
         return self.parameter_path
 
-    def get_param_includes(self, original_keys):
+    def get_param_overrides(self):
         """
-        This function searches for ~/.aws/taskcat_global_override.json,
-        then <project>/ci/taskcat_project_override.json, in that order.
-        Keys defined in either of these files will override Keys defined in <project>/ci/*.json.
+        Returns the parameter overrides, loaded from ~/.aws/taskcat_global_override.json,
+        then <project>/ci/taskcat_project_override.json, in that order. The files are read once
+        per run.
 
-        :param original_keys: json object derived from Parameter Input JSON in <project>/ci/
+        :return: List of overrides (lists of parameters)
         """
+        if self._param_overrides is not None:
+            return self._param_overrides
+
         # Github/issue/57
         # Look for ~/.taskcat_overrides.json
 
@@ -296,6 +449,8 @@ class TaskCat(object):
         # Now look for per-project override uploaded to S3.
         override_file_key = "{}/ci/taskcat_project_override.json".format(self.project)
         try:
+            if override_file_key not in self.get_s3_key_index().objects:
+                raise KeyError(override_file_key)
             # Intentional duplication of self.get_content() here, as I don't want to break that due to
             # tweaks necessary here.
             s3_client = self._boto_client.get('s3', region=self.get_default_region(), s3v4=True)
@@ -308,6 +463,19 @@ class TaskCat(object):
         except Exception:
             pass
 
+        self._param_overrides = dict_squash_list
+        return dict_squash_list
+
+    def get_param_includes(self, original_keys):
+        """
+        This function applies the overrides of ~/.aws/taskcat_global_override.json,
+        then <project>/ci/taskcat_project_override.json, in that order.
+        Keys defined in either of these files will override Keys defined in <project>/ci/*.json.
+
+        :param original_keys: json object derived from Parameter Input JSON in <project>/ci/
+        """
+        dict_squash_list = self.get_param_overrides()
+
         # Setup a list index dictionary.
         # - Used to give an Parameter => Index mapping for replacement.
         param_index = {}
@@ -321,7 +489,8 @@ class TaskCat(object):
                 key = override_pd['ParameterKey']
                 if key in param_index.keys():
                     idx = param_index[key]
-                    original_keys[idx] = override_pd
+                    # Copied, as overrides are shared by all the tests of the run
+                    original_keys[idx] = dict(override_pd)
 
         # check if s3 bucket and QSS3BucketName param match. fix if they dont.
         bucket_name = self.get_s3bucket()
@@ -448,38 +617,125 @@ class TaskCat(object):
             print(I + "Please cd to where you project is located")
             sys.exit(1)
 
-        if self.multithread_upload:
-            threads = 16
-            print(I + "Multithread upload enabled, spawning %s threads" % threads)
-            pool = ThreadPool(threads)
-            func = partial(self._s3_upload_file, s3_client=s3_client, bucket_or_object_acl=bucket_or_object_acl)
-            pool.map(func, fsmap)
-            pool.close()
-            pool.join()
-        else:
+        self._s3_key_index = None
+        # Plans and overrides hold the contents of the previously staged files
+        self._test_plans.clear()
+        self._param_overrides = None
+        manifest = None
+        if self.incremental_upload:
+            self._s3_key_index = self._build_s3_key_index(s3_client)
+            manifest = StageManifest(self.get_s3bucket(), self.get_project())
+            fsmap = self._s3_changed_files(manifest, fsmap, bucket_or_object_acl)
+
+        self._s3_upload_files(fsmap, bucket_or_object_acl)
+
+        if manifest:
             for filename in fsmap:
-                self._s3_upload_file(filename, s3_client=s3_client, bucket_or_object_acl=bucket_or_object_acl)
+                manifest.mark_uploaded(re.sub('^./', '', filename), bucket_or_object_acl)
+            manifest.save()
 
-        paginator = s3_client.get_paginator('list_objects')
-        operation_parameters = {'Bucket': self.get_s3bucket(), 'Prefix': self.get_project()}
-        s3_pages = paginator.paginate(**operation_parameters)
+        # Index the staged keys once, it is only rebuilt when staging changed the bucket contents
+        if fsmap or self._s3_key_index is None:
+            self._s3_key_index = self._build_s3_key_index(s3_client)
 
-        for s3keys in s3_pages.search('Contents'):
-            print("{}[S3: -> ]{} s3://{}/{}".format(white, rst_color, self.get_s3bucket(), s3keys.get('Key')))
+        for s3key in self._s3_key_index.objects:
+            print("{}[S3: -> ]{} s3://{}/{}".format(white, rst_color, self.get_s3bucket(), s3key))
         print("{} |Contents of S3 Bucket {} {}".format(self.nametag, header, rst_color))
 
         print('\n')
 
-    def _s3_upload_file(self, filename, s3_client, bucket_or_object_acl):
-        upload = re.sub('^./', '', filename)
+    def _s3_changed_files(self, manifest, fsmap, bucket_or_object_acl):
+        """
+        Returns the files in fsmap which are new or changed compared to the staging bucket.
+
+        Remote ETags and sizes come from the S3 key index (a single paginated listing of the
+        project prefix), and are compared with the content hashes kept in the local staging manifest.
+
+        :param manifest: StageManifest object
+        :param fsmap: List of local file paths
+        :param bucket_or_object_acl: Canned ACL the files will be uploaded with
+        :return: List of local file paths to upload
+        """
+        local_files = {re.sub('^./', '', filename): filename for filename in fsmap}
+        changed, skipped_bytes, skipped_requests = manifest.diff(
+            local_files, self._s3_key_index.objects, bucket_or_object_acl)
+        print(I + "Incremental upload: {} new or changed, {} unchanged files".format(
+            len(changed), len(local_files) - len(changed)))
+        print(I + "Incremental upload: skipped {} bytes and {} requests".format(skipped_bytes, skipped_requests))
+        if self.verbose:
+            for key in changed:
+                print(D + "Changed => [%s]" % key)
+        return [local_files[key] for key in changed]
+
+    def _s3_upload_files(self, fsmap, bucket_or_object_acl):
+        """
+        Uploads files to the staging bucket, concurrently if multithread upload is enabled.
+        Exits once every file was attempted if any of them could not be uploaded.
+
+        :param fsmap: List of local file paths
+        :param bucket_or_object_acl: Canned ACL the files are uploaded with
+        """
+        if self.multithread_upload:
+            concurrency = self.get_upload_concurrency() or auto_upload_concurrency(len(fsmap))
+            print(I + "Multithread upload enabled, spawning %s threads" % concurrency)
+        else:
+            concurrency = 1
+        engine = TransferEngine(self._boto_client, self.get_s3bucket(), bucket_or_object_acl,
+                                region=self.get_default_region(), concurrency=concurrency)
+        start = time.time()
         try:
-            s3_client.upload_file(filename, self.get_s3bucket(), upload, ExtraArgs={'ACL': bucket_or_object_acl})
-        except Exception as e:
+            uploaded = engine.upload({re.sub('^./', '', filename): filename for filename in fsmap})
+        except TransferError as e:
             print("Cannot Upload to bucket => %s" % self.get_s3bucket())
             print(E + "Check that you bucketname is correct")
+            for key, error in sorted(e.failures.items()):
+                print(E + "Failed => [%s]" % key)
+                if self.verbose:
+                    print(D + str(error))
+            sys.exit(1)
+        if self.verbose and fsmap:
+            elapsed = max(time.time() - start, 0.001)
+            print(D + "Uploaded {} files ({} bytes) in {:.1f}s".format(len(fsmap), uploaded, elapsed))
+
+    def get_metadata_cache(self):
+        """
+        Returns the on-disk cache of account and region metadata (account id, AZs, bucket regions).
+
+        :return: MetadataCache object
+        """
+        if self._metadata is None:
+            self._metadata = MetadataCache(self._boto_client, default_region=self.get_default_region())
+        return self._metadata
+
+    @staticmethod
+    def get_config_regions(taskcat_cfg):
+        """
+        Returns all the regions used by the config, globally or by any test.
+
+        :param taskcat_cfg: TaskCat config as yaml object
+        :return: Sorted list of regions
+        """
+        regions = list(taskcat_cfg['global'].get('regions') or [])
+        for test in taskcat_cfg['tests'].values():
+            regions.extend(test.get('regions') or [])
+        return sorted(set(regions))
+
+    def prefetch_metadata(self, taskcat_cfg):
+        """
+        Loads the metadata of all the regions defined in the config concurrently, so that later
+        phases are served from the metadata cache.
+
+        :param taskcat_cfg: TaskCat config as yaml object
+        """
+        try:
+            disabled = self.get_metadata_cache().prefetch(self.get_config_regions(taskcat_cfg))
+        except Exception as e:
+            print(I + "Unable to prefetch region metadata, continuing")
             if self.verbose:
                 print(D + str(e))
-            sys.exit(1)
+            return
+        for region in disabled:
+            print(E + "Region [%s] is not enabled in this account" % region)
 
     def get_available_azs(self, region, count):
         """
@@ -491,13 +747,12 @@ class TaskCat(object):
         :return: List of availability zones in a given region
 
         """
-        available_azs = []
-        ec2_client = self._boto_client.get('ec2', region=region)
-        availability_zones = ec2_client.describe_availability_zones(
-            Filters=[{'Name': 'state', 'Values': ['available']}])
-
-        for az in availability_zones['AvailabilityZones']:
-            available_azs.append(az['ZoneName'])
+        metadata = self.get_metadata_cache()
+        available_azs = metadata.get_azs(region)
+        if len(available_azs) < count:
+            # Cached list may be stale, look it up again
+            metadata.invalidate('{}/{}/azs'.format(metadata.account, region))
+            available_azs = metadata.get_azs(region)
 
         if len(available_azs) < count:
             print("{0}!Only {1} az's are available in {2}".format(E, len(available_azs), region))
@@ -531,11 +786,31 @@ class TaskCat(object):
         :return: Data of the s3 object.
         """
         if self.public_s3_bucket:
+            from botocore.vendored import requests
             payload = requests.get(url)
             return payload.text
         key = self._key_url_map[url]
         return self.get_content(self.get_s3bucket(), key)
 
+    def get_s3_key_index(self):
+        """
+        Returns the index of the keys staged in S3, listing the bucket if it was not built yet.
+
+        :return: S3KeyIndex object
+        """
+        s3_key_index = self._s3_key_index
+        if s3_key_index is None or s3_key_index.bucket != self.get_s3bucket() \
+                or s3_key_index.prefix != self.get_project():
+            s3_client = self._boto_client.get('s3', region=self.get_default_region(), s3v4=True)
+            self._s3_key_index = self._build_s3_key_index(s3_client)
+        return self._s3_key_index
+
+    def _build_s3_key_index(self, s3_client):
+        bucket_region = self.get_metadata_cache().get_bucket_region(self.get_s3bucket(), s3_client)
+        s3_key_index = S3KeyIndex(self.get_s3bucket(), self.get_project(), bucket_region)
+        s3_key_index.load(s3_client)
+        return s3_key_index
+
     def get_s3_url(self, key):
         """
         Returns S3 url of a given object.
@@ -544,37 +819,13 @@ class TaskCat(object):
         :return: S3 url of the given key
 
         """
-        s3_client = self._boto_client.get('s3', region=self.get_default_region(), s3v4=True)
-        bucket_location = s3_client.get_bucket_location(Bucket=self.get_s3bucket())
-        _project_s3_prefix = self.get_project()
-        paginator = s3_client.get_paginator('list_objects')
-        operation_parameters = {'Bucket': self.get_s3bucket(), 'Prefix': _project_s3_prefix}
-        page_iterator = paginator.paginate(**operation_parameters)
-        for page in page_iterator:
-            for s3obj in (page['Contents']):
-                for metadata in s3obj.items():
-                    if metadata[0] == 'Key':
-                        if key in metadata[1]:
-                            # Finding exact match
-                            terms = metadata[1].split("/")
-                            _found_prefix = terms[0]
-                            # issues/
-                            if (key == terms[-1]) and (_found_prefix == _project_s3_prefix):
-                                if bucket_location[
-                                    'LocationConstraint'
-                                ] is not None:
-                                    o_url = "https://s3-{0}.{1}/{2}/{3}".format(
-                                        bucket_location['LocationConstraint'],
-                                        "amazonaws.com",
-                                        self.get_s3bucket(),
-                                        metadata[1])
-                                    self._key_url_map.update({o_url:metadata[1]})
-                                    return o_url
-                                else:
-                                    amzns3 = 's3.amazonaws.com'
-                                    o_url = "https://{1}.{0}/{2}".format(amzns3, self.get_s3bucket(), metadata[1])
-                                    self._key_url_map.update({o_url:metadata[1]})
-                                    return o_url
+        s3_key_index = self.get_s3_key_index()
+        s3_key = s3_key_index.get_key(key)
+        if s3_key is None:
+            return None
+        o_url = s3_key_index.get_url(s3_key)
+        self._key_url_map.update({o_url: s3_key})
+        return o_url
 
     def get_global_region(self, yamlcfg):
         """
@@ -599,6 +850,16 @@ class TaskCat(object):
                     print("Please correct region defs[%s]:" % namespace)
         return g_regions
 
+    def get_stack_inventory(self):
+        """
+        Returns the inventory of stack resources shared by the logs, reports and deep cleanup.
+
+        :return: StackInventory object
+        """
+        if self._stack_inventory is None:
+            self._stack_inventory = StackInventory(self._boto_client)
+        return self._stack_inventory
+
     def get_resources(self, stackname, region, include_stacks=False):
         """
         Given a stackname, and region function returns the list of dictionary items, where each item
@@ -606,7 +867,7 @@ class TaskCat(object):
         with the stack.
 
         :param include_stacks:
-        :param stackname: CloudFormation stack name
+        :param stackname: CloudFormation stack name (or arn)
         :param region: AWS region
         :return: List of objects in the following format
              [
@@ -618,58 +879,25 @@ class TaskCat(object):
              ]
 
         """
-        l_resources = []
-        self.get_resources_helper(stackname, region, l_resources, include_stacks)
+        inventory = self.get_stack_inventory()
+        l_resources = inventory.get_resources(stackname, region, include_stacks)
+        if stackname in inventory.errors:
+            print(E + "Unable to get resources for stack %s" % stackname)
+            if self.verbose:
+                print(D + str(inventory.errors[stackname]))
+        if self.verbose:
+            print(D + "Resources: for {}".format(stackname))
+            for resource in l_resources:
+                print(D + "{0} = {1}, {2} = {3}, {4} = {5}".format(
+                    '\n\t\tLogicalId',
+                    resource.get('logicalId'),
+                    '\n\t\tPhysicalId',
+                    resource.get('physicalId'),
+                    '\n\t\tType',
+                    resource.get('resourceType')
+                ))
         return l_resources
 
-    def get_resources_helper(self, stackname, region, l_resources, include_stacks):
-        """
-        This is a helper function of get_resources function. Check get_resources function for details.
-
-        """
-        if stackname != 'None':
-            try:
-                cfn = self._boto_client.get('cloudformation', region=region)
-                result = cfn.describe_stack_resources(StackName=stackname)
-                stack_resources = result.get('StackResources')
-                for resource in stack_resources:
-                    if self.verbose:
-                        print(D + "Resources: for {}".format(stackname))
-                        print(D + "{0} = {1}, {2} = {3}, {4} = {5}".format(
-                            '\n\t\tLogicalId',
-                            resource.get('LogicalResourceId'),
-                            '\n\t\tPhysicalId',
-                            resource.get('PhysicalResourceId'),
-                            '\n\t\tType',
-                            resource.get('ResourceType')
-                        ))
-                    # if resource is a stack and has a physical resource id
-                    # (NOTE: physical id will be missing if stack creation is failed)
-                    if resource.get(
-                            'ResourceType') == 'AWS::CloudFormation::Stack' and 'PhysicalResourceId' in resource:
-                        if include_stacks:
-                            d = {'logicalId': resource.get('LogicalResourceId'),
-                                 'physicalId': resource.get('PhysicalResourceId'),
-                                 'resourceType': resource.get('ResourceType')}
-                            l_resources.append(d)
-                        stackdata = self.parse_stack_info(
-                            str(resource.get('PhysicalResourceId')))
-                        region = stackdata['region']
-                        self.get_resources_helper(resource.get('PhysicalResourceId'), region, l_resources,
-                                                  include_stacks)
-                    # else if resource is not a stack and has a physical resource id
-                    # (NOTE: physical id will be missing if stack creation is failed)
-                    elif resource.get(
-                            'ResourceType') != 'AWS::CloudFormation::Stack' and 'PhysicalResourceId' in resource:
-                        d = {'logicalId': resource.get('LogicalResourceId'),
-                             'physicalId': resource.get('PhysicalResourceId'),
-                             'resourceType': resource.get('ResourceType')}
-                        l_resources.append(d)
-            except Exception as e:
-                if self.verbose:
-                    print(D + str(e))
-                sys.exit(F + "Unable to get resources for stack %s" % stackname)
-
     def get_all_resources(self, stackids, region):
         """
         Given a list of stackids, function returns the list of dictionary items, where each
@@ -692,6 +920,7 @@ class TaskCat(object):
                 ]
 
         """
+        self.get_stack_inventory().walk(stackids, region)
         l_all_resources = []
         for anId in stackids:
             d = {
@@ -701,10 +930,24 @@ class TaskCat(object):
             l_all_resources.append(d)
         return l_all_resources
 
+    def get_template_validator(self):
+        """
+        Returns the TemplateValidator used to validate templates in the default region.
+
+        :return: TemplateValidator object
+        """
+        if self._template_validator is None:
+            self._template_validator = TemplateValidator(self._boto_client, self.get_default_region(),
+                                                         account=self.get_metadata_cache().account)
+        return self._template_validator
+
     def validate_template(self, taskcat_cfg, test_list):
         """
         Returns TRUE if all the template files are valid, otherwise FALSE.
 
+        Each distinct template is validated once (concurrently), templates validated in a previous
+        run and not modified since are not validated again.
+
         :param taskcat_cfg: TaskCat config object
         :param test_list: List of tests
 
@@ -712,33 +955,44 @@ class TaskCat(object):
         """
         # Load global regions
         self.set_test_region(self.get_global_region(taskcat_cfg))
-        for test in test_list:
-            print(self.nametag + " :Validate Template in test[%s]" % test)
-            self.define_tests(taskcat_cfg, test)
-            try:
-                if self.verbose:
-                    print(D + "Default region [%s]" % self.get_default_region())
-                cfn = self._boto_client.get('cloudformation', region=self.get_default_region())
-
-                cfn.validate_template(TemplateURL=self.get_s3_url(self.get_template_file()))
-                result = cfn.validate_template(TemplateURL=self.get_s3_url(self.get_template_file()))
-                print(P + "Validated [%s]" % self.get_template_file())
-                if 'Description' in result:
-                    cfn_result = (result['Description'])
-                    print(I + "Description  [%s]" % textwrap.fill(cfn_result))
-                else:
-                    print(I + "Please include a top-level description for template: [%s]" % self.get_template_file())
-                if self.verbose:
-                    cfn_params = json.dumps(result['Parameters'], indent=11, separators=(',', ': '))
-                    print(D + "Parameters:")
-                    print(cfn_params)
-            except Exception as e:
-                if self.verbose:
-                    print(D + str(e))
-                sys.exit(F + "Cannot validate %s" % self.get_template_file())
+        plans = self.get_test_plans(taskcat_cfg, test_list)
+        templates = OrderedDict()
+        for plan in plans:
+            templates.setdefault(plan.template_hash, plan.template_url)
+        if self.verbose:
+            print(D + "Default region [%s]" % self.get_default_region())
+            print(D + "Validating %s distinct template(s)" % len(templates))
+        results = self.get_template_validator().validate(templates)
+
+        for plan in plans:
+            self.check_template_validation(plan, *results[plan.template_hash])
         print('\n')
         return True
 
+    def check_template_validation(self, plan, result, error):
+        """
+        Prints the validation result of the template of a test, exits if the template is not valid.
+
+        :param plan: TestPlan object
+        :param result: Result of validate_template (None on failure)
+        :param error: Exception raised by validate_template (None on success)
+        """
+        print(self.nametag + " :Validate Template in test[%s]" % plan.name)
+        if error is not None:
+            if self.verbose:
+                print(D + str(error))
+            sys.exit(F + "Cannot validate %s" % plan.template_file)
+        print(P + "Validated [%s]" % plan.template_file)
+        if 'Description' in result:
+            cfn_result = (result['Description'])
+            print(I + "Description  [%s]" % textwrap.fill(cfn_result))
+        else:
+            print(I + "Please include a top-level description for template: [%s]" % plan.template_file)
+        if self.verbose:
+            cfn_params = json.dumps(result['Parameters'], indent=11, separators=(',', ': '))
+            print(D + "Parameters:")
+            print(cfn_params)
+
     def genpassword(self, pass_length, pass_type):
         """
         Returns a password of given length and type.
@@ -872,196 +1126,115 @@ class TaskCat(object):
         # Example: $[taskcat_genaz_2] (if the region is us-east-2)
         # Generates: us-east-1a, us-east-2b
 
-        for parmdict in s_parms:
-            for _ in parmdict:
-
-                param_value = parmdict['ParameterValue']
-
-                # Determines the size of the password to generate
-                count_re = re.compile('(?!\w+_)\d{1,2}', re.IGNORECASE)
-
-                # Determines the type of password to generate, partially. Additional computation
-                # is required on the result returned by the matching string.
-                gentype_re = re.compile(
-                    '(?<=_genpass_)((\d+)(\w)(\]))', re.IGNORECASE)
-
-                # Determines if _genpass has been requested
-                genpass_re = re.compile(
-                    '\$\[\w+_genpass?(\w)_\d{1,2}\w?]$', re.IGNORECASE)
-
-                # Determines if random string  value was requested
-                gen_string_re = re.compile(
-                    '\$\[taskcat_random-string]$', re.IGNORECASE)
-
-                # Determines if random number value was requested
-                gen_numbers_re = re.compile(
-                    '\$\[taskcat_random-numbers]$', re.IGNORECASE)
-
-                # Determines if autobucket value was requested
-                autobucket_re = re.compile(
-                    '\$\[taskcat_autobucket]$', re.IGNORECASE)
-
-                # Determines if _genaz has been requested. This can return single or multiple AZs.
-                genaz_re = re.compile('\$\[\w+_ge[nt]az_\d]', re.IGNORECASE)
-
-                # Determines if single AZ has been requested. This is added to support legacy templates
-                genaz_single_re = re.compile('\$\[\w+_ge[nt]singleaz_\d]', re.IGNORECASE)
-
-                # Determines if uuid has been requested
-                genuuid_re = re.compile('\$\[\w+_gen[gu]uid]', re.IGNORECASE)
-
-                # Determines if AWS QuickStart default KeyPair name has been requested
-                getkeypair_re = re.compile('\$\[\w+_getkeypair]', re.IGNORECASE)
-
-                # Determines if AWS QuickStart default license bucket name has been requested
-                getlicensebucket_re = re.compile('\$\[\w+_getlicensebucket]', re.IGNORECASE)
-
-                # Determines if AWS QuickStart default media bucket name has been requested
-                getmediabucket_re = re.compile('\$\[\w+_getmediabucket]', re.IGNORECASE)
-
-                # Determines if license content has been requested
-                licensecontent_re = re.compile('\$\[\w+_getlicensecontent]', re.IGNORECASE)
-
-                # Determines if s3 replacement was requested
-                gets3replace = re.compile('\$\[\w+_url_.+]$', re.IGNORECASE)
-                geturl_re = re.compile('(?<=._url_)(.+)(?=]$)', re.IGNORECASE)
-
-                # If Number is found as Parameter Value convert it to String ( ex: 1 to "1")
-                if type(param_value) == int:
-                    param_value = str(param_value)
-                    if self.verbose:
-                        (I + "Converting byte values in stack input file({}) to [string value]".format(
-                            self.get_parameter_file()))
-                    parmdict['ParameterValue'] = param_value
-
-                if gen_string_re.search(param_value):
-                    random_string = self.regxfind(gen_string_re, param_value)
-                    param_value = self.generate_random('alpha', 20)
+        return self.get_param_mutator().mutate(s_parms, region)
 
-                    if self.verbose:
-                        print("{}Generating random string for {}".format(D, random_string))
-                    parmdict['ParameterValue'] = param_value
-
-                if gen_numbers_re.search(param_value):
-                    random_numbers = self.regxfind(gen_numbers_re, param_value)
-                    param_value = self.generate_random('number', 20)
+    def get_param_mutator(self):
+        """
+        Returns the ParamMutator resolving the $[taskcat_*] placeholders (see generate_input_param_values).
+        The placeholder patterns are compiled once per TaskCat instance.
 
-                    if self.verbose:
-                        print("{}Generating numeric string for {}".format(D, random_numbers))
-                    parmdict['ParameterValue'] = param_value
+        :return: ParamMutator object
+        """
+        if self._param_mutator is not None:
+            return self._param_mutator
 
-                if genuuid_re.search(param_value):
-                    uuid_string = self.regxfind(genuuid_re, param_value)
-                    param_value = self.generate_uuid('A')
+        def _random_string(match, region):
+            if self.verbose:
+                print("{}Generating random string for {}".format(D, match.group(0)))
+            return self.generate_random('alpha', 20)
 
-                    if self.verbose:
-                        print("{}Generating random uuid string for {}".format(D, uuid_string))
-                    parmdict['ParameterValue'] = param_value
+        def _random_numbers(match, region):
+            if self.verbose:
+                print("{}Generating numeric string for {}".format(D, match.group(0)))
+            return self.generate_random('number', 20)
 
-                if autobucket_re.search(param_value):
-                    bkt = self.regxfind(autobucket_re, param_value)
-                    param_value = self.get_s3bucket()
-                    if self.verbose:
-                        print("{}Setting value to {}".format(D, bkt))
-                    parmdict['ParameterValue'] = param_value
+        def _uuid(match, region):
+            if self.verbose:
+                print("{}Generating random uuid string for {}".format(D, match.group(0)))
+            return self.generate_uuid('A')
 
-                if gets3replace.search(param_value):
-                    url = self.regxfind(geturl_re, param_value)
-                    param_value = self.get_s3contents(url)
-                    if self.verbose:
-                        print("{}Raw content of url {}".format(D, url))
-                    parmdict['ParameterValue'] = param_value
+        def _autobucket(match, region):
+            if self.verbose:
+                print("{}Setting value to {}".format(D, match.group(0)))
+            return self.get_s3bucket()
 
-                if getkeypair_re.search(param_value):
-                    keypair = self.regxfind(getkeypair_re, param_value)
-                    param_value = 'cikey'
-                    if self.verbose:
-                        print("{}Generating default Keypair {}".format(D, keypair))
-                    parmdict['ParameterValue'] = param_value
+        def _s3_content(match, region):
+            url = match.group('url_value')
+            if self.verbose:
+                print("{}Raw content of url {}".format(D, url))
+            return self.get_s3contents(url)
 
-                if getlicensebucket_re.search(param_value):
-                    licensebucket = self.regxfind(getlicensebucket_re, param_value)
-                    param_value = 'quickstart-ci-license'
-                    if self.verbose:
-                        print("{}Generating default license bucket {}".format(D, licensebucket))
-                    parmdict['ParameterValue'] = param_value
+        def _static(value, message):
+            def _resolver(match, region):
+                if self.verbose:
+                    print("{}{} {}".format(D, message, match.group(0)))
+                return value
+            return _resolver
 
-                if getmediabucket_re.search(param_value):
-                    media_bucket = self.regxfind(getmediabucket_re, param_value)
-                    param_value = 'quickstart-ci-media'
-                    if self.verbose:
-                        print("{}Generating default media bucket {}".format(D, media_bucket))
-                    parmdict['ParameterValue'] = param_value
+        def _license_content(match, region):
+            license_bucket = 'quickstart-ci-license'
+            licensekey = match.group(0).strip('/')
+            if self.verbose:
+                print("{}Getting license content for {}/{}".format(D, license_bucket, licensekey))
+            return self.get_content(license_bucket, licensekey)
+
+        def _password(match, region):
+            # Sample password types would be 'A' or 'S' or '' (or a digit, when no type is given)
+            gentype = match.group('genpass_type').upper()
+            if gentype not in ('A', 'S'):
+                # Set default password type
+                # A value of D will generate a simple alpha
+                # aplha numeric password
+                gentype = 'D'
+            if self.verbose:
+                print("{}AutoGen values for {}".format(D, match.group(0)))
+            return self.genpassword(int(match.group('genpass_len')), gentype)
 
-                if licensecontent_re.search(param_value):
-                    license_bucket = 'quickstart-ci-license'
-                    licensekey = (self.regxfind(licensecontent_re, param_value)).strip('/')
-                    param_value = self.get_content(license_bucket, licensekey)
-                    if self.verbose:
-                        print("{}Getting license content for {}/{}".format(D, license_bucket, licensekey))
-                    parmdict['ParameterValue'] = param_value
-
-                # Autogenerated value to password input in runtime
-                if genpass_re.search(param_value):
-                    passlen = int(
-                        self.regxfind(count_re, param_value))
-                    gentype = self.regxfind(
-                        gentype_re, param_value)
-                    # Additional computation to identify if the gentype is one of the desired values.
-                    # Sample gentype values would be '8A]' or '24S]' or '2]'
-                    # To get the correct gentype, get 2nd char from the last and check if its A or S
-                    gentype = gentype[-2]
-                    if gentype in ('a', 'A', 's', 'S'):
-                        gentype = gentype.upper()
-                    else:
-                        gentype = None
-                    if not gentype:
-                        # Set default password type
-                        # A value of D will generate a simple alpha
-                        # aplha numeric password
-                        gentype = 'D'
-
-                    if passlen:
-                        if self.verbose:
-                            print("{}AutoGen values for {}".format(D, param_value))
-                        param_value = self.genpassword(
-                            passlen, gentype)
-                        parmdict['ParameterValue'] = param_value
-
-                if genaz_re.search(param_value):
-                    numazs = int(
-                        self.regxfind(count_re, param_value))
-                    if numazs:
-                        if self.verbose:
-                            print(D + "Selecting availability zones")
-                            print(D + "Requested %s az's" % numazs)
-
-                        param_value = self.get_available_azs(
-                            region,
-                            numazs)
-                        parmdict['ParameterValue'] = param_value
-                    else:
-                        print(I + "$[taskcat_genaz_(!)]")
-                        print(I + "Number of az's not specified!")
-                        print(I + " - (Defaulting to 1 az)")
-                        param_value = self.get_available_azs(
-                            region,
-                            1)
-                        parmdict['ParameterValue'] = param_value
-
-                if genaz_single_re.search(param_value):
+        def _azs(match, region):
+            numazs = int(match.group('genaz_count'))
+            if numazs:
+                if self.verbose:
                     print(D + "Selecting availability zones")
-                    print(D + "Requested 1 az")
-                    param_value = self.get_available_azs(
-                        region,
-                        1)
-                    parmdict['ParameterValue'] = param_value
-        return s_parms
+                    print(D + "Requested %s az's" % numazs)
+            else:
+                print(I + "$[taskcat_genaz_(!)]")
+                print(I + "Number of az's not specified!")
+                print(I + " - (Defaulting to 1 az)")
+                numazs = 1
+            return self.get_available_azs(region, numazs)
+
+        def _single_az(match, region):
+            print(D + "Selecting availability zones")
+            print(D + "Requested 1 az")
+            return self.get_available_azs(region, 1)
+
+        mutator = ParamMutator()
+        mutator.register('random_string', r'taskcat_random-string\]$', _random_string)
+        mutator.register('random_numbers', r'taskcat_random-numbers\]$', _random_numbers)
+        mutator.register('genuuid', r'\w+_gen[gu]uid\]', _uuid)
+        mutator.register('autobucket', r'taskcat_autobucket\]$', _autobucket, cacheable=True)
+        mutator.register('url', r'\w+?_url_(?P<url_value>.+)\]$', _s3_content, cacheable=True)
+        mutator.register('getkeypair', r'\w+_getkeypair\]',
+                         _static('cikey', 'Generating default Keypair'), cacheable=True)
+        mutator.register('getlicensebucket', r'\w+_getlicensebucket\]',
+                         _static('quickstart-ci-license', 'Generating default license bucket'), cacheable=True)
+        mutator.register('getmediabucket', r'\w+_getmediabucket\]',
+                         _static('quickstart-ci-media', 'Generating default media bucket'), cacheable=True)
+        mutator.register('getlicensecontent', r'\w+_getlicensecontent\]', _license_content, cacheable=True)
+        mutator.register('genpass', r'\w+_genpass?\w_(?P<genpass_len>\d{1,2})(?P<genpass_type>\w?)\]$', _password)
+        mutator.register('genaz', r'\w+_ge[nt]az_(?P<genaz_count>\d)\]', _azs, cacheable=True)
+        mutator.register('gensingleaz', r'\w+_ge[nt]singleaz_\d\]', _single_az, cacheable=True)
+        self._param_mutator = mutator
+        return mutator
 
     def stackcreate(self, taskcat_cfg, test_list, sprefix):
         """
         This function creates CloudFormation stack for the given tests.
 
+        Parameters are prepared for every test and region first, then the stacks are launched
+        concurrently (see set_launch_concurrency). A failed launch is recorded in the TestData
+        object of its test and does not stop the other launches.
+
         :param taskcat_cfg: TaskCat config as yaml object
         :param test_list: List of tests
         :param sprefix: Special prefix as string. Purpose of this param is to use it for tagging
@@ -1071,50 +1244,111 @@ class TaskCat(object):
 
         """
         testdata_list = []
+        launcher = StackLauncher(self._boto_client, self.get_launch_concurrency())
         self.set_capabilities('CAPABILITY_NAMED_IAM')
-        for test in test_list:
+        for plan in self.get_test_plans(taskcat_cfg, test_list):
             testdata = TestData()
-            testdata.set_test_name(test)
-            print("{0}{1}|PREPARING TO LAUNCH => {2}{3}".format(I, header, test, rst_color))
-            sname = str(sig)
-
-            stackname = sname + '-' + sprefix + '-' + test + '-' + jobid[:8]
-            self.define_tests(taskcat_cfg, test)
-            for region in self.get_test_region():
-                print(I + "Preparing to launch in region [%s] " % region)
-                try:
-                    cfn = self._boto_client.get('cloudformation', region=region)
-                    s_parmsdata = self.get_s3contents(self.get_parameter_path())
-                    s_parms = json.loads(s_parmsdata)
-                    s_include_params = self.get_param_includes(s_parms)
-                    if s_include_params:
-                        s_parms = s_include_params
-                    j_params = self.generate_input_param_values(s_parms, region)
-                    if self.verbose:
-                        print(D + "Creating Boto Connection region=%s" % region)
-                        print(D + "StackName=" + stackname)
-                        print(D + "DisableRollback=True")
-                        print(D + "TemplateURL=%s" % self.get_template_path())
-                        print(D + "Capabilities=%s" % self.get_capabilities())
-                        print(D + "Parameters:")
-                        if self.get_template_type() == 'json':
-                            print(json.dumps(j_params, sort_keys=True, indent=11, separators=(',', ': ')))
-
-                    stackdata = cfn.create_stack(
-                        StackName=stackname,
-                        DisableRollback=True,
-                        TemplateURL=self.get_template_path(),
-                        Parameters=j_params,
-                        Capabilities=self.get_capabilities())
-
-                    testdata.add_test_stack(stackdata)
-
-                except Exception as e:
-                    if self.verbose:
-                        print(E + str(e))
-                    sys.exit(F + "Cannot launch %s" % self.get_template_file())
-
+            testdata.set_test_name(plan.name)
             testdata_list.append(testdata)
+            for region, stack_args in self.prepare_test_stacks(plan, testdata, sprefix):
+                launcher.add(testdata, region, **stack_args)
+
+        print(I + "Launching stacks (concurrency = %s)" % self.get_launch_concurrency())
+        for result in launcher.launch():
+            self.record_launch(result.testdata, result.region, result.stack_name, result.stack, result.error)
+        self.report_launches(testdata_list)
+        return testdata_list
+
+    def get_stack_name(self, test, sprefix):
+        """
+        Returns the name of the stacks of a test.
+
+        :param test: Test name
+        :param sprefix: Special prefix as string, used for tagging the stack
+        """
+        return str(sig) + '-' + sprefix + '-' + test + '-' + jobid[:8]
+
+    def prepare_test_stacks(self, plan, testdata, sprefix):
+        """
+        Prepares the create_stack arguments of a test in each of its regions. Regions in which
+        the parameters cannot be prepared are recorded as launch errors in testdata.
+
+        :param plan: TestPlan object
+        :param testdata: TestData object of the test
+        :param sprefix: Special prefix as string, used for tagging the stack
+
+        :return: List of (region, create_stack keyword arguments) tuples
+        """
+        print("{0}{1}|PREPARING TO LAUNCH => {2}{3}".format(I, header, plan.name, rst_color))
+        stackname = self.get_stack_name(plan.name, sprefix)
+        # Overrides are merged once per test, each region resolves its own copy
+        try:
+            s_parms = plan.get_parameters()
+            s_include_params = self.get_param_includes(s_parms)
+            if s_include_params:
+                s_parms = s_include_params
+        except Exception as e:
+            print(E + "Cannot prepare parameters of %s" % plan.template_file)
+            if self.verbose:
+                print(E + str(e))
+            for region in plan.regions:
+                testdata.add_launch_error(region, e)
+            return []
+
+        stacks = []
+        for region in plan.regions:
+            print(I + "Preparing to launch in region [%s] " % region)
+            try:
+                j_params = self.generate_input_param_values(copy.deepcopy(s_parms), region)
+            except Exception as e:
+                print(E + "Cannot prepare parameters of %s in region [%s]" % (plan.template_file, region))
+                if self.verbose:
+                    print(E + str(e))
+                testdata.add_launch_error(region, e)
+                continue
+            if self.verbose:
+                print(D + "Creating Boto Connection region=%s" % region)
+                print(D + "StackName=" + stackname)
+                print(D + "DisableRollback=True")
+                print(D + "TemplateURL=%s" % plan.template_url)
+                print(D + "Capabilities=%s" % self.get_capabilities())
+                print(D + "Parameters:")
+                if plan.template_type == 'json':
+                    print(json.dumps(j_params, sort_keys=True, indent=11, separators=(',', ': ')))
+
+            stacks.append((region, dict(StackName=stackname,
+                                        DisableRollback=True,
+                                        TemplateURL=plan.template_url,
+                                        Parameters=j_params,
+                                        Capabilities=list(self.get_capabilities()))))
+        return stacks
+
+    def record_launch(self, testdata, region, stack_name, stack, error):
+        """
+        Records the outcome of a create_stack call in the TestData object of its test.
+
+        :param testdata: TestData object of the test
+        :param region: Region the stack was launched in
+        :param stack_name: Name of the stack
+        :param stack: create_stack response (None on failure)
+        :param error: Exception raised by create_stack (None on success)
+        """
+        if error:
+            print(F + "Cannot launch [{}] in region [{}]".format(stack_name, region))
+            print(E + str(error))
+            testdata.add_launch_error(region, error)
+        else:
+            testdata.add_test_stack(stack)
+
+    def report_launches(self, testdata_list):
+        """
+        Prints the launched stacks and launch errors of every test, exits if no stack was launched.
+
+        :param testdata_list: List of TestData objects
+        """
+        if not any(test.get_test_stacks() for test in testdata_list):
+            sys.exit(F + "No stacks were launched")
+
         print('\n')
         for test in testdata_list:
             for stack in test.get_test_stacks():
@@ -1125,7 +1359,8 @@ class TaskCat(object):
                     test.get_test_name(),
                     str(stack['StackId']).split(':stack', 1),
                     rst_color))
-        return testdata_list
+            for launch_error in test.get_launch_errors():
+                print("{} {} failed to launch in [{}]".format(F, test.get_test_name(), launch_error['region']))
 
     def validate_parameters(self, taskcat_cfg, test_list):
         """
@@ -1136,24 +1371,30 @@ class TaskCat(object):
 
         :return: TRUE if the parameters file is valid, else FALSE
         """
-        for test in test_list:
-            self.define_tests(taskcat_cfg, test)
-            print(self.nametag + " |Validate JSON input in test[%s]" % test)
-            if self.verbose:
-                print(D + "parameter_path = %s" % self.get_parameter_path())
+        for plan in self.get_test_plans(taskcat_cfg, test_list):
+            self.validate_plan_parameters(plan)
+        return True
 
-            inputparms = self.get_s3contents(self.get_parameter_path())
-            jsonstatus = self.check_json(inputparms)
+    def validate_plan_parameters(self, plan):
+        """
+        Validates the parameters file of a test, exits if it is not valid json.
 
-            if self.verbose:
-                print(D + "jsonstatus = %s" % jsonstatus)
+        :param plan: TestPlan object
+        """
+        print(self.nametag + " |Validate JSON input in test[%s]" % plan.name)
+        if self.verbose:
+            print(D + "parameter_path = %s" % plan.parameter_url)
 
-            if jsonstatus:
-                print(P + "Validated [%s]" % self.get_parameter_file())
-            else:
-                print(D + "parameter_file = %s" % self.get_parameter_file())
-                sys.exit(F + "Cannot validate %s" % self.get_parameter_file())
-        return True
+        jsonstatus = self.check_json(plan.parameter_content)
+
+        if self.verbose:
+            print(D + "jsonstatus = %s" % jsonstatus)
+
+        if jsonstatus:
+            print(P + "Validated [%s]" % plan.parameter_file)
+        else:
+            print(D + "parameter_file = %s" % plan.parameter_file)
+            sys.exit(F + "Cannot validate %s" % plan.parameter_file)
 
     @staticmethod
     def regxfind(re_object, data_line):
@@ -1228,6 +1469,7 @@ class TaskCat(object):
         :param table_name: Creates table if it does not exist. Waits for the table to become available
         :return: DynamoDB object
         """
+        import boto3
         dynamodb = boto3.resource('dynamodb', region_name=self.get_default_region())
         try:
             table = dynamodb.create_table(
@@ -1261,20 +1503,46 @@ class TaskCat(object):
                 table.meta.client.get_waiter('table_exists').wait(TableName=table_name)
                 return table
 
-    def db_item(self, table, time_stamp, region, job_name, log_group, owner, job_status):
+    def get_db_table(self):
+        """
+        Returns the DynamoDB table of the project, created or resolved once per run.
+
+        :return: DynamoDB Table object
+        """
+        if self._db_table is None:
+            self._db_table = self.db_initproject(self.get_project())
+        return self._db_table
+
+    def db_record(self, time_stamp, region, job_name, log_group, owner, job_status):
         # :TODO add jobid getter and setter
+        return {
+            'job-name': job_name,
+            'last-run': time_stamp,
+            'region': region,
+            'owner': owner,
+            'test-history': log_group,
+            'job-status': job_status,
+            'test-outputs': jobid[:8],
+        }
+
+    def db_item(self, table, time_stamp, region, job_name, log_group, owner, job_status):
         table.put_item(
-            Item={
-                'job-name': job_name,
-                'last-run': time_stamp,
-                'region': region,
-                'owner': owner,
-                'test-history': log_group,
-                'job-status': job_status,
-                'test-outputs': jobid[:8],
-            }
+            Item=self.db_record(time_stamp, region, job_name, log_group, owner, job_status)
         )
 
+    def db_write_records(self, records):
+        """
+        Writes status records to the project table with batched writes.
+
+        :param records: List of items built by db_record()
+        """
+        if not records:
+            return
+        # Items sharing a key overwrite each other in order, as individual put_item calls would
+        with self.get_db_table().batch_writer(overwrite_by_pkeys=['job-name']) as batch:
+            for record in records:
+                batch.put_item(Item=record)
+
     def enable_dynamodb_reporting(self, enable):
         self._enable_dynamodb = enable
 
@@ -1284,14 +1552,38 @@ class TaskCat(object):
         of each CloudFormation stack and updates the corresponding TestData object
         with the status.
 
+        The status of the stacks is fetched with one batched call per region (see StackPoller).
+        How often each stack is polled is decided by a PollScheduler: the interval starts at
+        speed and backs off while a stack stays in progress (up to max_poll_interval), and
+        tightens again as the stack nears the duration it took in previous runs.
+
         :param testdata_list: List of TestData object
-        :param speed: Interval (in seconds) in which the status has to be checked in loop
+        :param speed: Minimum interval (in seconds) in which the status has to be checked in loop
 
         """
-        active_tests = 1
+        poller = StackPoller(self._boto_client)
+        durations = StackDurations()
+        scheduler = PollScheduler(min_interval=speed, max_interval=self.get_max_poll_interval(), durations=durations)
+        for test in testdata_list:
+            for stack in test.get_test_stacks():
+                stack_id = str(stack['StackId'])
+                scheduler.track(stack_id, '{}/{}/{}'.format(
+                    self.get_project(), test.get_test_name(), get_stack_region(stack_id)))
+
+        states = {}
+        # Last (region, status) written to DynamoDB per item key ('job-name', shared by the
+        # regions of a test), only changes of the item are written
+        reported = {}
         print('\n')
-        while active_tests > 0:
-            current_active_tests = 0
+        while scheduler.active():
+            # Regions are polled in batches, so every active stack of a region with a due stack is refreshed
+            due_regions = set(get_stack_region(stack_id) for stack_id in scheduler.due())
+            polled = poller.poll([stack_id for stack_id in scheduler.active()
+                                  if get_stack_region(stack_id) in due_regions])
+            for stack_id, status in polled.items():
+                scheduler.update(stack_id, status)
+            states.update(polled)
+
             print(I + "{}{} {} [{}]{}".format(
                 header,
                 'AWS REGION'.ljust(15),
@@ -1300,11 +1592,11 @@ class TaskCat(object):
                 rst_color))
 
             time_stamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            records = OrderedDict()
             for test in testdata_list:
                 for stack in test.get_test_stacks():
-                    stackquery = self.stackcheck(str(stack['StackId']))
-                    current_active_tests = stackquery[
-                                               3] + current_active_tests
+                    stackdata = self.parse_stack_info(str(stack['StackId']))
+                    stackquery = [stackdata['stack_name'], stackdata['region'], states[str(stack['StackId'])]]
                     logs = (I + "{3}{0} {1} [{2}]{4}".format(
                         stackquery[1].ljust(15),
                         stackquery[2].ljust(25),
@@ -1313,22 +1605,40 @@ class TaskCat(object):
                         rst_color))
                     print(logs)
                     if self._enable_dynamodb:
-                        table = self.db_initproject(self.get_project())
                         # Do not update when in cleanup start (preserves previous status)
                         skip_status = ['DELETE_IN_PROGRESS', 'STACK_DELETED']
                         if stackquery[2] not in skip_status:
-                            self.db_item(table,
-                                         time_stamp,
-                                         stackquery[1],
-                                         test.get_test_name(),
-                                         'log group stub',
-                                         self.get_owner(),
-                                         stackquery[2])
+                            # As with individual writes, the last stack of the test wins
+                            records[test.get_test_name()] = (stackquery[1], stackquery[2])
 
                     stack['status'] = stackquery[2]
-                    active_tests = current_active_tests
-                    time.sleep(speed)
+            # Status changes of the round are flushed together
+            changed = [(job_name, item) for job_name, item in records.items() if reported.get(job_name) != item]
+            reported.update(changed)
+            self.db_write_records([self.db_record(time_stamp, region, job_name, 'log group stub',
+                                                  self.get_owner(), status)
+                                   for job_name, (region, status) in changed])
+            if scheduler.active():
+                time.sleep(scheduler.next_poll_in())
             print('\n')
+        self._status_snapshot.update(states)
+        durations.save()
+
+    def get_status_snapshot(self, testdata_list):
+        """
+        Returns the last known status of the stacks of the given tests.
+
+        The statuses recorded by get_stackstatus() are used, stacks which were never polled
+        are polled once (with one batched call per region).
+
+        :param testdata_list: List of TestData objects
+        :return: Dictionary of stack arn => stack status (STACK_DELETED for deleted stacks)
+        """
+        missing = [str(stack['StackId']) for test in testdata_list for stack in test.get_test_stacks()
+                   if str(stack['StackId']) not in self._status_snapshot]
+        if missing:
+            self._status_snapshot.update(StackPoller(self._boto_client).poll(missing))
+        return self._status_snapshot
 
     def cleanup(self, testdata_list, speed):
         """
@@ -1360,38 +1670,37 @@ class TaskCat(object):
         :param testdata_list: List of TestData objects
 
         """
+        failed_stack_ids = OrderedDict()
         for test in testdata_list:
-            failed_stack_ids = []
             for stack in test.get_test_stacks():
                 if str(stack['status']) == 'DELETE_FAILED':
-                    failed_stack_ids.append(stack['StackId'])
-            if len(failed_stack_ids) == 0:
-                print(I + "All stacks deleted successfully. Deep clean-up not required.")
-                continue
+                    failed_stack_ids.setdefault(get_stack_region(stack['StackId']), []).append(stack['StackId'])
 
+        if not failed_stack_ids:
+            print(I + "All stacks deleted successfully. Deep clean-up not required.")
+        else:
             print(I + "Few stacks failed to delete. Collecting resources for deep clean-up.")
-            # get test region from the stack id
-            stackdata = self.parse_stack_info(
-                str(failed_stack_ids[0]))
-            region = stackdata['region']
-            session = boto3.session.Session(region_name=region)
-            s = Reaper(session)
-            failed_stacks = self.get_all_resources(failed_stack_ids, region)
-            # print all resources which failed to delete
-            if self.verbose:
-                print(D + "Resources which failed to delete:\n")
-                for failed_stack in failed_stacks:
-                    print(D + "Stack Id: " + failed_stack['stackId'])
-                    for res in failed_stack['resources']:
-                        print(D + "{0} = {1}, {2} = {3}, {4} = {5}".format(
-                            '\n\t\tLogicalId',
-                            res.get('logicalId'),
-                            '\n\t\tPhysicalId',
-                            res.get('physicalId'),
-                            '\n\t\tType',
-                            res.get('resourceType')
-                        ))
-                s.delete_all(failed_stacks)
+            planner = CleanupPlanner(self._boto_client)
+            for region, stack_ids in failed_stack_ids.items():
+                failed_stacks = self.get_all_resources(stack_ids, region)
+                # print all resources which failed to delete
+                if self.verbose:
+                    print(D + "Resources which failed to delete:\n")
+                    for failed_stack in failed_stacks:
+                        print(D + "Stack Id: " + failed_stack['stackId'])
+                        for res in failed_stack['resources']:
+                            print(D + "{0} = {1}, {2} = {3}, {4} = {5}".format(
+                                '\n\t\tLogicalId',
+                                res.get('logicalId'),
+                                '\n\t\tPhysicalId',
+                                res.get('physicalId'),
+                                '\n\t\tType',
+                                res.get('resourceType')
+                            ))
+                planner.add(region, failed_stacks)
+            leftovers = planner.run()
+            for (region, rtype), ids in sorted(leftovers.items()):
+                print(E + "Unable to delete {} [{}] in [{}]".format(rtype, ', '.join(ids), region))
 
         # Check to see if auto bucket was created
         if self.get_s3bucket_type() is 'auto':
@@ -1426,6 +1735,7 @@ class TaskCat(object):
             # Delete bucket
             s3_client.delete_bucket(
                 Bucket=self.get_s3bucket())
+            self._s3_key_index = None
             if self.verbose:
                 print(D + "Deleting Bucket {0}".format(self.get_s3bucket()))
 
@@ -1448,6 +1758,142 @@ class TaskCat(object):
                 cfn = self._boto_client.get('cloudformation', region=region)
                 cfn.delete_stack(StackName=stack_name)
 
+    def set_cleanup_from_config(self, yamlc):
+        """
+        Sets the cleanup flag from the global section of the config.
+
+        :param yamlc: TaskCat config yaml object
+        """
+        # Checks if cleanup flag is set
+        # If cleanup is set to 'false' stack will not be deleted after
+        # launch attempt
+        if 'cleanup' in yamlc['global'].keys():
+            cleanupstack = yamlc['global']['cleanup']
+            if cleanupstack:
+                if self.verbose:
+                    print(D + "cleanup set to yaml value")
+                    self.set_docleanup(cleanupstack)
+            else:
+                print(I + "Cleanup value set to (false)")
+                self.set_docleanup(False)
+        else:
+            # By default do cleanup unless self.run_cleanup
+            # was overridden (set to False) by -n flag
+            if not self.run_cleanup:
+                if self.verbose:
+                    print(D + "cleanup set by cli flag {0}".format(self.run_cleanup))
+            else:
+                self.set_docleanup(True)
+                if self.verbose:
+                    print(I + "No cleanup value set")
+                    print(I + " - (Defaulting to cleanup)")
+
+    def detect_template_type(self, cfntemplate):
+        """
+        Returns the type of a template ('json' or 'yaml'), exits if strict json syntax is enforced
+        and the template is not valid json.
+
+        :param cfntemplate: Content of the template
+        """
+        if self.check_json(cfntemplate, quite=True, strict=False):
+            # Enforce strict json syntax
+            if self._strict_syntax_json:
+                self.check_json(cfntemplate, quite=True, strict=True)
+            return 'json'
+        self.check_yaml(cfntemplate, quite=True, strict=False)
+        return 'yaml'
+
+    def build_test_plans(self, yamlc, test_list, concurrency=8):
+        """
+        Resolves the S3 urls, template type, parameters and regions of the given tests once.
+        Staged files are downloaded concurrently. The plans are kept by the instance and used by
+        validate_template, validate_parameters and stackcreate.
+
+        :param yamlc: TaskCat config yaml object
+        :param test_list: List of tests
+        :param concurrency: Maximum number of files downloaded concurrently
+
+        :return: List of TestPlan objects, in the order of test_list
+        """
+        self.set_project(yamlc['global']['qsname'])
+        self.set_owner(yamlc['global']['owner'])
+        self.set_cleanup_from_config(yamlc)
+        global_regions = self.get_global_region(yamlc)
+
+        urls = OrderedDict()
+        for test in test_list:
+            tcfg = yamlc['tests'][test]
+            for filename in (tcfg['template_file'], tcfg['parameter_input']):
+                url = self.get_s3_url(filename)
+                # Check to make sure filenames are correct
+                if not url:
+                    print("{0} Could not locate {1}".format(E, filename))
+                    print("{0} Check to make sure filename is correct?".format(E, filename))
+                    quit()
+                urls[filename] = url
+
+        # Create the S3 client up front, so the workers only read the client cache
+        if not self.public_s3_bucket:
+            self._boto_client.get('s3', region=self.get_default_region(), s3v4=True)
+        pool = ThreadPool(max(1, min(concurrency, len(urls))))
+        try:
+            contents = dict(zip(urls.values(), pool.map(self.get_s3contents, urls.values())))
+        finally:
+            pool.close()
+            pool.join()
+
+        for test in test_list:
+            tcfg = yamlc['tests'][test]
+            template_url = urls[tcfg['template_file']]
+            template_content = contents[template_url]
+            parameter_url = urls[tcfg['parameter_input']]
+            parameter_content = contents[parameter_url]
+            try:
+                parameters = json.loads(parameter_content)
+            except ValueError:
+                parameters = None
+            regions = tcfg.get('regions')
+            plan = TestPlan(
+                name=test,
+                template_file=tcfg['template_file'],
+                template_url=template_url,
+                template_type=self.detect_template_type(template_content),
+                template_hash=template_hash(template_content),
+                parameter_file=tcfg['parameter_input'],
+                parameter_url=parameter_url,
+                parameter_content=parameter_content,
+                parameters=parameters,
+                regions=tuple(regions if regions is not None else global_regions))
+            self._test_plans[test] = plan
+
+            if self.verbose:
+                print(I + "|Acquiring tests assets for .......[%s]" % test)
+                print(D + "|S3 Bucket     => [%s]" % self.get_s3bucket())
+                print(D + "|Project       => [%s]" % self.get_project())
+                print(D + "|Template      => [%s]" % plan.template_url)
+                print(D + "|Parameter     => [%s]" % plan.parameter_url)
+                print(D + "|TemplateType  => [%s]" % plan.template_type)
+                print(D + ("|Defined Regions:" if regions is not None else "|Global Regions:"))
+                for list_o in plan.regions:
+                    print("\t\t\t - [%s]" % list_o)
+            print(P + "(Completed) acquisition of [%s]" % test)
+        print('\n')
+        return [self._test_plans[test] for test in test_list]
+
+    def get_test_plans(self, yamlc, test_list):
+        """
+        Returns the plans of the given tests, building the ones which were not built yet.
+
+        :param yamlc: TaskCat config yaml object
+        :param test_list: List of tests
+
+        :return: List of TestPlan objects, in the order of test_list
+        """
+        missing = [test for test in test_list if test not in self._test_plans]
+        if missing:
+            self.build_test_plans(yamlc, missing)
+        return [self._test_plans[test] for test in test_list]
+
     def define_tests(self, yamlc, test):
         """
         This function reads the given test config yaml object and defines
@@ -1466,29 +1912,7 @@ class TaskCat(object):
                 o = yamlc['global']['owner']
                 b = self.get_s3bucket()
 
-                # Checks if cleanup flag is set
-                # If cleanup is set to 'false' stack will not be deleted after
-                # launch attempt
-                if 'cleanup' in yamlc['global'].keys():
-                    cleanupstack = yamlc['global']['cleanup']
-                    if cleanupstack:
-                        if self.verbose:
-                            print(D + "cleanup set to yaml value")
-                            self.set_docleanup(cleanupstack)
-                    else:
-                        print(I + "Cleanup value set to (false)")
-                        self.set_docleanup(False)
-                else:
-                    # By default do cleanup unless self.run_cleanup
-                    # was overridden (set to False) by -n flag
-                    if not self.run_cleanup:
-                        if self.verbose:
-                            print(D + "cleanup set by cli flag {0}".format(self.run_cleanup))
-                    else:
-                        self.set_docleanup(True)
-                        if self.verbose:
-                            print(I + "No cleanup value set")
-                            print(I + " - (Defaulting to cleanup)")
+                self.set_cleanup_from_config(yamlc)
 
                 # Load test setting
                 self.set_s3bucket(b)
@@ -1518,16 +1942,7 @@ class TaskCat(object):
                 # Detect template type
 
                 cfntemplate = self.get_s3contents(self.get_s3_url(self.get_template_file()))
-
-                if self.check_json(cfntemplate, quite=True, strict=False):
-                    self.set_template_type('json')
-                    # Enforce strict json syntax
-                    if self._strict_syntax_json:
-                        self.check_json(cfntemplate, quite=True, strict=True)
-                else:
-                    self.set_template_type(None)
-                    self.check_yaml(cfntemplate, quite=True, strict=False)
-                    self.set_template_type('yaml')
+                self.set_template_type(self.detect_template_type(cfntemplate))
 
                 if self.verbose:
                     print(I + "|Acquiring tests assets for .......[%s]" % test)
@@ -1617,7 +2032,7 @@ class TaskCat(object):
                 sts_client = self._boto_client.get('sts',
                                                    profile_name=self._boto_profile,
                                                    region=self.get_default_region())
-                account = sts_client.get_caller_identity().get('Account')
+                account = self.get_metadata_cache().get_account_id(self.get_default_region(), sts_client)
                 print(self.nametag + " :AWS AccountNumber: \t [%s]" % account)
                 print(self.nametag + " :Authenticated via: \t [%s]" % self._auth_mode)
             except Exception as e:
@@ -1636,7 +2051,7 @@ class TaskCat(object):
                                                    aws_access_key_id=self._aws_access_key,
                                                    aws_secret_access_key=self._aws_secret_key,
                                                    region=self.get_default_region())
-                account = sts_client.get_caller_identity().get('Account')
+                account = self.get_metadata_cache().get_account_id(self.get_default_region(), sts_client)
                 print(self.nametag + " :AWS AccountNumber: \t [%s]" % account)
                 print(self.nametag + " :Authenticated via: \t [%s]" % self._auth_mode)
             except Exception as e:
@@ -1654,7 +2069,7 @@ class TaskCat(object):
             try:
                 sts_client = self._boto_client.get('sts',
                                                    region=self.get_default_region())
-                account = sts_client.get_caller_identity().get('Account')
+                account = self.get_metadata_cache().get_account_id(self.get_default_region(), sts_client)
                 print(self.nametag + " :AWS AccountNumber: \t [%s]" % account)
                 print(self.nametag + " :Authenticated via: \t [%s]" % self._auth_mode)
             except Exception as e:
@@ -1720,11 +2135,16 @@ class TaskCat(object):
         """
         This function generates the test report.
 
+        The report is streamed to dashboard_filename and never held in memory, so unlike
+        earlier releases the html is not returned; callers needing it read the file.
+
         :param testdata_list: List of TestData objects
         :param dashboard_filename: Report file name
 
+        :return: Report file name (the html string before the report was streamed)
         """
-        doc = yattag.Doc()
+        # Stack statuses come from the last poll, the report is built without describing the stacks again
+        snapshot = self.get_status_snapshot(testdata_list)
 
         # Type of cfnlog return cfn log file
         # Type of resource_log return resource log file
@@ -1737,158 +2157,27 @@ class TaskCat(object):
                 location = "{}-{}-{}{}".format(stack_name, region, 'resources', extension)
                 return str(location)
 
-        def get_teststate(stackname, region):
-            rstatus = None
-            status_css = None
-            try:
-                cfn = self._boto_client.get('cloudformation', region)
-                test_query = cfn.describe_stacks(StackName=stackname)
-
-                for result in test_query['Stacks']:
-                    rstatus = result.get('StackStatus')
-                    if rstatus == 'CREATE_COMPLETE':
-                        status_css = 'class=test-green'
-                    elif rstatus == 'CREATE_FAILED':
-                        status_css = 'class=test-red'
-                        if self.retain_if_failed and (self.run_cleanup == True):
-                            self.run_cleanup = False
-                    else:
-                        status_css = 'class=test-red'
-            except Exception as e:
-                print(E + "Error describing stack named [%s] " % stackname)
-                if self.verbose:
-                    print(D + str(e))
-                rstatus = 'MANUALLY_DELETED'
-                status_css = 'class=test-orange'
-
-            return rstatus, status_css
-
-        tag = doc.tag
-        text = doc.text
-        logo = 'taskcat'
-        repo_link = 'https://github.com/aws-quickstart/taskcat'
-        css_url = 'https://raw.githubusercontent.com/aws-quickstart/taskcat/master/assets/css/taskcat_reporting.css'
-        output_css = requests.get(css_url).text
-        doc_link = 'http://taskcat.io'
-
-        with tag('html'):
-            with tag('head'):
-                doc.stag('meta', charset='utf-8')
-                doc.stag(
-                    'meta', name="viewport", content="width=device-width")
-                with tag('style', type='text/css'):
-                    text(output_css)
-                with tag('title'):
-                    text('TaskCat Report')
-
-            with tag('body'):
-                tested_on = time.strftime('%A - %b,%d,%Y @ %H:%M:%S')
-
-                with tag('table', 'class=header-table-fill'):
-                    with tag('tbody'):
-                        with tag('th', 'colspan=2'):
-                            with tag('tr'):
-                                with tag('td'):
-                                    with tag('a', href=repo_link):
-                                        text('GitHub Repo: ')
-                                        text(repo_link)
-                                        doc.stag('br')
-                                    with tag('a', href=doc_link):
-                                        text('Documentation: ')
-                                        text(doc_link)
-                                        doc.stag('br')
-                                    text('Tested on: ')
-                                    text(tested_on)
-                                with tag('td', 'class=taskcat-logo'):
-                                    with tag('h3'):
-                                        text(logo)
-            doc.stag('p')
-            with tag('table', 'class=table-fill'):
-                with tag('tbody'):
-                    with tag('thread'):
-                        with tag('tr'):
-                            with tag('th',
-                                     'class=text-center',
-                                     'width=25%'):
-                                text('Test Name')
-                            with tag('th',
-                                     'class=text-left',
-                                     'width=10%'):
-                                text('Tested Region')
-                            with tag('th',
-                                     'class=text-left',
-                                     'width=30%'):
-                                text('Stack Name')
-                            with tag('th',
-                                     'class=text-left',
-                                     'width=20%'):
-                                text('Tested Results')
-                            with tag('th',
-                                     'class=text-left',
-                                     'width=15%'):
-                                text('Test Logs')
-
-                            for test in testdata_list:
-                                with tag('tr', 'class= test-footer'):
-                                    with tag('td', 'colspan=5'):
-                                        text('')
-
-                                testname = test.get_test_name()
-                                print(I + "(Generating Reports)")
-                                print(I + " - Processing {}".format(testname))
-                                for stack in test.get_test_stacks():
-                                    state = self.parse_stack_info(
-                                        str(stack['StackId']))
-                                    status, css = get_teststate(
-                                        state['stack_name'],
-                                        state['region'])
-
-                                    with tag('tr'):
-                                        with tag('td',
-                                                 'class=test-info'):
-                                            with tag('h3'):
-                                                text(testname)
-                                        with tag('td',
-                                                 'class=text-left'):
-                                            text(state['region'])
-                                        with tag('td',
-                                                 'class=text-left'):
-                                            text(state['stack_name'])
-                                        with tag('td', css):
-                                            text(str(status))
-                                        with tag('td',
-                                                 'class=text-left'):
-                                            clog = getofile(
-                                                state['region'],
-                                                state['stack_name'],
-                                                'cfnlog')
-                                            # rlog = getofile(
-                                            #    state['region'],
-                                            #    state['stack_name'],
-                                            #    'resource_log')
-                                            #
-                                            with tag('a', href=clog):
-                                                text('View Logs ')
-                                                # with tag('a', href=rlog):
-                                                #    text('Resource Logs ')
-                            with tag('tr', 'class= test-footer'):
-                                with tag('td', 'colspan=5'):
-                                    vtag = 'Generated by {} {}'.format('taskcat', version)
-                                    text(vtag)
-
-                        doc.stag('p')
-                        print('\n')
-
-        htmloutput = yattag.indent(doc.getvalue(),
-                                   indentation='    ',
-                                   newline='\r\n',
-                                   indent_text=True)
-
-        file = open(dashboard_filename, 'w')
-        file.write(htmloutput)
-        file.close()
-
-        return htmloutput
+        # Rows are written as each test is processed, the document is never held in memory
+        with ReportWriter(dashboard_filename, get_version()[0]) as report:
+            for test in testdata_list:
+                testname = test.get_test_name()
+                print(I + "(Generating Reports)")
+                print(I + " - Processing {}".format(testname))
+                rows = []
+                for stack in test.get_test_stacks():
+                    state = self.parse_stack_info(str(stack['StackId']))
+                    status, css = get_report_status(snapshot.get(str(stack['StackId'])))
+                    if status == 'CREATE_FAILED' and self.retain_if_failed and (self.run_cleanup == True):
+                        self.run_cleanup = False
+                    rows.append((state['region'],
+                                 state['stack_name'],
+                                 status,
+                                 css,
+                                 getofile(state['region'], state['stack_name'], 'cfnlog')))
+                report.add_test(testname, rows)
+        print('\n')
+
+        return dashboard_filename
 
     def collect_resources(self, testdata_list, logpath):
         """
@@ -1901,13 +2190,15 @@ class TaskCat(object):
         """
         resource = {}
         print(I + "(Collecting Resources)")
+        self.get_stack_inventory().walk(
+            [stack['StackId'] for test in testdata_list for stack in test.get_test_stacks()])
         for test in testdata_list:
             for stack in test.get_test_stacks():
                 stackinfo = self.parse_stack_info(str(stack['StackId']))
                 # Get stack resources
                 resource[stackinfo['region']] = (
                     self.get_resources(
-                        str(stackinfo['stack_name']),
+                        str(stack['StackId']),
                         str(stackinfo['region'])
                     )
                 )
@@ -1965,6 +2256,7 @@ class TaskCat(object):
         :return:
         """
         print("{}Collecting CloudFormation Logs".format(I))
+        logs = OrderedDict()
         for test in testdata_list:
             for stack in test.get_test_stacks():
                 stackinfo = self.parse_stack_info(str(stack['StackId']))
@@ -1977,7 +2269,8 @@ class TaskCat(object):
                     region,
                     'cfnlogs',
                     extension)
-                self.write_logs(str(stack['StackId']), test_logpath)
+                logs[test_logpath] = str(stack['StackId'])
+        self._write_cfnlogs(logs)
 
     def write_logs(self, stack_id, logpath):
         """
@@ -1986,56 +2279,43 @@ class TaskCat(object):
         :param logpath: Log file path
         :return:
         """
-        stackinfo = self.parse_stack_info(str(stack_id))
-        stackname = str(stackinfo['stack_name'])
-        region = str(stackinfo['region'])
+        self._write_cfnlogs({logpath: str(stack_id)})
 
-        # Get stack resources
-        cfnlogs = self.get_cfnlogs(stackname, region)
+    def get_log_collector(self):
+        """
+        Returns the collector of the CloudFormation event logs.
 
-        if len(cfnlogs) != 0:
-            if cfnlogs[0]['ResourceStatus'] != 'CREATE_COMPLETE':
-                if 'ResourceStatusReason' in cfnlogs[0]:
-                    reason = cfnlogs[0]['ResourceStatusReason']
-                else:
-                    reason = 'Unknown'
+        :return: StackLogCollector object
+        """
+        if self._log_collector is None:
+            self._log_collector = StackLogCollector(self._boto_client, self.get_stack_inventory())
+        return self._log_collector
+
+    def _write_cfnlogs(self, logs):
+        # Stacks are collected concurrently, their summaries are printed afterwards in tree order
+        for logpath, stack_id, reason, error in self.get_log_collector().collect(logs):
+            stackinfo = self.parse_stack_info(stack_id)
+            stackname = str(stackinfo['stack_name'])
+            region = str(stackinfo['region'])
+            if error is not None:
+                print("{} Error trying to get the events for stack [{}] in region [{}]\b {}".format(
+                    E,
+                    stackname,
+                    region,
+                    error
+                ))
+            if reason is None:
+                if error is None:
+                    print(E + "No event logs found. Something went wrong at describe event call.\n")
             else:
-                reason = "Stack launch was successful"
-
-            print("\t |StackName: " + stackname)
-            print("\t |Region: " + region)
-            print("\t |Logging to: " + logpath)
-            print("\t |Tested on: " + str(datetime.datetime.now().strftime("%A, %d. %B %Y %I:%M%p")))
-            print("------------------------------------------------------------------------------------------")
-            print("ResourceStatusReason: ")
-            print(textwrap.fill(str(reason), 85))
-            print("==========================================================================================")
-            with open(logpath, "a") as log_output:
-                log_output.write("-----------------------------------------------------------------------------\n")
-                log_output.write("Region: " + region + "\n")
-                log_output.write("StackName: " + stackname + "\n")
-                log_output.write("*****************************************************************************\n")
-                log_output.write("ResourceStatusReason:  \n")
-                log_output.write(textwrap.fill(str(reason), 85) + "\n")
-                log_output.write("*****************************************************************************\n")
-                log_output.write("*****************************************************************************\n")
-                log_output.write("Events:  \n")
-                log_output.writelines(tabulate.tabulate(cfnlogs, headers="keys"))
-                log_output.write(
-                    "\n*****************************************************************************\n")
-                log_output.write("-----------------------------------------------------------------------------\n")
-                log_output.write("Tested on: " + datetime.datetime.now().strftime("%A, %d. %B %Y %I:%M%p") + "\n")
-                log_output.write(
-                    "-----------------------------------------------------------------------------\n\n")
-                log_output.close()
-
-            # Collect resources of the stack and get event logs for any child stacks
-            resources = self.get_resources(stackname, region, include_stacks=True)
-            for resource in resources:
-                if resource['resourceType'] == 'AWS::CloudFormation::Stack':
-                    self.write_logs(resource['physicalId'], logpath)
-        else:
-            print(E + "No event logs found. Something went wrong at describe event call.\n")
+                print("\t |StackName: " + stackname)
+                print("\t |Region: " + region)
+                print("\t |Logging to: " + logpath)
+                print("\t |Tested on: " + str(datetime.datetime.now().strftime("%A, %d. %B %Y %I:%M%p")))
+                print("------------------------------------------------------------------------------------------")
+                print("ResourceStatusReason: ")
+                print(textwrap.fill(str(reason), 85))
+                print("==========================================================================================")
 
     def createreport(self, testdata_list, filename):
         """
@@ -2064,6 +2344,37 @@ class TaskCat(object):
         # Uses logpath + region to create View Logs link
         self.genreport(testdata_list, dashboard_filename)
 
+        # Keep a machine-readable record of the run
+        self.record_results(testdata_list)
+
+    def record_results(self, testdata_list):
+        """
+        Records the final result of every stack in the local results store (see ResultsStore).
+        Start and end times and resource durations come from the events read by createcfnlogs().
+
+        :param testdata_list: List of TestData objects
+        """
+        snapshot = self.get_status_snapshot(testdata_list)
+        timings = self.get_log_collector().timings
+        results = []
+        for test in testdata_list:
+            for stack in test.get_test_stacks():
+                stack_id = str(stack['StackId'])
+                results.append(stack_result(jobid,
+                                            self.get_project(),
+                                            test.get_test_name(),
+                                            stack_id,
+                                            self.parse_stack_info(stack_id)['stack_name'],
+                                            snapshot.get(stack_id),
+                                            timings.get(stack_id)))
+        try:
+            with ResultsStore() as store:
+                store.record(results)
+        except Exception as e:
+            print(E + "Unable to record the results of the run")
+            if self.verbose:
+                print(D + str(e))
+
     @property
     def interface(self):
         parser = argparse.ArgumentParser(
@@ -2123,6 +2434,30 @@ class TaskCat(object):
             '--multithread_upload',
             action='store_true',
             help="Enables multithreaded upload to S3")
+        parser.add_argument(
+            '-u',
+            '--upload_concurrency',
+            type=int,
+            help="Number of files uploaded concurrently with -m (default: chosen from the CPU count)")
+        parser.add_argument(
+            '-l',
+            '--launch_concurrency',
+            type=int,
+            default=DEFAULT_LAUNCH_CONCURRENCY,
+            help="Maximum number of stacks launched concurrently (default: %s)" % DEFAULT_LAUNCH_CONCURRENCY)
+        parser.add_argument(
+            '-i',
+            '--incremental_upload',
+            action='store_true',
+            help="Uploads only new or changed files to S3 (content hashes are tracked in a local manifest)")
+        parser.add_argument(
+            '-r',
+            '--rate_limit',
+            action='append',
+            default=[],
+            metavar='SERVICE[.Operation]=RATE',
+            help="Maximum API requests per second in each region, e.g. -r ec2=20 -r cloudformation.CreateStack=2 "
+                 "(can be repeated, rates also adapt to throttling)")
         args = parser.parse_args()
 
         if len(sys.argv) == 1:
@@ -2137,6 +2472,29 @@ class TaskCat(object):
         if args.multithread_upload:
             self.multithread_upload = True
 
+        if args.upload_concurrency is not None:
+            if args.upload_concurrency < 1:
+                parser.error("-u (--upload_concurrency) must be at least 1")
+            self.upload_concurrency = args.upload_concurrency
+
+        if args.incremental_upload:
+            self.incremental_upload = True
+
+        for rate_limit in args.rate_limit:
+            name, _, rate = rate_limit.partition('=')
+            service, _, operation = name.partition('.')
+            try:
+                rate = float(rate)
+            except ValueError:
+                rate = 0
+            if not service or rate <= 0:
+                parser.error("-r (--rate_limit) expects SERVICE[.Operation]=RATE with a positive rate")
+            self._boto_client.set_rate_limit(service, rate, operation or None)
+
+        if args.launch_concurrency < 1:
+            parser.error("-l (--launch_concurrency) must be at least 1")
+        self.launch_concurrency = args.launch_concurrency
+
         if args.verbose:
             self.verbose = True
 
@@ -2163,47 +2521,60 @@ class TaskCat(object):
         return args
 
     @staticmethod
-    def checkforupdate():
+    def get_update_message():
+        """
+        Returns the version message printed by checkforupdate(), asking PyPI for the latest version.
+        """
+        version, run_mode = get_version()
 
-        def _print_upgrade_msg(newversion):
-            print("version %s" % version)
-            print('\n')
-            print("{} A newer version of {} is available ({})".format(
-                I, 'taskcat', newversion))
-            print('{} To upgrade pip version    {}[ pip install --upgrade taskcat]{}'.format(
-                I, hightlight, rst_color))
-            print('{} To upgrade docker version {}[ docker pull taskcat/taskcat ]{}'.format(
-                I, hightlight, rst_color))
-            print('\n')
+        def _upgrade_msg(newversion):
+            return '\n'.join([
+                "version %s" % version,
+                '\n',
+                "{} A newer version of {} is available ({})".format(
+                    I, 'taskcat', newversion),
+                '{} To upgrade pip version    {}[ pip install --upgrade taskcat]{}'.format(
+                    I, hightlight, rst_color),
+                '{} To upgrade docker version {}[ docker pull taskcat/taskcat ]{}'.format(
+                    I, hightlight, rst_color),
+                '\n'])
 
-        if _run_mode > 0:
+        if run_mode > 0:
             if 'dev' not in version:
-                current_version = get_pip_version(
+                current_version = get_latest_version(
                     'https://pypi.org/pypi/taskcat/json')
-                if version in current_version:
-                    print("version %s" % version)
-                else:
-                    _print_upgrade_msg(current_version)
-
             else:
-                current_version = get_pip_version(
+                current_version = get_latest_version(
                     'https://test.pypi.org/pypi/taskcat/json')
-                if version in current_version:
-                    print("version %s" % version)
-                else:
-                    _print_upgrade_msg(current_version)
-        else:
-            print(I + "using %s (development mode) \n" % version)
+            if version in current_version:
+                return "version %s" % version
+            return _upgrade_msg(current_version)
+        return I + "using %s (development mode) \n" % version
 
-    def welcome(self, prog_name='taskcat.io'):
-        banner = pyfiglet.Figlet(font='standard')
-        self.banner = banner
-        print("{0}".format(banner.renderText(prog_name), '\n'))
+    @staticmethod
+    def checkforupdate():
+        print(TaskCat.get_update_message())
+
+    def _checkforupdate(self, result):
         try:
-            self.checkforupdate()
+            result.append(self.get_update_message())
         except Exception:
-            print(I + "Unable to get version info!!, continuing")
-            pass
+            result.append(I + "Unable to get version info!!, continuing")
+
+    def welcome(self, prog_name='taskcat.io'):
+        self.banner = get_banner(prog_name)
+        print("{0}".format(self.banner, '\n'))
+        # The update check runs in the background (at most one request to PyPI per day, with a timeout)
+        # and is waited for briefly, so it never delays the run or its exit. The thread only stores
+        # its message, which is printed here or not at all, never in the middle of the run's output
+        result = []
+        update_check = threading.Thread(target=self._checkforupdate, args=(result,), name='taskcat-update-check')
+        update_check.daemon = True
+        update_check.start()
+        update_check.join(UPDATE_CHECK_WAIT)
+        if result:
+            print(result[0])
+
 
 def get_cfn_stack_events(self, stackname, region):
     """
@@ -2216,11 +2587,8 @@ def get_cfn_stack_events(self, stackname, region):
     cfn_client = self._boto_client.get('cloudformation', region)
     stack_events = []
     try:
-        response = cfn_client.describe_stack_events(StackName=stackname)
-        stack_events.extend(response['StackEvents'])
-        while 'NextToken' in response:
-            response = cfn_client.describe_stack_events(NextToken=response['NextToken'], StackName=stackname)
-            stack_events.extend(response['StackEvents'])
+        for page in iter_stack_event_pages(cfn_client, stackname):
+            stack_events.extend(page)
     except ClientError as e:
         print("{} Error trying to get the events for stack [{}] in region [{}]\b {}".format(
             E,
@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# authors:
+# Tony Vattathil <tonynv@amazon.com>, <avattathil@gmail.com>
+# Santiago Cardenas <sancard@amazon.com>, <santiago[dot]cardenas[at]outlook[dot]com>
+# Shivansh Singh <sshvans@amazon.com>,
+# Jay McConnell <jmmccon@amazon.com>,
+# Andrew Glenn <andglenn@amazon.com>
+from __future__ import print_function
+
+import hashlib
+import json
+import logging
+import os
+import time
+from multiprocessing.dummy import Pool as ThreadPool
+
+from .utils import get_cache_dir
+
+MB = 1024 ** 2
+
+# s3transfer defaults, used by client.upload_file() when no TransferConfig is passed
+MULTIPART_THRESHOLD = 8 * MB
+MULTIPART_CHUNKSIZE = 8 * MB
+MAX_PARTS = 10000
+
+# Bounds of the automatically chosen number of files uploaded concurrently
+MIN_AUTO_UPLOAD_CONCURRENCY = 16
+MAX_AUTO_UPLOAD_CONCURRENCY = 32
+# Number of parts of a single multipart upload sent concurrently
+DEFAULT_PART_CONCURRENCY = 4
+DEFAULT_UPLOAD_RETRIES = 3
+
+logger = logging.getLogger('taskcat')
+
+
+class StageManifest(object):
+    """
+    Local record of the content hashes of files staged to S3.
+
+    Hashes are computed the same way S3 computes ETags (MD5 of the object, or MD5 of the part
+    MD5s for multipart uploads) so they can be compared directly with a bucket listing. Hashes
+    are cached by file size and mtime so that unchanged files are never re-read.
+
+    The manifest is stored in ~/.taskcat/manifests/<bucket>-<project>.json
+    """
+
+    def __init__(self, bucket, project, path=None,
+                 multipart_threshold=MULTIPART_THRESHOLD, multipart_chunksize=MULTIPART_CHUNKSIZE):
+        """
+        :param bucket: Name of the staging bucket
+        :param project: Project name (S3 key prefix)
+        :param path: Optional path to the manifest file
+        :param multipart_threshold: Size (in bytes) from which uploads are done in multiple parts
+        :param multipart_chunksize: Size (in bytes) of each part of a multipart upload
+        """
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunksize = multipart_chunksize
+        if path is None:
+            path = os.path.join(get_cache_dir('manifests'), '{}-{}.json'.format(bucket, project))
+        self._path = path
+        self._entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self._path, 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def save(self):
+        """
+        Writes the manifest to disk.
+        """
+        tmp_path = self._path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self._path)
+
+    def _chunksize(self, size):
+        chunksize = self.multipart_chunksize
+        while -(-size // chunksize) > MAX_PARTS:
+            chunksize *= 2
+        return chunksize
+
+    def request_count(self, size):
+        """
+        Returns the number of S3 requests needed to upload an object of the given size.
+
+        :param size: Object size in bytes
+        """
+        if size < self.multipart_threshold:
+            return 1
+        # CreateMultipartUpload + UploadPart * n + CompleteMultipartUpload
+        return -(-size // self._chunksize(size)) + 2
+
+    def compute_etag(self, filename, size):
+        """
+        Returns the ETag S3 will assign to the given file once uploaded.
+
+        :param filename: Path to the local file
+        :param size: Size of the file in bytes
+        """
+        with open(filename, 'rb') as f:
+            if size < self.multipart_threshold:
+                return hashlib.md5(f.read()).hexdigest()
+            chunksize = self._chunksize(size)
+            digests = []
+            for chunk in iter(lambda: f.read(chunksize), b''):
+                digests.append(hashlib.md5(chunk).digest())
+        return '{}-{}'.format(hashlib.md5(b''.join(digests)).hexdigest(), len(digests))
+
+    def etag(self, key, filename):
+        """
+        Returns the ETag of a local file, reusing the cached hash if the file was not modified.
+
+        :param key: S3 key the file is staged to
+        :param filename: Path to the local file
+        """
+        stat = os.stat(filename)
+        entry = self._entries.get(key)
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return entry['etag']
+        self._entries[key] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'etag': self.compute_etag(filename, stat.st_size),
+            'acl': None
+        }
+        return self._entries[key]['etag']
+
+    def diff(self, local_files, remote_objects, acl):
+        """
+        Compares local files with the objects in the bucket.
+
+        A file is unchanged when an object with the same key, size and ETag exists in the bucket,
+        and it was last uploaded by taskcat with the same ACL.
+
+        :param local_files: Dictionary of S3 key => local file path
+        :param remote_objects: Dictionary of S3 key => {'ETag': 'string', 'Size': int}, as
+            returned by list_objects
+        :param acl: Canned ACL the files will be uploaded with
+
+        :return: Tuple of (list of keys to upload, bytes skipped, requests skipped)
+        """
+        changed = []
+        skipped_bytes = 0
+        skipped_requests = 0
+        # Forget files which no longer exist locally
+        for key in set(self._entries) - set(local_files):
+            del self._entries[key]
+        for key, filename in local_files.items():
+            etag = self.etag(key, filename)
+            entry = self._entries[key]
+            remote = remote_objects.get(key)
+            if remote and remote['Size'] == entry['size'] and remote['ETag'].strip('"') == etag \
+                    and entry['acl'] == acl:
+                skipped_bytes += entry['size']
+                skipped_requests += self.request_count(entry['size'])
+            else:
+                changed.append(key)
+        return changed, skipped_bytes, skipped_requests
+
+    def mark_uploaded(self, key, acl):
+        """
+        Records that the file staged to the given key was uploaded with the given ACL.
+
+        :param key: S3 key
+        :param acl: Canned ACL the file was uploaded with
+        """
+        if key in self._entries:
+            self._entries[key]['acl'] = acl
+
+
+class S3KeyIndex(object):
+    """
+    In-memory index of the objects staged under a project prefix.
+
+    Built from a single paginated listing of the bucket, it maps file names to their full S3
+    keys so that S3 URLs can be resolved without listing the bucket again.
+    """
+
+    def __init__(self, bucket, prefix, region=None):
+        """
+        :param bucket: Name of the staging bucket
+        :param prefix: Project name (S3 key prefix)
+        :param region: LocationConstraint of the bucket (None for us-east-1)
+        """
+        self.bucket = bucket
+        self.prefix = prefix
+        self.region = region
+        self.objects = {}
+        self._names = {}
+
+    def load(self, s3_client):
+        """
+        Adds all the objects listed under the project prefix to the index.
+
+        :param s3_client: S3 client
+        """
+        paginator = s3_client.get_paginator('list_objects')
+        for s3obj in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix).search('Contents'):
+            if s3obj:
+                self.add(s3obj)
+
+    def add(self, s3obj):
+        """
+        Adds an object to the index.
+
+        :param s3obj: Object as returned by list_objects (must contain 'Key')
+        """
+        key = s3obj['Key']
+        self.objects[key] = s3obj
+        terms = key.split('/')
+        # The first key listed wins when several files share a name
+        if terms[0] == self.prefix:
+            self._names.setdefault(terms[-1], key)
+
+    def get_key(self, name):
+        """
+        Returns the full S3 key of a file staged under the project prefix, or None.
+
+        :param name: File name (last element of the key)
+        """
+        return self._names.get(name)
+
+    def get_url(self, key):
+        """
+        Returns the S3 url of the given key.
+
+        :param key: Full S3 key
+        """
+        if self.region is not None:
+            return "https://s3-{0}.{1}/{2}/{3}".format(self.region, "amazonaws.com", self.bucket, key)
+        return "https://{1}.{0}/{2}".format('s3.amazonaws.com', self.bucket, key)
+
+
+def auto_upload_concurrency(file_count=None):
+    """
+    Returns the number of files to upload concurrently when none is configured. Uploads are
+    bound by request latency rather than CPU, so several files are uploaded per CPU.
+
+    :param file_count: Optional number of files to upload
+    """
+    concurrency = min(MAX_AUTO_UPLOAD_CONCURRENCY, max(MIN_AUTO_UPLOAD_CONCURRENCY, 4 * (os.cpu_count() or 1)))
+    if file_count is not None:
+        concurrency = min(concurrency, file_count)
+    return max(1, concurrency)
+
+
+class TransferError(Exception):
+    """
+    Raised when files could not be uploaded, after retrying.
+
+    :ivar failures: Dictionary of S3 key => exception raised by the last attempt
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+        super(TransferError, self).__init__(
+            "{} file(s) could not be uploaded: {}".format(len(failures), ', '.join(sorted(failures))))
+
+
+class TransferEngine(object):
+    """
+    Uploads many files to S3 on a bounded pool of worker threads.
+
+    All the uploads share one S3 client, whose connection pool is sized for the number of
+    workers and parts in flight, and one TransferConfig (multipart threshold and chunk size
+    match StageManifest, so staged ETags can be predicted). Small files are uploaded first so
+    that most files are staged early, and each file is retried with backoff before being
+    reported as failed. Failures do not stop the other uploads, they are raised together once
+    every file was attempted.
+
+    Example usage:
+
+    engine = TransferEngine(ClientFactory(), 'mybucket', 'bucket-owner-read', region='us-east-1', concurrency=16)
+    engine.upload({'project/templates/main.template': './project/templates/main.template'})
+    """
+
+    def __init__(self, boto_client, bucket, acl, region=None, credential_set='default', concurrency=None,
+                 retries=DEFAULT_UPLOAD_RETRIES, multipart_threshold=MULTIPART_THRESHOLD,
+                 multipart_chunksize=MULTIPART_CHUNKSIZE, part_concurrency=DEFAULT_PART_CONCURRENCY, backoff=1,
+                 sleep=time.sleep):
+        """
+        :param boto_client: ClientFactory object the S3 client is taken from
+        :param bucket: Name of the staging bucket
+        :param acl: Canned ACL the files are uploaded with
+        :param region: Region of the S3 client
+        :param credential_set: Credential set of the S3 client
+        :param concurrency: Number of files uploaded concurrently, chosen from the CPU count
+            and number of files if None
+        :param retries: Number of attempts per file
+        :param multipart_threshold: Size (in bytes) from which uploads are done in multiple parts
+        :param multipart_chunksize: Size (in bytes) of each part of a multipart upload
+        :param part_concurrency: Number of parts of a multipart upload sent concurrently
+        :param backoff: Delay (in seconds) before the first retry, doubled on each retry
+        :param sleep: Function used to wait between retries
+        """
+        self.bucket = bucket
+        self.acl = acl
+        self.concurrency = concurrency
+        self.retries = max(1, int(retries))
+        self._boto_client = boto_client
+        self._region = region
+        self._credential_set = credential_set
+        self._part_concurrency = max(1, int(part_concurrency))
+        self._backoff = backoff
+        self._sleep = sleep
+        # boto3 is imported on first use, to keep the command line startup fast
+        from boto3.s3.transfer import TransferConfig
+        self._transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=self._part_concurrency)
+
+    def _client(self, concurrency):
+        # The connection pool of the S3 clients must fit every part in flight
+        self._boto_client.grow_max_pool_connections('s3', concurrency * self._part_concurrency)
+        return self._boto_client.get('s3', region=self._region, credential_set=self._credential_set, s3v4=True)
+
+    def _upload_file(self, s3_client, key, filename):
+        for attempt in range(self.retries):
+            try:
+                s3_client.upload_file(filename, self.bucket, key, ExtraArgs={'ACL': self.acl},
+                                      Config=self._transfer_config)
+                return None
+            except Exception as e:
+                logger.debug("upload of %s failed (attempt %s/%s): %s", key, attempt + 1, self.retries, e)
+                if attempt + 1 == self.retries:
+                    return e
+                self._sleep(self._backoff * 2 ** attempt)
+
+    def upload(self, files):
+        """
+        Uploads files, smallest first.
+
+        :param files: Dictionary of S3 key => local file path
+
+        :return: Number of bytes uploaded
+        :raises TransferError: if any file could not be uploaded
+        """
+        if not files:
+            return 0
+        sizes = {key: os.path.getsize(filename) for key, filename in files.items()}
+        ordered = sorted(files, key=lambda key: (sizes[key], key))
+        concurrency = self.concurrency or auto_upload_concurrency(len(ordered))
+        s3_client = self._client(concurrency)
+
+        pool = ThreadPool(max(1, min(concurrency, len(ordered))))
+        try:
+            errors = pool.map(lambda key: self._upload_file(s3_client, key, files[key]), ordered)
+        finally:
+            pool.close()
+            pool.join()
+
+        failures = {key: error for key, error in zip(ordered, errors) if error is not None}
+        if failures:
+            raise TransferError(failures)
+        return sum(sizes.values())
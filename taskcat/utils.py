@@ -8,23 +8,198 @@
 # Andrew Glenn <andglenn@amazon.com>
 from __future__ import print_function
 
-import boto3
-import botocore
 import json
 import logging
 import os
 from threading import Lock
 from time import sleep
+from time import time
 import sys
 import yaml
 import re
 from collections import OrderedDict
 
 
+def get_cache_dir(*subdirs):
+    """Returns the path to taskcat's local cache directory, creating it if needed
+
+    Defaults to ~/.taskcat, can be overridden with the TASKCAT_CACHE_DIR environment variable.
+
+    Args:
+        subdirs (str): [optional] sub-directories to append to the cache path
+    Returns:
+        str: absolute path to the cache directory
+    """
+    cache_dir = os.environ.get('TASKCAT_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.taskcat')
+    cache_dir = os.path.join(cache_dir, *subdirs)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+# Maximum number of attempts of a request when retries are configured
+DEFAULT_MAX_ATTEMPTS = 10
+
+# Error codes of throttled requests
+THROTTLING_ERRORS = ('Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottledException',
+                     'TooManyRequestsException', 'ProvisionedThroughputExceededException',
+                     'TransactionInProgressException', 'RequestLimitExceeded', 'BandwidthLimitExceeded',
+                     'LimitExceededException', 'RequestThrottled', 'SlowDown', 'PriorRequestNotComplete',
+                     'EC2ThrottledException')
+
+
+class RateLimiter(object):
+    """Token bucket shared by all the clients (and threads) calling an API, which adapts to throttling
+
+    Every request takes a token, requests wait when the bucket is empty. Without a configured
+    rate the bucket is unlimited until the first throttling response, after which the rate is
+    set from the observed request rate. A throttling response cuts the rate by decrease (once
+    per cooldown, as concurrent requests are usually throttled together). Successful requests
+    raise it again by a factor of 1 + increase, at most once per cooldown and never above the
+    rate in effect before the last throttling response (nor the configured rate).
+
+    Example usage:
+
+    limiter = RateLimiter(rate=5)
+    limiter.acquire()
+    """
+
+    def __init__(self, rate=None, burst=None, min_rate=0.5, decrease=0.5, increase=0.05, cooldown=1.0,
+                 clock=time, sleep=sleep):
+        """
+        Args:
+            rate (float): [optional] maximum requests per second, defaults to None (unlimited until throttled)
+            burst (int): [optional] bucket size, defaults to the rate (at least 1)
+            min_rate (float): [optional] lowest rate the limiter adapts down to
+            decrease (float): [optional] factor applied to the rate on throttling
+            increase (float): [optional] fraction of the rate added on success
+            cooldown (float): [optional] seconds after a decrease during which throttling is ignored,
+                also the interval between two increases
+            clock (function): [optional] returns the current time in seconds
+            sleep (function): [optional] sleeps for a number of seconds
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self._burst = burst
+        self.min_rate = min_rate
+        self.decrease = decrease
+        self.increase = increase
+        self.cooldown = cooldown
+        self._decreased = None
+        self._increased = None
+        # Rate the limiter recovers up to, the rate before the last throttling response
+        self._ceiling = rate
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = Lock()
+        self._tokens = self._capacity()
+        self._updated = clock()
+        # Observed request rate, used when the first throttling response arrives
+        self._window_start = self._updated
+        self._window_count = 0
+        self._observed = None
+        self.throttled_count = 0
+
+    def _capacity(self):
+        if self._burst:
+            return float(self._burst)
+        return max(1.0, float(self.rate or 1))
+
+    def _refill(self, now):
+        if self.rate is not None:
+            self._tokens = min(self._capacity(), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Takes a token, waiting until one is available
+
+        Returns:
+            float: seconds waited
+        """
+        with self._lock:
+            now = self._clock()
+            self._window_count += 1
+            if now - self._window_start >= 1:
+                self._observed = self._window_count / (now - self._window_start)
+                self._window_start, self._window_count = now, 0
+            self._refill(now)
+            if self.rate is None:
+                return 0
+            # Tokens are reserved up front, waiting requests are served in order
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            self._sleep(wait)
+        return wait
+
+    def throttled(self):
+        """Lowers the rate after a throttling response"""
+        with self._lock:
+            self.throttled_count += 1
+            now = self._clock()
+            if self._decreased is not None and now - self._decreased < self.cooldown:
+                return
+            self._decreased = now
+            self._refill(now)
+            current = self.rate
+            if current is None:
+                current = self._observed or (self._window_count / max(now - self._window_start, 1))
+            self._ceiling = current if self.max_rate is None else min(current, self.max_rate)
+            self.rate = max(self.min_rate, current * self.decrease)
+            self._tokens = min(self._tokens, self._capacity())
+
+    def succeeded(self):
+        """Raises the rate back after a successful request"""
+        if self.rate is None or self.rate >= self._ceiling:
+            return
+        with self._lock:
+            now = self._clock()
+            last = max(self._decreased, self._increased or self._decreased)
+            if self.rate >= self._ceiling or now - last < self.cooldown:
+                return
+            self._increased = now
+            self._refill(now)
+            self.rate = min(self.rate * (1 + self.increase), self._ceiling)
+
+
+class SharedCredentialProvider(object):
+    """Credential provider which resolves credentials once and hands them to every session using it
+
+    Refreshable credentials (assumed roles, instance profiles) are refreshed by the credentials
+    object itself, so all the sessions share the refresh as well.
+    """
+
+    def __init__(self, resolver):
+        """
+        Args:
+            resolver (obj): botocore credential resolver of the first session
+        """
+        self._resolver = resolver
+        self._credentials = None
+        self._lock = Lock()
+
+    def load_credentials(self):
+        """Returns the credentials, resolving them on first use"""
+        with self._lock:
+            if self._credentials is None:
+                self._credentials = self._resolver.load_credentials()
+            return self._credentials
+
+
 class ClientFactory(object):
     """Manages creating and caching boto3 clients, helpful when creating lots of
     clients in different regions or functions.
 
+    Clients can be fetched from any number of threads. Cached clients are read without taking
+    a lock. A missing client is created under the lock of its session (credential set and
+    region), so a client is never built twice and sessions are never used by two threads at
+    once, while clients of different regions are created concurrently.
+
+    Requests of all the clients of a credential set (account), region and service go through a
+    shared RateLimiter, which adapts to throttling responses. Rates can also be set for single
+    API operations (see set_rate_limit). Retries are left to botocore, retry_mode and
+    max_attempts select its retry mode; every retry attempt also takes a token.
+
     Example usage:
 
     from tackcat import utils
@@ -38,7 +213,8 @@ class ClientFactory(object):
     """
 
     def __init__(self, logger=None, loglevel='error', botolevel='error', aws_access_key_id=None,
-                 aws_secret_access_key=None, aws_session_token=None, profile_name=None):
+                 aws_secret_access_key=None, aws_session_token=None, profile_name=None, max_pool_connections=None,
+                 rate_limits=None, retry_mode=None, max_attempts=None):
         """Sets up the cache dict, a locking mechanism and the logging object
 
         Args:
@@ -49,10 +225,37 @@ class ClientFactory(object):
             aws_secret_access_key (str): [optional] IAM secret key, defaults to None
             aws_session_token (str): [optional] IAM session token, defaults to None
             profile_name (str): [optional] credential profile to use, defaults to None
+            max_pool_connections (dict): [optional] size of the connection pool of the clients of each
+                        service, e.g. {'s3': 50}, defaults to the botocore default (10)
+            rate_limits (dict): [optional] requests per second of a service or of an operation, e.g.
+                        {'ec2': 20, 'cloudformation.CreateStack': 2}, see set_rate_limit()
+            retry_mode (str): [optional] botocore retry mode ('legacy', 'standard' or 'adaptive')
+            max_attempts (int): [optional] botocore maximum number of attempts per request
         """
-        self._clients = {"default": {}}
+        # (credential_set, region, service, sig version) => (client, access key of its session)
+        self._clients = {}
+        # (credential_set, region) => (session, access key)
+        self._sessions = {}
+        self._session_locks = {}
         self._credential_sets = {}
+        self._max_pool_connections = dict(max_pool_connections or {})
+        self._retries = {}
+        if retry_mode:
+            self._retries['mode'] = retry_mode
+        if max_attempts:
+            self._retries['max_attempts'] = int(max_attempts)
+        # (credential_set, region, service, operation or None) => RateLimiter
+        self._limiters = {}
+        self._rate_limits = {}
+        # Shared by all the sessions, see _create_session()
+        self._loader = None
+        # Guards the search paths of the shared loader, see _create_session()
+        self._loader_lock = Lock()
+        self._credential_providers = {}
         self._lock = Lock()
+        for name, rate in (rate_limits or {}).items():
+            service, _, operation = name.partition('.')
+            self.set_rate_limit(service, rate, operation or None)
         if not logger:
             loglevel = getattr(logging, loglevel.upper(), 20)
             botolevel = getattr(logging, botolevel.upper(), 40)
@@ -87,6 +290,104 @@ class ClientFactory(object):
         self._credential_sets[credential_set_name] = [aws_access_key_id, aws_secret_access_key, aws_session_token,
                                                       profile_name]
 
+    def set_max_pool_connections(self, service, max_pool_connections):
+        """Sets the size of the connection pool of the clients of a service, clients which were
+        already created are replaced on their next get()
+
+        Args:
+            service (str): service name
+            max_pool_connections (int): maximum number of connections kept per client
+        """
+        with self._lock:
+            self._max_pool_connections[service] = int(max_pool_connections)
+            for key in [key for key in self._clients if key[2] == service]:
+                self._clients.pop(key, None)
+
+    def grow_max_pool_connections(self, service, max_pool_connections):
+        """Makes the connection pool of the clients of a service at least max_pool_connections large,
+        a larger pool set before is kept (and its clients are not replaced)
+
+        Args:
+            service (str): service name
+            max_pool_connections (int): minimum number of connections kept per client
+        """
+        with self._lock:
+            if self._max_pool_connections.get(service, 0) >= int(max_pool_connections):
+                return
+            self._max_pool_connections[service] = int(max_pool_connections)
+            for key in [key for key in self._clients if key[2] == service]:
+                self._clients.pop(key, None)
+
+    def set_rate_limit(self, service, rate, operation=None, burst=None):
+        """Sets the maximum request rate of a service, or of one of its API operations, in every region
+
+        Requests to an operation with its own limit take a token from both the service and the
+        operation limiters. Applies to the limiters created after the call.
+
+        Args:
+            service (str): service name
+            rate (float): maximum requests per second
+            operation (str): [optional] API operation name, e.g. 'CreateStack'
+            burst (int): [optional] number of requests allowed at once, defaults to the rate
+        """
+        with self._lock:
+            self._rate_limits[(service, operation)] = (float(rate), burst)
+
+    def get_rate_limiter(self, service, region=None, credential_set='default', operation=None):
+        """Returns the rate limiter shared by the clients of a credential set, region and service
+
+        Args:
+            service (str): service name
+            region (str): [optional] region name, defaults to current region
+            credential_set (str): [optional] credential set name, defaults to "default"
+            operation (str): [optional] API operation name, returns None if the operation has no own limit
+
+        Returns:
+            RateLimiter: rate limiter
+        """
+        if not region:
+            region = os.environ['AWS_DEFAULT_REGION']
+        key = (credential_set, region, service, operation)
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            if operation is not None and (service, operation) not in self._rate_limits:
+                return None
+            with self._lock:
+                limiter = self._limiters.get(key)
+                if limiter is None:
+                    rate, burst = self._rate_limits.get((service, operation), (None, None))
+                    limiter = self._limiters[key] = RateLimiter(rate, burst)
+        return limiter
+
+    def _attach_rate_limiter(self, client, credential_set, region, service):
+        service_limiter = self.get_rate_limiter(service, region, credential_set)
+        event_service = client.meta.service_model.service_id.hyphenize()
+
+        def before_send(event_name=None, **kwargs):
+            service_limiter.acquire()
+            operation_limiter = self.get_rate_limiter(service, region, credential_set, event_name.split('.')[-1])
+            if operation_limiter is not None:
+                operation_limiter.acquire()
+
+        def needs_retry(response=None, operation=None, **kwargs):
+            if response is None:
+                return None
+            code = response[1].get('Error', {}).get('Code')
+            operation_limiter = self.get_rate_limiter(service, region, credential_set, operation.name)
+            for limiter in (service_limiter, operation_limiter):
+                if limiter is None:
+                    continue
+                if code in THROTTLING_ERRORS:
+                    limiter.throttled()
+                elif code is None:
+                    limiter.succeeded()
+            return None
+
+        client.meta.events.register('before-send.{}'.format(event_service), before_send,
+                                    unique_id='taskcat-rate-limit')
+        client.meta.events.register_first('needs-retry.{}'.format(event_service), needs_retry,
+                                          unique_id='taskcat-rate-adapt')
+
     def get(self, service, region=None, credential_set='default', aws_access_key_id=None,
             aws_secret_access_key=None, aws_session_token=None, s3v4=False, profile_name=None):
         """get a client for a given service and region, optionally with specific role, credentials and/or sig version
@@ -107,77 +408,101 @@ class ClientFactory(object):
             class: boto3 client
         """
         if not aws_access_key_id and not profile_name:
-            self.logger.debug(
-                "no explicit keys or profile for this client, fetching the credentials from the %s set" % credential_set)
-            if credential_set not in self._credential_sets.keys():
+            if credential_set not in self._credential_sets:
                 raise KeyError('credential set %s does not exist' % credential_set)
             aws_access_key_id, aws_secret_access_key, aws_session_token, profile_name = self._credential_sets[
                 credential_set]
         if not region:
-            self.logger.debug("Region not set explicitly, getting default region")
             region = os.environ['AWS_DEFAULT_REGION']
-        s3v4 = 's3v4' if s3v4 else 'default_sig_version'
-        try:
-            self.logger.debug("Trying to get [%s][%s][%s][%s]" % (credential_set, region, service, s3v4))
-            client = self._clients[credential_set][region][service][s3v4]
-            if aws_access_key_id:
-                if self._clients[credential_set][region]['session'].get_credentials().access_key != aws_access_key_id:
+        key = (credential_set, region, service, 's3v4' if s3v4 else 'default_sig_version')
+
+        # Fast path, cached clients are read without locking
+        cached = self._clients.get(key)
+        if cached is not None and (not aws_access_key_id or cached[1] == aws_access_key_id):
+            return cached[0]
+
+        with self._session_lock(credential_set, region):
+            cached = self._clients.get(key)
+            if cached is not None and (not aws_access_key_id or cached[1] == aws_access_key_id):
+                return cached[0]
+            self.logger.debug("Couldn't return an existing client for [%s][%s][%s][%s], making a new one...",
+                              *key)
+            session = self._sessions.get((credential_set, region))
+            if session is None or (aws_access_key_id and session[1] != aws_access_key_id):
+                if session is not None:
                     self.logger.debug("credentials changed, forcing update...")
-                    raise KeyError("New credentials for this credential_set, need a new session.")
+                session = (self._create_session(region, aws_access_key_id, aws_secret_access_key,
+                                                aws_session_token, profile_name, credential_set), aws_access_key_id)
+                self._sessions[(credential_set, region)] = session
+            client = self._create_client(credential_set, region, service, key[3])
+            self._attach_rate_limiter(client, credential_set, region, service)
+            self._clients[key] = (client, session[1])
             return client
-        except KeyError:
-            self.logger.debug("Couldn't return an existing client, making a new one...")
-            if credential_set not in self._clients.keys():
-                self._clients[credential_set] = {}
-            if region not in self._clients[credential_set].keys():
-                self._clients[credential_set][region] = {}
-            if service not in self._clients[credential_set].keys():
-                self._clients[credential_set][region][service] = {}
-            if 'session' not in self._clients[credential_set][region].keys():
-                self._clients[credential_set][region]['session'] = self._create_session(
-                    region, aws_access_key_id, aws_secret_access_key, aws_session_token, profile_name
-                )
-            self._clients[credential_set][region][service][s3v4] = self._create_client(
-                credential_set, region, service, s3v4
-            )
-            return self._clients[credential_set][region][service][s3v4]
-
-    def _create_session(self, region, access_key, secret_key, session_token, profile_name):
+
+    def _session_lock(self, credential_set, region):
+        lock = self._session_locks.get((credential_set, region))
+        if lock is None:
+            with self._lock:
+                lock = self._session_locks.setdefault((credential_set, region), Lock())
+        return lock
+
+    def _get_loader(self):
+        """returns the botocore loader shared by all the sessions, service models are parsed once"""
+        if self._loader is None:
+            with self._lock:
+                if self._loader is None:
+                    import botocore.loaders
+                    self._loader = botocore.loaders.create_loader()
+        return self._loader
+
+    def _get_credential_provider(self, credential_set, profile_name, botocore_session):
+        """returns the credential provider shared by the sessions of a credential set (and profile)"""
+        key = (credential_set, profile_name)
+        with self._lock:
+            provider = self._credential_providers.get(key)
+            if provider is None:
+                provider = self._credential_providers[key] = SharedCredentialProvider(
+                    botocore_session.get_component('credential_provider'))
+        return provider
+
+    def _create_session(self, region, access_key, secret_key, session_token, profile_name, credential_set='default'):
         """creates a boto3 session object
 
+        Sessions share the botocore loader of the factory, and the credentials of their
+        credential set, so only the region specific parts are created for each region.
+
         Args:
             region (str): region name
             access_key (str): [optional] IAM secret key, defaults to None
             secret_key (str): [optional] IAM secret key, defaults to None
             session_token (str): [optional] IAM secret key, defaults to None
             profile_name (str): [optional] credential profile to use, defaults to None
+            credential_set (str): [optional] credential set name, defaults to "default"
         """
+        # boto3 is imported on first use, to keep the command line startup fast
+        import boto3.session
+        import botocore.session
         session = None
         retry = 0
         max_retries = 4
+        loader = self._get_loader()
         while not session:
             try:
-                with self._lock:
-                    if access_key and secret_key and session_token:
-                        session = boto3.session.Session(
-                            aws_access_key_id=access_key,
-                            aws_secret_access_key=secret_key,
-                            aws_session_token=session_token,
-                            region_name=region
-                        )
-                    elif access_key and secret_key:
-                        session = boto3.session.Session(
-                            aws_access_key_id=access_key,
-                            aws_secret_access_key=secret_key,
-                            region_name=region
-                        )
-                    elif profile_name:
-                        session = boto3.session.Session(
-                            profile_name=profile_name,
-                            region_name=region
-                        )
-                    else:
-                        session = boto3.session.Session(region_name=region)
+                botocore_session = botocore.session.Session(profile=profile_name)
+                botocore_session.register_component('data_loader', loader)
+                if access_key and secret_key:
+                    botocore_session.set_credentials(access_key, secret_key, session_token)
+                else:
+                    botocore_session.register_component(
+                        'credential_provider',
+                        self._get_credential_provider(credential_set, profile_name, botocore_session))
+                session = boto3.session.Session(botocore_session=botocore_session, region_name=region)
+                # boto3 appends its data path to the (shared) loader for every session, the
+                # duplicates are trimmed from the end so readers of the list are not disturbed
+                with self._loader_lock:
+                    search_paths = loader.search_paths
+                    while search_paths.count(search_paths[-1]) > 1:
+                        search_paths.pop()
                 return session
             except Exception as e:
                 if "could not be found" in str(e):
@@ -189,7 +514,7 @@ class ClientFactory(object):
                 sleep(5 * (retry ** 2))
 
     def _create_client(self, credential_set, region, service, s3v4):
-        """creates (or fetches from cache) a boto3 client object
+        """creates a boto3 client object, the caller holds the lock of the session
 
         Args:
             credential_set (str): session name
@@ -197,19 +522,24 @@ class ClientFactory(object):
             service (str): AWS service name
             s3v4 (bool): when True enables signature_version=s3v4 which is required for SSE protected buckets/objects
         """
+        import botocore.config
         client = None
         retry = 0
         max_retries = 4
+        session = self._sessions[(credential_set, region)][0]
+        config = {}
+        if s3v4 == 's3v4':
+            config['signature_version'] = 's3v4'
+        if service in self._max_pool_connections:
+            config['max_pool_connections'] = self._max_pool_connections[service]
+        if self._retries:
+            config['retries'] = dict(self._retries)
         while not client:
             try:
-                with self._lock:
-                    if s3v4 == 's3v4':
-                        client = self._clients[credential_set][region]['session'].client(
-                            service,
-                            config=botocore.client.Config(signature_version='s3v4')
-                        )
-                    else:
-                        client = self._clients[credential_set][region]['session'].client(service)
+                if config:
+                    client = session.client(service, config=botocore.config.Config(**config))
+                else:
+                    client = session.client(service)
                 return client
             except Exception:
                 self.logger.debug("failed to create client", exc_info=1)
@@ -228,10 +558,9 @@ class ClientFactory(object):
             list: aws region name strings
         """
 
-        for credential_set in self._clients.keys():
-            for region in self._clients[credential_set].keys():
-                if 'session' in self._clients[credential_set][region].keys():
-                    return self._clients[credential_set][region]['session'].get_available_regions(service)
+        for session, _ in list(self._sessions.values()):
+            return session.get_available_regions(service)
+        import boto3.session
         session = boto3.session.Session()
         return session.get_available_regions(service)
 
@@ -249,7 +578,7 @@ class ClientFactory(object):
             self.logger.debug("Region not set explicitly, getting default region")
             region = os.environ['AWS_DEFAULT_REGION']
 
-        return self._clients[credential_set][region]['session']
+        return self._sessions[(credential_set, region)][0]
 
 
 class Logger(object):
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+# authors:
+# Tony Vattathil <tonynv@amazon.com>, <avattathil@gmail.com>
+# Santiago Cardenas <sancard@amazon.com>, <santiago[dot]cardenas[at]outlook[dot]com>
+# Shivansh Singh <sshvans@amazon.com>,
+# Jay McConnell <jmmccon@amazon.com>,
+# Andrew Glenn <andglenn@amazon.com>
+from __future__ import print_function
+
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from multiprocessing.dummy import Pool as ThreadPool
+from threading import Lock
+
+from .metadata import DAY
+from .utils import get_cache_dir
+
+DEFAULT_VALIDATION_CONCURRENCY = 8
+# Time to live of a cached validation result, in seconds
+DEFAULT_VALIDATION_TTL = 7 * DAY
+
+logger = logging.getLogger('taskcat')
+
+
+def template_hash(content):
+    """
+    Returns the SHA-256 digest of a template, used to identify identical templates.
+
+    :param content: Template content (str or bytes)
+    """
+    if not isinstance(content, bytes):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+class TemplateValidator(object):
+    """
+    Validates CloudFormation templates, remembering the result of every successful validation.
+
+    Results are keyed by account, region and template content hash, so each distinct template
+    is validated once no matter how many tests use it, and templates which did not change since
+    the previous run are not validated again. Distinct templates are validated concurrently.
+    Successful results are stored in ~/.taskcat/validation.json and expire after their TTL,
+    failures are never cached. validate() can be called from multiple threads, it saves the
+    results once per call.
+
+    Example usage:
+
+    validator = TemplateValidator(ClientFactory(), 'us-east-1', account='123456789012')
+    results = validator.validate({template_hash(content): template_url})
+    """
+
+    def __init__(self, boto_client, region, account=None, path=None, concurrency=DEFAULT_VALIDATION_CONCURRENCY,
+                 ttl=DEFAULT_VALIDATION_TTL):
+        """
+        :param boto_client: ClientFactory object used to get CloudFormation clients
+        :param region: Region the templates are validated in
+        :param account: Id of the account the templates are validated in
+        :param path: Optional path to the results file
+        :param concurrency: Maximum number of templates validated concurrently
+        :param ttl: Time to live of the cached results, in seconds
+        """
+        self._boto_client = boto_client
+        self._region = region
+        self._account = account
+        self._concurrency = max(1, int(concurrency))
+        self._ttl = ttl
+        self._path = path or os.path.join(get_cache_dir(), 'validation.json')
+        self._lock = Lock()
+        try:
+            with open(self._path, 'r') as f:
+                self._results = json.load(f)
+        except (IOError, ValueError):
+            self._results = {}
+        self._expire()
+
+    def _key(self, digest):
+        return '{}/{}/{}'.format(self._account, self._region, digest)
+
+    def _expire(self):
+        now = time.time()
+        self._results = {k: v for k, v in self._results.items()
+                         if isinstance(v, dict) and v.get('expires', 0) > now}
+
+    def save(self):
+        """
+        Writes the validation results to disk, expired results are dropped.
+        """
+        tmp_path = '{}.{}.tmp'.format(self._path, os.getpid())
+        with self._lock:
+            self._expire()
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(self._results, f)
+                os.replace(tmp_path, self._path)
+            except (IOError, OSError) as e:
+                logger.debug("unable to write validation results: %s", e)
+
+    def _validate(self, template_url):
+        try:
+            cfn = self._boto_client.get('cloudformation', region=self._region)
+            result = cfn.validate_template(TemplateURL=template_url)
+            result.pop('ResponseMetadata', None)
+            return result, None
+        except Exception as e:
+            return None, e
+
+    def validate(self, templates):
+        """
+        Validates templates which have no cached result.
+
+        :param templates: Dictionary of template hash => S3 url of the template
+
+        :return: Dictionary of template hash => (validate_template result, exception). One of
+            the two is None.
+        """
+        results = {}
+        pending = OrderedDict()
+        for digest, template_url in templates.items():
+            cached = self._results.get(self._key(digest))
+            if cached is not None and cached['expires'] > time.time():
+                logger.debug("template %s already validated", digest)
+                results[digest] = (cached['value'], None)
+            else:
+                pending[digest] = template_url
+        if not pending:
+            return results
+
+        # Create the client up front, so the workers only read the client cache
+        self._boto_client.get('cloudformation', region=self._region)
+        pool = ThreadPool(min(self._concurrency, len(pending)))
+        try:
+            validated = pool.map(self._validate, pending.values())
+        finally:
+            pool.close()
+            pool.join()
+
+        expires = time.time() + self._ttl
+        with self._lock:
+            for digest, (result, error) in zip(pending, validated):
+                results[digest] = (result, error)
+                if error is None:
+                    self._results[self._key(digest)] = {'value': result, 'expires': expires}
+        self.save()
+        return results